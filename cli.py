@@ -4,7 +4,10 @@ import os
 import subprocess
 import sys
 
+from product_similarity.fewshot import FEWSHOT_SELECTIONS
+from product_similarity.model import LOCAL_BACKENDS
 from product_similarity.pipeline import run_similarity
+from product_similarity.records import VERBOSITY_LEVELS
 
 
 def cmd_run(args: argparse.Namespace) -> int:
@@ -14,6 +17,7 @@ def cmd_run(args: argparse.Namespace) -> int:
 		class_1=args.class1,
 		class_2=args.class2,
 		max_fewshot=args.max_fewshot,
+		fewshot_selection=args.fewshot,
 		top_k=args.top_k,
 		include_spsc=(not args.no_spsc),
 		spsc_top_k=args.spsc_top_k,
@@ -25,14 +29,103 @@ def cmd_run(args: argparse.Namespace) -> int:
 		max_new_tokens=args.max_new_tokens,
 		temperature=args.temperature,
 		top_p=args.top_p,
+		backend=args.backend,
+		num_threads=args.num_threads,
+		chat_rpm=args.chat_rpm,
+		chat_tpm=args.chat_tpm,
+		verbosity=args.verbosity,
 	)
 	print(json.dumps(result, ensure_ascii=False, indent=2))
 	return 0
 
 
+def cmd_search(args: argparse.Namespace) -> int:
+	from product_similarity.catalog import CatalogConfig, CatalogIndex, pipeline_scorer, recall_at_n, sample_queries
+
+	config = CatalogConfig(
+		candidates=args.candidates,
+		block_depth=args.block_depth,
+		max_df=args.max_df,
+		include_spsc=(not args.no_spsc),
+	)
+	index = CatalogIndex.from_csv(args.catalog, column=args.column, id_column=args.id_column, config=config)
+
+	queries = list(args.query or [])
+	if args.queries_file:
+		with open(args.queries_file, "r", encoding="utf-8") as f:
+			queries += [line.strip() for line in f if line.strip()]
+
+	scorer = None
+	if args.model or (args.chat_api_base_url and args.chat_api_key and args.chat_api_model):
+		scorer = pipeline_scorer(
+			include_spsc=(not args.no_spsc),
+			model_name=args.model,
+			chat_api_base_url=args.chat_api_base_url,
+			chat_api_key=args.chat_api_key,
+			chat_api_model=args.chat_api_model,
+			device=args.device,
+			max_new_tokens=args.max_new_tokens,
+			backend=args.backend,
+			num_threads=args.num_threads,
+			chat_rpm=args.chat_rpm,
+			chat_tpm=args.chat_tpm,
+		)
+
+	out: dict = {"index": index.stats(), "scored_by": "model" if scorer else "pre-score"}
+	out["results"] = {q: index.search(q, args.top_n, scorer=scorer, workers=args.workers) for q in queries}
+	if args.recall_sample > 0:
+		if queries:
+			recall_queries = [(q, None) for q in queries[:args.recall_sample]]
+		else:
+			recall_queries = sample_queries(index, args.recall_sample, seed=args.seed)
+		out["recall"] = recall_at_n(index, recall_queries, top_n=args.top_n, scorer=scorer, workers=args.workers)
+	print(json.dumps(out, ensure_ascii=False, indent=2))
+	return 0
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+	import csv
+	import time
+
+	from product_similarity.results_io import JsonlWriter
+	from product_similarity.surrogate import SurrogateModel, score_pairs
+
+	model = SurrogateModel.load(args.surrogate)
+	with open(args.pairs, "r", encoding="utf-8", newline="") as f:
+		pairs = [(r.get(args.col1, "").strip(), r.get(args.col2, "").strip()) for r in csv.DictReader(f)]
+	t0 = time.perf_counter()
+	scored = score_pairs(model, pairs, batch_size=args.batch_size)
+	seconds = time.perf_counter() - t0
+	low = 0
+	with JsonlWriter(args.output) as writer:
+		for i, (p1, p2) in enumerate(pairs):
+			conf = float(scored["confidence"][i].min())
+			low += int(conf < args.threshold)
+			writer.write({
+				"row_index": i,
+				"product_1": p1,
+				"product_2": p2,
+				"factors": {f: int(scored["scores"][i, k]) for k, f in enumerate(model.factors)},
+				"pred_overall": int(scored["overall"][i]),
+				"confidence": round(conf, 4),
+				"needs_llm": conf < args.threshold,
+			})
+	print(json.dumps({
+		"pairs": len(pairs),
+		"output": args.output,
+		"seconds": round(seconds, 3),
+		"pairs_per_hour": round(len(pairs) / seconds * 3600) if seconds > 0 else None,
+		"needs_llm": low,
+	}, ensure_ascii=False, indent=2))
+	return 0
+
+
 def cmd_build_nice(args: argparse.Namespace) -> int:
 	tools_path = os.path.join(os.path.dirname(__file__), "tools", "merge_nice_cls.py")
-	proc = subprocess.run([sys.executable, tools_path], check=False)
+	cmd = [sys.executable, tools_path]
+	if args.force:
+		cmd.append("--force")
+	proc = subprocess.run(cmd, check=False)
 	return proc.returncode
 
 
@@ -53,6 +146,10 @@ def cmd_build_tree(args: argparse.Namespace) -> int:
 		cmd += ["--code-col", args.code_col]
 	if args.title_col:
 		cmd += ["--title-col", args.title_col]
+	if args.flat_output:
+		cmd += ["--flat-output", args.flat_output]
+	if args.indent is not None:
+		cmd += ["--indent", str(args.indent)]
 	proc = subprocess.run(cmd, check=False)
 	return proc.returncode
 
@@ -67,6 +164,7 @@ def build_parser() -> argparse.ArgumentParser:
 	run_p.add_argument("--class1", default=None, help="NICE class number for product 1 (optional)")
 	run_p.add_argument("--class2", default=None, help="NICE class number for product 2 (optional)")
 	run_p.add_argument("--max-fewshot", type=int, default=2)
+	run_p.add_argument("--fewshot", choices=list(FEWSHOT_SELECTIONS), default="first", help="Few-shot examples: the first N cases or the N nearest to the pair")
 	run_p.add_argument("--top-k", type=int, default=3)
 	run_p.add_argument("--spsc-top-k", type=int, default=2, help="Top SPSC contexts to include")
 	run_p.add_argument("--no-spsc", action="store_true", help="Disable adding SPSC context")
@@ -74,16 +172,58 @@ def build_parser() -> argparse.ArgumentParser:
 	run_p.add_argument("--chat-api-base-url", default=None, help="OpenAI-compatible chat API base URL")
 	run_p.add_argument("--chat-api-key", default=None, help="OpenAI-compatible chat API key")
 	run_p.add_argument("--chat-api-model", default=None, help="OpenAI-compatible chat API model id")
+	run_p.add_argument("--chat-rpm", type=float, default=None, help="Client-side chat API limit: requests per minute")
+	run_p.add_argument("--chat-tpm", type=float, default=None, help="Client-side chat API limit: tokens per minute")
+	run_p.add_argument("--verbosity", choices=list(VERBOSITY_LEVELS), default="full", help="Result detail: scores, compact (no prompt/output text) or full")
 	run_p.add_argument("--device", type=int, default=-1, help="-1 CPU, 0 GPU")
 	run_p.add_argument("--max-new-tokens", type=int, default=256)
 	run_p.add_argument("--temperature", type=float, default=0.0)
 	run_p.add_argument("--top-p", type=float, default=1.0)
+	run_p.add_argument("--backend", choices=list(LOCAL_BACKENDS), default="torch", help="Local inference backend (torch fp32, int8 dynamic quantization, onnx runtime)")
+	run_p.add_argument("--num-threads", type=int, default=None, help="CPU threads for local inference")
 	run_p.set_defaults(func=cmd_run)
 
-	bn_p = sub.add_parser("build-nice", help="Build data/nice_chunks.json from data_nice_cls")
+	se_p = sub.add_parser("search", help="Find the most similar products in a catalog CSV (candidate blocking + model scoring)")
+	se_p.add_argument("--catalog", required=True, help="Catalog CSV, one product per row")
+	se_p.add_argument("--column", default=None, help="Product description column (default: first column)")
+	se_p.add_argument("--id-column", default=None, help="Optional id column returned with each hit")
+	se_p.add_argument("--query", action="append", help="Product to search for (repeatable)")
+	se_p.add_argument("--queries-file", default=None, help="Text file with one query product per line")
+	se_p.add_argument("--top-n", type=int, default=10)
+	se_p.add_argument("--candidates", type=int, default=50, help="Blocked candidates scored per query")
+	se_p.add_argument("--block-depth", type=int, default=2, help="SPSC ancestor depth used as a block (1 = segment, 2 = family)")
+	se_p.add_argument("--max-df", type=float, default=0.05, help="Terms in more than this catalog fraction do not form blocks")
+	se_p.add_argument("--no-spsc", action="store_true", help="Block and pre-score without SPSC")
+	se_p.add_argument("--recall-sample", type=int, default=0, help="Report recall@N against a full catalog comparison on this many queries (catalog items if no --query)")
+	se_p.add_argument("--seed", type=int, default=0)
+	se_p.add_argument("--workers", type=int, default=1, help="Concurrent scoring calls per query")
+	se_p.add_argument("--model", default=None, help="HF model id used to score candidates (default: rank by pre-score only)")
+	se_p.add_argument("--chat-api-base-url", default=None)
+	se_p.add_argument("--chat-api-key", default=None)
+	se_p.add_argument("--chat-api-model", default=None)
+	se_p.add_argument("--chat-rpm", type=float, default=None, help="Client-side chat API limit: requests per minute")
+	se_p.add_argument("--chat-tpm", type=float, default=None, help="Client-side chat API limit: tokens per minute")
+	se_p.add_argument("--device", type=int, default=-1)
+	se_p.add_argument("--max-new-tokens", type=int, default=256)
+	se_p.add_argument("--backend", choices=list(LOCAL_BACKENDS), default="torch")
+	se_p.add_argument("--num-threads", type=int, default=None)
+	se_p.set_defaults(func=cmd_search)
+
+	sc_p = sub.add_parser("score", help="Bulk-score a CSV of pairs with a trained surrogate (no model calls; see eval.py --train-surrogate)")
+	sc_p.add_argument("--pairs", required=True, help="CSV with one product pair per row")
+	sc_p.add_argument("--surrogate", required=True, help="Surrogate model (.npz)")
+	sc_p.add_argument("--output", required=True, help="Per-pair results JSONL")
+	sc_p.add_argument("--col1", default="Item 1", help="Column of product 1")
+	sc_p.add_argument("--col2", default="Item 2", help="Column of product 2")
+	sc_p.add_argument("--threshold", type=float, default=0.6, help="Flag pairs whose least confident factor is below this as needs_llm")
+	sc_p.add_argument("--batch-size", type=int, default=4096)
+	sc_p.set_defaults(func=cmd_score)
+
+	bn_p = sub.add_parser("build-nice", help="Build data/nice_chunks.json from data_nice_cls (only changed group files are re-parsed)")
+	bn_p.add_argument("--force", action="store_true", help="Re-parse every group file")
 	bn_p.set_defaults(func=cmd_build_nice)
 
-	bt_p = sub.add_parser("build-tree", help="Build hierarchy tree (JSON) from an Excel file")
+	bt_p = sub.add_parser("build-tree", help="Build hierarchy tree (JSON) from an Excel file (streaming, openpyxl read-only)")
 	bt_p.add_argument("--input", help="Path to Excel file")
 	bt_p.add_argument("--sheet-name", help="Excel sheet name (default: first sheet)")
 	bt_p.add_argument("--output", help="Output JSON path")
@@ -91,6 +231,8 @@ def build_parser() -> argparse.ArgumentParser:
 	bt_p.add_argument("--parent-col", help="Column name for Parent key (default: 'Parent key')")
 	bt_p.add_argument("--code-col", help="Column name for Code (default: 'Code')")
 	bt_p.add_argument("--title-col", help="Column name for Title (default: 'Title')")
+	bt_p.add_argument("--flat-output", help="Also write the flattened SPSC node table (JSON Lines), e.g. spsc_data/spsc_data/spsc_flat.jsonl")
+	bt_p.add_argument("--indent", type=int, default=None, help="Indent the tree JSON (default: compact)")
 	bt_p.set_defaults(func=cmd_build_tree)
 
 	return parser
@@ -1,16 +1,48 @@
 import argparse
 import csv
+import gc
 import json
-from typing import Dict, List, Optional
+import multiprocessing as mp
+import os
+import queue as queue_mod
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from product_similarity.pipeline import _load_fewshot_cases, build_prompt, retrieve_contexts
-from product_similarity.model import ChatAPIWrapper, LLMWrapper
+import numpy as np
+
+from product_similarity.fewshot import FEWSHOT_SELECTIONS, select_fewshot_blocks
+from product_similarity.pipeline import build_prompt, retrieve_contexts
+from product_similarity.backends import InferenceBackend, get_backend
+from product_similarity.cache import preload
+from product_similarity.cascade import CascadeConfig, prescreen
+from product_similarity.columnar import convert_results, is_columnar, open_results_writer, read_columns
+from product_similarity.consistency import AGGREGATES
+from product_similarity.model import LOCAL_BACKENDS
 from product_similarity.agents import FactorAgent, FactorAgentConfig, evaluate_multiple_factors
+from product_similarity.incremental import PreviousResults, component_hashes, merge_factor_outputs, model_identity
 from product_similarity.judge import LLMJudge, JudgeConfig
+from product_similarity.metrics import compute_metrics, load_columns, score_results_file
+from product_similarity.routing import CONFIDENCE_SOURCES, RoutedFactorAgent, needs_escalation
+from product_similarity.sequential import STOP_METRICS, SequentialConfig, SequentialMonitor, stratified_order
+from product_similarity.surrogate import SurrogateAgent, SurrogateModel, score_pairs, train_surrogate
+from product_similarity.artifacts import file_sha256
+from product_similarity.records import VERBOSITY_LEVELS, EvalRecord, records_as_dicts, verbosity_level
+from product_similarity.results_io import iter_jsonl, merge_jsonl
+from product_similarity.scheduler import request_priority
+from product_similarity.retriever import _get_nice_chunks_cached
 from product_similarity.spsc import retrieve_spsc_contexts
+from product_similarity.spsc_hierarchy import spsc_proximity
 
 
 DEFAULT_ANALYZER_MODEL = None  # None => only build prompt; override with HF id or chat API via CLI
+GROUP_COLUMNS = ("channels_of_trade",)  # optional CSV columns used for metric breakdowns
+FACTORS = ("Nature", "Intended Purpose", "Channel of trade")
+
+
+def analyzer_prompt(product_1: str, product_2: str, contexts: List[str], *, fewshot_selection: str = "first") -> str:
+    fewshot_blocks = select_fewshot_blocks(product_1, product_2, 2, selection=fewshot_selection)
+    return build_prompt([], product_1, product_2, contexts, fewshot_blocks=fewshot_blocks)
 
 
 def run_analyzer(product_1: str, product_2: str, contexts: List[str], *,
@@ -21,20 +53,30 @@ def run_analyzer(product_1: str, product_2: str, contexts: List[str], *,
                  device: int = -1,
                  max_new_tokens: int = 256,
                  temperature: float = 0.0,
-                 top_p: float = 1.0) -> str:
-    fewshot_cases = _load_fewshot_cases()
-    prompt = build_prompt(fewshot_cases, product_1, product_2, contexts, max_fewshot=2)
-    if chat_api_base_url and chat_api_key and chat_api_model:
-        chat = ChatAPIWrapper(
-            base_url=str(chat_api_base_url),
-            api_key=str(chat_api_key),
-            model=str(chat_api_model),
-            max_tokens=max_new_tokens,
-        )
-        return chat.run(prompt, temperature=max(temperature, 0.0), top_p=top_p)
-    if model_name:
-        llm = LLMWrapper(model_name=model_name, device=device, max_new_tokens=max_new_tokens)
-        return llm.run(prompt, temperature=temperature, top_p=top_p)
+                 top_p: float = 1.0,
+                 backend: str = "torch",
+                 num_threads: Optional[int] = None,
+                 inference_backend: Optional[InferenceBackend] = None,
+                 chat_rpm: Optional[float] = None,
+                 chat_tpm: Optional[float] = None,
+                 fewshot_selection: str = "first",
+                 prompt: Optional[str] = None) -> str:
+    if prompt is None:
+        prompt = analyzer_prompt(product_1, product_2, contexts, fewshot_selection=fewshot_selection)
+    llm = inference_backend or get_backend(
+        model_name=model_name,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        device=device,
+        max_new_tokens=max_new_tokens,
+        backend=backend,
+        num_threads=num_threads,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+    )
+    if llm is not None:
+        return llm.run(prompt, temperature=max(temperature, 0.0), top_p=top_p)
     return ""
 
 
@@ -45,24 +87,451 @@ def run_agents(product_1: str, product_2: str, contexts: List[str], *,
                chat_api_model: Optional[str] = None,
                default_model: str = "mistralai/Mistral-7B-Instruct-v0.2",
                device: int = -1,
-               max_new_tokens: int = 256) -> Dict[str, Dict[str, object]]:
-    # Map optional per-factor context string if desired; here we pass the same joined contexts
-    shared_ctx = "\n\n".join(contexts)
-    per_factor_ctx = {
-        "Nature": shared_ctx,
-        "Intended Purpose": shared_ctx,
-        "Channel of trade": shared_ctx,
-    }
-    agent = FactorAgent(
-        default=FactorAgentConfig(model_name=default_model, device=device, max_new_tokens=max_new_tokens),
+               max_new_tokens: int = 256,
+               backend: str = "torch",
+               num_threads: Optional[int] = None,
+               inference_backend: Optional[InferenceBackend] = None,
+               chat_rpm: Optional[float] = None,
+               chat_tpm: Optional[float] = None,
+               factors: Sequence[str] = FACTORS,
+               samples: int = 1,
+               sample_temperature: float = 0.7,
+               aggregate: str = "majority",
+               agent: Optional[object] = None) -> Dict[str, Dict[str, object]]:
+    """
+    Score each factor with a FactorAgent built from these options, or with
+    `agent` (e.g. a RoutedFactorAgent) when given.
+    """
+    per_factor_ctx = factor_contexts(contexts)
+    agent = agent or FactorAgent(
+        default=FactorAgentConfig(
+            model_name=default_model,
+            device=device,
+            max_new_tokens=max_new_tokens,
+            backend=backend,
+            num_threads=num_threads,
+            # Self-consistency: n samples per factor prompt in one request
+            temperature=sample_temperature if samples > 1 else 0.0,
+            samples=samples,
+            aggregate=aggregate,
+        ),
         per_factor=None,
         use_chat_api=use_chat_api,
         chat_api_base_url=chat_api_base_url,
         chat_api_key=chat_api_key,
         chat_api_model=chat_api_model,
+        inference_backend=inference_backend,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+    )
+    return evaluate_multiple_factors(agent, product_1, product_2, list(factors), per_factor_ctx)  # type: ignore[arg-type]
+
+
+def build_router(*,
+                 route_small_model: Optional[str] = None,
+                 surrogate: Optional[str] = None,
+                 route_small_task: str = "text2text-generation",
+                 route_threshold: float = 0.6,
+                 route_samples: int = 3,
+                 route_confidence: str = "agreement",
+                 agent_model: str = "mistralai/Mistral-7B-Instruct-v0.2",
+                 chat_api_base_url: Optional[str] = None,
+                 chat_api_key: Optional[str] = None,
+                 chat_api_model: Optional[str] = None,
+                 device: int = -1,
+                 max_new_tokens: int = 256,
+                 backend: str = "torch",
+                 num_threads: Optional[int] = None,
+                 inference_backend: Optional[InferenceBackend] = None,
+                 chat_rpm: Optional[float] = None,
+                 chat_tpm: Optional[float] = None,
+                 samples: int = 1,
+                 sample_temperature: float = 0.7,
+                 aggregate: str = "majority",
+                 **_: object) -> Tuple[RoutedFactorAgent, Dict[str, object]]:
+    """
+    Small -> large RoutedFactorAgent for eval options, plus its identity for
+    the component hashes. The small tier is route_small_model on the same
+    chat API (or a local HF model), or a trained surrogate (.npz path);
+    the large tier is the usual agent model.
+    """
+    if route_confidence not in CONFIDENCE_SOURCES:
+        raise ValueError(f"Unknown route confidence {route_confidence!r}; expected one of {', '.join(CONFIDENCE_SOURCES)}")
+    if bool(route_small_model) == bool(surrogate):
+        raise ValueError("Routing needs exactly one small tier: route_small_model or surrogate")
+    use_chat = bool(chat_api_base_url and chat_api_key and chat_api_model)
+    agreement = route_confidence == "agreement"
+    if route_small_model and not agreement and not use_chat:
+        # Local HF models report no score probabilities, so every factor would escalate
+        raise ValueError("Route confidence 'logprob' needs the chat API; use 'agreement' with a local small model")
+    small_config = FactorAgentConfig(
+        model_name=str(route_small_model),
+        device=device,
+        max_new_tokens=max_new_tokens,
+        backend=backend,
+        num_threads=num_threads,
+        task=route_small_task,
+        temperature=sample_temperature if agreement else 0.0,
+        samples=max(int(route_samples), 2) if agreement else 1,
+        aggregate=aggregate,
+        score_logprobs=not agreement,
+    )
+    small: object = SurrogateAgent.load(surrogate) if surrogate else FactorAgent(
+        default=small_config,
+        use_chat_api=use_chat,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=route_small_model,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+    )
+    large = FactorAgent(
+        default=FactorAgentConfig(
+            model_name=agent_model,
+            device=device,
+            max_new_tokens=max_new_tokens,
+            backend=backend,
+            num_threads=num_threads,
+            temperature=sample_temperature if samples > 1 else 0.0,
+            samples=samples,
+            aggregate=aggregate,
+        ),
+        use_chat_api=use_chat,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        inference_backend=inference_backend,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+    )
+    if surrogate:
+        identity: Dict[str, object] = {"small": f"surrogate:{file_sha256(surrogate)[:16]}", "threshold": float(route_threshold)}
+    else:
+        identity = {
+            "small": model_identity(model_name=route_small_model, chat_api_base_url=chat_api_base_url, chat_api_key=chat_api_key,
+                                    chat_api_model=route_small_model, backend=backend),
+            "threshold": float(route_threshold),
+            "confidence": route_confidence,
+            "small_samples": small_config.samples,
+            "small_temperature": small_config.temperature,
+        }
+    return RoutedFactorAgent(small, large, threshold=route_threshold), identity  # type: ignore[arg-type]
+
+
+def factor_contexts(contexts: List[str]) -> Dict[str, str]:
+    # Map optional per-factor context string if desired; here we pass the same joined contexts
+    shared_ctx = "\n\n".join(contexts)
+    return {f: shared_ctx for f in FACTORS}
+
+
+def row_hashes(product_1: str, product_2: str, contexts: List[str], judge: LLMJudge, *,
+               model_name: Optional[str] = DEFAULT_ANALYZER_MODEL,
+               agent_model: str = "mistralai/Mistral-7B-Instruct-v0.2",
+               chat_api_base_url: Optional[str] = None,
+               chat_api_key: Optional[str] = None,
+               chat_api_model: Optional[str] = None,
+               max_new_tokens: int = 256,
+               backend: str = "torch",
+               inference_backend: Optional[InferenceBackend] = None,
+               fewshot_selection: str = "first",
+               samples: int = 1,
+               sample_temperature: float = 0.7,
+               aggregate: str = "majority",
+               routing: Optional[Dict[str, object]] = None) -> Tuple[str, Dict[str, object]]:
+    """
+    The analyzer prompt and the component hashes (analyzer prompt, each factor
+    prompt, judge weights, model ids) of one row, computed without any model call.
+    """
+    chat = dict(chat_api_base_url=chat_api_base_url, chat_api_key=chat_api_key, chat_api_model=chat_api_model)
+    prompt = analyzer_prompt(product_1, product_2, contexts, fewshot_selection=fewshot_selection)
+    ctx = factor_contexts(contexts)
+    # Sampling settings only enter the hashes when used, so single-sample hashes stay stable
+    sampling: Dict[str, object] = dict(samples=samples, temperature=sample_temperature, aggregate=aggregate) if samples > 1 else {}
+    if routing:
+        sampling["routing"] = routing
+    hashes = component_hashes(
+        analyzer_prompt=prompt,
+        analyzer_model=model_identity(model_name=model_name, backend=backend, inference_backend=inference_backend, **chat),
+        factor_prompts={f: FactorAgent.build_prompt(f, product_1, product_2, ctx.get(f)) for f in FACTORS},
+        factor_options=sampling,
+        agent_model=model_identity(model_name=agent_model, backend=backend, inference_backend=inference_backend, **chat),
+        judge_weights=judge.normalized_weights(list(FACTORS)),
+        judge_options={"use_confidence": True} if judge.use_confidence else None,
+        max_new_tokens=max_new_tokens,
     )
-    factors = ["Nature", "Intended Purpose", "Channel of trade"]
-    return evaluate_multiple_factors(agent, product_1, product_2, factors, per_factor_ctx)
+    return prompt, hashes
+
+
+def load_rows(csv_path: str) -> List[Dict[str, str]]:
+    rows: List[Dict[str, str]] = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for r in reader:
+            rows.append(r)
+    return rows
+
+
+def default_judge(use_confidence: bool = False) -> LLMJudge:
+    return LLMJudge(JudgeConfig(weights={"Nature": 0.5, "Intended Purpose": 0.5, "Channel of trade": 0.0}, use_confidence=use_confidence))
+
+
+def _parse_gold(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value not in (None, "", "-") else None
+    except Exception:
+        return None
+
+
+def row_contexts(product_1: str, product_2: str, *,
+                 include_spsc: bool = True,
+                 spsc_top_k: int = 2) -> Tuple[List[str], Optional[float]]:
+    """
+    NICE (+ SPSC) contexts of a pair and its SPSC proximity (None without SPSC data).
+    """
+    contexts = retrieve_contexts(product_1, product_2, top_k=3)
+    proximity: Optional[float] = None
+    if include_spsc:
+        try:
+            spsc_ctx = retrieve_spsc_contexts(product_1, product_2, top_k=spsc_top_k)
+            if spsc_ctx:
+                contexts = contexts + spsc_ctx
+            proximity = round(spsc_proximity(product_1, product_2), 4)
+        except Exception:
+            pass
+    return contexts, proximity
+
+
+def evaluate_record(r: Dict[str, str], judge: LLMJudge, *,
+                 model_name: Optional[str] = DEFAULT_ANALYZER_MODEL,
+                 agent_model: str = "mistralai/Mistral-7B-Instruct-v0.2",
+                 chat_api_base_url: Optional[str] = None,
+                 chat_api_key: Optional[str] = None,
+                 chat_api_model: Optional[str] = None,
+                 device: int = -1,
+                 max_new_tokens: int = 256,
+                 include_spsc: bool = True,
+                 spsc_top_k: int = 2,
+                 backend: str = "torch",
+                 num_threads: Optional[int] = None,
+                 inference_backend: Optional[InferenceBackend] = None,
+                 chat_rpm: Optional[float] = None,
+                 chat_tpm: Optional[float] = None,
+                 cascade: bool = False,
+                 verbosity: str = "full",
+                 fewshot_selection: str = "first",
+                 previous: Optional[PreviousResults] = None,
+                 samples: int = 1,
+                 sample_temperature: float = 0.7,
+                 aggregate: str = "majority",
+                 agent: Optional[RoutedFactorAgent] = None,
+                 routing: Optional[Dict[str, object]] = None) -> EvalRecord:
+    """
+    Run Analyzer -> Agents -> Judge for one CSV row and return its result record.
+    With cascade=True a retrieval-only pre-screen resolves clear-cut pairs
+    without any model call; only ambiguous pairs reach the LLMs.
+    verbosity ("scores" | "compact" | "full") decides which texts the record keeps.
+    fewshot_selection picks the analyzer's examples ("first" or "nearest" to the pair).
+    Each record stores the hashes of its components; with `previous` (an
+    earlier results file) only components whose hash changed call a model,
+    and the judge always re-combines the factor scores.
+    samples > 1 enables self-consistency: each factor prompt is sampled that
+    many times in one request at sample_temperature and scores are combined
+    by `aggregate`; their agreement is reported as confidence.
+    agent/routing (from build_router) score factors small-model-first.
+    """
+    level = verbosity_level(verbosity)
+    p1 = r.get("Item 1", "").strip()
+    p2 = r.get("Item 2", "").strip()
+    gold = _parse_gold(r.get("Level of similarity"))
+    # Carry grouping columns through for per-group metric breakdowns
+    groups = {key: r[key] for key in GROUP_COLUMNS if r.get(key) not in (None, "")}
+
+    contexts, proximity = row_contexts(p1, p2, include_spsc=include_spsc, spsc_top_k=spsc_top_k)
+    if cascade:
+        pre = prescreen(p1, p2, config=CascadeConfig(include_spsc=include_spsc))
+        if pre.resolved:
+            return EvalRecord.build(
+                p1,
+                p2,
+                gold=gold,
+                pred=int(pre.score or 0),
+                factor_outputs={},
+                judged={},
+                contexts=contexts,
+                spsc_proximity=proximity,
+                groups=groups,
+                cascade=pre.as_dict(),
+                verbosity=verbosity,
+            )
+
+    prompt, hashes = row_hashes(
+        p1,
+        p2,
+        contexts,
+        judge,
+        model_name=model_name,
+        agent_model=agent_model,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        max_new_tokens=max_new_tokens,
+        backend=backend,
+        inference_backend=inference_backend,
+        fewshot_selection=fewshot_selection,
+        samples=samples,
+        sample_temperature=sample_temperature,
+        aggregate=aggregate,
+        routing=routing,
+    )
+    reused_analyzer: Optional[str] = None
+    reused: Dict[str, Dict[str, object]] = {}
+    if previous is not None:
+        reused_analyzer, reused = previous.reuse(p1, p2, hashes, need_reasoning=level >= 1, need_analyzer=level >= 2)
+
+    analyzer_text = reused_analyzer if reused_analyzer is not None else run_analyzer(
+        p1,
+        p2,
+        contexts,
+        prompt=prompt,
+        model_name=model_name,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        device=device,
+        max_new_tokens=max_new_tokens,
+        backend=backend,
+        num_threads=num_threads,
+        inference_backend=inference_backend,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+        fewshot_selection=fewshot_selection,
+    )
+
+    missing = [f for f in FACTORS if f not in reused]
+    fresh = {} if not missing else run_agents(
+        p1,
+        p2,
+        contexts,
+        use_chat_api=bool(chat_api_base_url and chat_api_key and chat_api_model),
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        default_model=agent_model,
+        device=device,
+        max_new_tokens=max_new_tokens,
+        backend=backend,
+        num_threads=num_threads,
+        inference_backend=inference_backend,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+        factors=missing,
+        samples=samples,
+        sample_temperature=sample_temperature,
+        aggregate=aggregate,
+        agent=agent,
+    )
+    factor_outputs = merge_factor_outputs(FACTORS, reused, fresh)
+    judged = judge.combine_factor_scores(factor_outputs)
+
+    return EvalRecord.build(
+        p1,
+        p2,
+        gold=gold,
+        pred=int(judged.get("overall_similarity", 0)),  # type: ignore[arg-type]
+        factor_outputs=factor_outputs,
+        judged=judged,
+        contexts=contexts,
+        analyzer=analyzer_text,
+        spsc_proximity=proximity,
+        groups=groups,
+        hashes=hashes,
+        verbosity=verbosity,
+    )
+
+
+def evaluate_row(r: Dict[str, str], judge: LLMJudge, **run_opts: object) -> Dict[str, object]:
+    """
+    evaluate_record() as a plain dict (the JSONL result layout).
+    """
+    return evaluate_record(r, judge, **run_opts).as_dict()  # type: ignore[arg-type]
+
+
+def evaluate_rows(rows: Iterable[Tuple[int, Dict[str, str]]], *,
+                  output_jsonl: Optional[str] = None,
+                  keep_results: bool = True,
+                  n_boot: int = 1000,
+                  as_records: bool = False,
+                  judge_confidence: bool = False,
+                  route: Optional[Dict[str, object]] = None,
+                  stop: Optional[Callable[[int, int, int], bool]] = None,
+                  **run_opts: object) -> Dict[str, object]:
+    """
+    Evaluate (row_index, row) pairs. Each result is streamed to output_jsonl
+    (tagged with row_index) when given; a .parquet / .cols path writes the
+    flat columnar format instead (see product_similarity/columnar.py).
+    keep_results=False avoids holding them in memory.
+    Kept results are slotted EvalRecords trimmed to run_opts["verbosity"] and
+    only turned into dicts on return (as_records=True returns them as is).
+    Predictions and labels are kept in typed arrays and scored once at the end
+    by product_similarity.metrics. run_opts are the keyword options of evaluate_record.
+    judge_confidence=True scales judge weights by the factors' sampling confidence.
+    route (build_router options, e.g. {"route_small_model": ...}) scores
+    factors with the small model first and escalates low-confidence ones.
+    stop(row_index, pred, gold) is called after each row; returning True
+    ends the evaluation early (see evaluate_sequential).
+    """
+    judge = default_judge(use_confidence=judge_confidence)
+    router: Optional[RoutedFactorAgent] = None
+    if route:
+        router, identity = build_router(**route, **run_opts)  # type: ignore[arg-type]
+        run_opts = {**run_opts, "agent": router, "routing": identity}
+    writer = open_results_writer(
+        output_jsonl,
+        factors=FACTORS,
+        group_keys=GROUP_COLUMNS,
+        tiers=route is not None,
+        verbosity=str(run_opts.get("verbosity", "full")),
+    ) if output_jsonl else None
+
+    results: List[EvalRecord] = []
+    preds = array("b")
+    golds = array("b")
+    groups: Dict[str, List[str]] = {k: [] for k in GROUP_COLUMNS}
+    short_circuited = 0
+    try:
+        # Evaluation traffic yields to interactive requests sharing a rate-limited backend
+        with request_priority("bulk"):
+            for idx, r in rows:
+                rec = evaluate_record(r, judge, **run_opts)  # type: ignore[arg-type]
+                preds.append(rec.pred)
+                golds.append(rec.gold)
+                for k in GROUP_COLUMNS:
+                    groups[k].append((rec.groups or {}).get(k, ""))
+                if rec.cascade:
+                    short_circuited += 1
+                if writer is not None:
+                    writer.write({"row_index": idx, **rec.as_dict()})
+                if keep_results:
+                    results.append(rec)
+                if stop is not None and stop(idx, rec.pred, rec.gold):
+                    break
+    finally:
+        if writer is not None:
+            writer.close()
+
+    present = {k: v for k, v in groups.items() if any(v)}
+    metrics = compute_metrics(preds, golds, groups=present or None, n_boot=n_boot)
+    if run_opts.get("cascade"):
+        metrics["cascade"] = {
+            "short_circuited": short_circuited,
+            "fraction": (short_circuited / len(preds)) if len(preds) else None,
+        }
+    previous = run_opts.get("previous")
+    if isinstance(previous, PreviousResults):
+        metrics["incremental"] = previous.stats()
+    if router is not None:
+        metrics["routing"] = router.stats()
+    return {"metrics": metrics, "results": results if as_records else records_as_dicts(results)}
 
 
 def evaluate_dataset(csv_path: str, *,
@@ -74,84 +543,517 @@ def evaluate_dataset(csv_path: str, *,
                      device: int = -1,
                      max_new_tokens: int = 256,
                      include_spsc: bool = True,
-                     spsc_top_k: int = 2) -> Dict[str, object]:
-    rows: List[Dict[str, str]] = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
+                     spsc_top_k: int = 2,
+                     backend: str = "torch",
+                     num_threads: Optional[int] = None,
+                     inference_backend: Optional[InferenceBackend] = None,
+                     output_jsonl: Optional[str] = None,
+                     n_boot: int = 1000,
+                     chat_rpm: Optional[float] = None,
+                     chat_tpm: Optional[float] = None,
+                     cascade: bool = False,
+                     verbosity: str = "full",
+                     fewshot_selection: str = "first",
+                     previous: Optional[PreviousResults] = None,
+                     samples: int = 1,
+                     sample_temperature: float = 0.7,
+                     aggregate: str = "majority",
+                     judge_confidence: bool = False,
+                     route: Optional[Dict[str, object]] = None,
+                     keep_results: bool = True) -> Dict[str, object]:
+    rows = load_rows(csv_path)
+    out = evaluate_rows(
+        enumerate(rows),
+        output_jsonl=output_jsonl,
+        keep_results=keep_results,
+        n_boot=n_boot,
+        model_name=model_name,
+        agent_model=agent_model,
+        chat_api_base_url=chat_api_base_url,
+        chat_api_key=chat_api_key,
+        chat_api_model=chat_api_model,
+        device=device,
+        max_new_tokens=max_new_tokens,
+        include_spsc=include_spsc,
+        spsc_top_k=spsc_top_k,
+        backend=backend,
+        num_threads=num_threads,
+        inference_backend=inference_backend,
+        chat_rpm=chat_rpm,
+        chat_tpm=chat_tpm,
+        cascade=cascade,
+        verbosity=verbosity,
+        fewshot_selection=fewshot_selection,
+        previous=previous,
+        samples=samples,
+        sample_temperature=sample_temperature,
+        aggregate=aggregate,
+        judge_confidence=judge_confidence,
+        route=route,
+    )
+    return out
+
 
-    judge = LLMJudge(JudgeConfig(weights={"Nature": 0.5, "Intended Purpose": 0.5, "Channel of trade": 0.0}))
+_HASH_OPTS = ("model_name", "agent_model", "chat_api_base_url", "chat_api_key", "chat_api_model",
+              "max_new_tokens", "backend", "inference_backend", "fewshot_selection",
+              "samples", "sample_temperature", "aggregate")
 
-    results = []
-    correct = 0
-    total = 0
 
+def plan_reevaluation(csv_path: str, previous: PreviousResults, **run_opts: object) -> Dict[str, object]:
+    """
+    Model calls a re-evaluation of the CSV against `previous` would make
+    (per component), computed from prompt hashes without calling any model.
+    run_opts are the keyword options of evaluate_dataset.
+    """
+    level = verbosity_level(str(run_opts.get("verbosity", "full")))
+    include_spsc = bool(run_opts.get("include_spsc", True))
+    judge = default_judge(use_confidence=bool(run_opts.get("judge_confidence")))
+    hash_opts = {k: v for k, v in run_opts.items() if k in _HASH_OPTS}
+    if run_opts.get("route"):
+        hash_opts["routing"] = build_router(**run_opts["route"], **run_opts)[1]  # type: ignore[arg-type]
+    rows = load_rows(csv_path)
+    short_circuited = 0
+    judge_changed = 0
     for r in rows:
         p1 = r.get("Item 1", "").strip()
         p2 = r.get("Item 2", "").strip()
-        gold_overall = r.get("Level of similarity")
-        try:
-            gold = int(float(gold_overall)) if gold_overall not in (None, "", "-") else None
-        except Exception:
-            gold = None
+        if run_opts.get("cascade") and prescreen(p1, p2, config=CascadeConfig(include_spsc=include_spsc)).resolved:
+            short_circuited += 1
+            continue
+        contexts, _ = row_contexts(p1, p2, include_spsc=include_spsc, spsc_top_k=int(run_opts.get("spsc_top_k", 2)))  # type: ignore[arg-type]
+        _, hashes = row_hashes(p1, p2, contexts, judge, **hash_opts)  # type: ignore[arg-type]
+        prior = previous.lookup(p1, p2)
+        if prior is None or (prior.get("hashes") or {}).get("judge") != hashes["judge"]:  # type: ignore[union-attr]
+            judge_changed += 1
+        previous.reuse(p1, p2, hashes, need_reasoning=level >= 1, need_analyzer=level >= 2)
+    return {"rows": len(rows), "short_circuited": short_circuited, "judge_changed": judge_changed, **previous.stats()}
+
+
+def search_judge_weights(results_path: str, *, steps: int = 10, objective: str = "accuracy",
+                         judge_confidence: bool = False) -> Dict[str, object]:
+    """
+    Re-weight the saved factor scores of a results file with LLMJudge.combine_batch
+    and grid-search the weights that best match the gold labels
+    (judge_confidence: the judge scales weights by the saved factor confidences).
+    """
+    cols = load_columns(results_path, group_keys=GROUP_COLUMNS)
+    factors = [k[len("factor:"):] for k in cols if k.startswith("factor:")]
+    if not factors:
+        raise ValueError(f"No factor score columns in {results_path}")
+    scores = np.stack([cols[f"factor:{f}"] for f in factors], axis=1)
+    nan = np.full(len(scores), np.nan, dtype=np.float32)
+    conf = np.stack([cols.get(f"factor_confidence:{f}", nan) for f in factors], axis=1)
+    judge = default_judge(use_confidence=judge_confidence)
+    current = judge.combine_batch(scores, factors, confidence=conf)
+    baseline = compute_metrics(current, cols["gold"], n_boot=0)
+    best = judge.search_weights(scores, cols["gold"], factors, steps=steps, objective=objective, confidence=conf)
+    return {
+        "baseline": {"weights": judge.normalized_weights(factors), "accuracy": baseline["accuracy"], "mse": baseline["mse"]},
+        "best": best,
+    }
+
+
+def baseline_preds(results_path: str, num_rows: int) -> np.ndarray:
+    """
+    pred_overall of a results file (JSONL or columnar) by CSV row index (-1 where missing).
+    """
+    base = np.full(num_rows, -1, dtype=np.int8)
+    if is_columnar(results_path):
+        cols = read_columns(results_path, ["row_index", "pred"])
+        idx = np.asarray(cols["row_index"], dtype=np.int64)
+        keep = (idx >= 0) & (idx < num_rows)
+        base[idx[keep]] = cols["pred"][keep]
+        return base
+    for pos, row in enumerate(iter_jsonl(results_path)):
+        idx = int(row.get("row_index", pos))  # type: ignore[arg-type]
+        if 0 <= idx < num_rows and row.get("pred_overall") is not None:
+            base[idx] = int(row["pred_overall"])  # type: ignore[arg-type]
+    return base
+
+
+def evaluate_sequential(csv_path: str, *,
+                        config: Optional[SequentialConfig] = None,
+                        baseline_jsonl: Optional[str] = None,
+                        output_jsonl: Optional[str] = None,
+                        n_boot: int = 1000,
+                        keep_results: bool = True,
+                        **run_opts: object) -> Dict[str, object]:
+    """
+    Evaluate labeled rows in a random order stratified by gold level and
+    stop as soon as the metric interval (or, with a baseline results file of
+    the same CSV, the paired difference to it) is precise enough.
+    Unlabeled rows are skipped. metrics["sequential"] reports the rows used,
+    why it stopped and the interval at every check.
+    run_opts are the keyword options of evaluate_dataset.
+    """
+    cfg = config or SequentialConfig()
+    rows = load_rows(csv_path)
+    labeled = [(i, g) for i, g in enumerate(_parse_gold(r.get("Level of similarity")) for r in rows) if g is not None]
+    order = [labeled[k][0] for k in stratified_order([g for _, g in labeled], seed=cfg.seed)]
+    baseline = baseline_preds(baseline_jsonl, len(rows)) if baseline_jsonl else None
+    monitor = SequentialMonitor(cfg, baseline=baseline)
+    out = evaluate_rows(
+        ((i, rows[i]) for i in order),
+        output_jsonl=output_jsonl,
+        keep_results=keep_results,
+        n_boot=n_boot,
+        stop=monitor.update,
+        **run_opts,
+    )
+    out["metrics"]["sequential"] = monitor.summary(len(labeled))  # type: ignore[index]
+    return out
+
+
+def cascade_report(csv_path: str, *,
+                   baseline_jsonl: Optional[str] = None,
+                   include_spsc: bool = True) -> Dict[str, object]:
+    """
+    Measure the cascade pre-screen on a labeled CSV without any model call:
+    how many rows it short-circuits and how often its shortcut matches gold.
+    With a baseline results file from a full run, also report the metrics of
+    the hybrid (shortcut where resolved, baseline prediction elsewhere).
+    """
+    rows = load_rows(csv_path)
+    config = CascadeConfig(include_spsc=include_spsc)
+    shortcut = np.full(len(rows), -1, dtype=np.int8)
+    gold = np.full(len(rows), -1, dtype=np.int8)
+    reasons: Dict[str, int] = {}
+    for i, r in enumerate(rows):
+        pre = prescreen(r.get("Item 1", "").strip(), r.get("Item 2", "").strip(), config=config)
+        reasons[pre.reason] = reasons.get(pre.reason, 0) + 1
+        if pre.resolved:
+            shortcut[i] = int(pre.score or 0)
+        g = _parse_gold(r.get("Level of similarity"))
+        if g is not None:
+            gold[i] = g
+
+    resolved = shortcut >= 0
+    out: Dict[str, object] = {
+        "rows": len(rows),
+        "short_circuited": int(resolved.sum()),
+        "fraction": float(resolved.mean()) if len(rows) else None,
+        "reasons": reasons,
+        "shortcut_metrics": compute_metrics(shortcut[resolved], gold[resolved], n_boot=0),
+    }
+    if baseline_jsonl:
+        base = baseline_preds(baseline_jsonl, len(rows))
+        hybrid = np.where(resolved, shortcut, base)
+        out["baseline_metrics"] = compute_metrics(base, gold, n_boot=0)
+        out["cascade_metrics"] = compute_metrics(hybrid, gold, n_boot=0)
+    return out
+
+
+def routing_report(csv_path: str, route: Dict[str, object], *,
+                   thresholds: Sequence[float] = (0.0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+                   **run_opts: object) -> Dict[str, object]:
+    """
+    Latency/accuracy trade-off of small -> large routing on a labeled CSV.
+    Both tiers score every factor once; each threshold is then replayed
+    offline (escalate when needs_escalation) and reports accuracy, the share
+    of escalated factors, large-tier calls and the summed model seconds.
+    "small_only" and "large_only" are the two ends of the curve.
+    """
+    router, _ = build_router(**route, **run_opts)  # type: ignore[arg-type]
+    judge = default_judge(use_confidence=bool(run_opts.get("judge_confidence")))
+    include_spsc = bool(run_opts.get("include_spsc", True))
+    spsc_top_k = int(run_opts.get("spsc_top_k", 2))  # type: ignore[arg-type]
+    rows = load_rows(csv_path)
+    small_out: List[Dict[str, Dict[str, object]]] = []
+    large_out: List[Dict[str, Dict[str, object]]] = []
+    small_sec: List[Dict[str, float]] = []
+    large_sec: List[Dict[str, float]] = []
+    gold = np.full(len(rows), -1, dtype=np.int8)
+    with request_priority("bulk"):
+        for i, r in enumerate(rows):
+            p1 = r.get("Item 1", "").strip()
+            p2 = r.get("Item 2", "").strip()
+            g = _parse_gold(r.get("Level of similarity"))
+            if g is not None:
+                gold[i] = g
+            contexts, _ = row_contexts(p1, p2, include_spsc=include_spsc, spsc_top_k=spsc_top_k)
+            ctx = factor_contexts(contexts)
+            outs: Tuple[Dict[str, Dict[str, object]], Dict[str, Dict[str, object]]] = ({}, {})
+            secs: Tuple[Dict[str, float], Dict[str, float]] = ({}, {})
+            for f in FACTORS:
+                for tier, agent in enumerate((router.small, router.large)):
+                    t0 = time.perf_counter()
+                    outs[tier][f] = agent.evaluate(f, p1, p2, ctx.get(f))
+                    secs[tier][f] = time.perf_counter() - t0
+            small_out.append(outs[0])
+            large_out.append(outs[1])
+            small_sec.append(secs[0])
+            large_sec.append(secs[1])
+
+    def _point(name: str, escalate: List[Dict[str, bool]]) -> Dict[str, object]:
+        preds = np.zeros(len(rows), dtype=np.int8)
+        escalated = 0
+        seconds = 0.0
+        for i in range(len(rows)):
+            merged = {}
+            for f in FACTORS:
+                up = escalate[i][f]
+                escalated += int(up)
+                merged[f] = large_out[i][f] if up else small_out[i][f]
+                # The small tier always runs unless the pair goes straight to the large model
+                seconds += (small_sec[i][f] if name != "large_only" else 0.0) + (large_sec[i][f] if up else 0.0)
+            preds[i] = int(judge.combine_factor_scores(merged)["overall_similarity"])  # type: ignore[arg-type]
+        m = compute_metrics(preds, gold, n_boot=0)
+        total = len(rows) * len(FACTORS)
+        return {
+            "route": name,
+            "accuracy": m["accuracy"],
+            "mse": m["mse"],
+            "escalation_rate": round(escalated / total, 4) if total else None,
+            "large_calls": escalated,
+            "model_seconds": round(seconds, 3),
+        }
+
+    curve = [_point("small_only", [{f: False for f in FACTORS} for _ in rows])]
+    for t in thresholds:
+        point = _point("threshold", [{f: needs_escalation(o[f], float(t)) for f in FACTORS} for o in small_out])
+        curve.append({"threshold": float(t), **point})
+    curve.append(_point("large_only", [{f: True for f in FACTORS} for _ in rows]))
+    return {"rows": len(rows), "small": route.get("route_small_model") or route.get("surrogate"), "curve": curve}
+
+
+def surrogate_report(csv_path: str, surrogate: str, *,
+                     thresholds: Sequence[float] = (0.0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9),
+                     baseline_jsonl: Optional[str] = None) -> Dict[str, object]:
+    """
+    Score a labeled CSV with a trained surrogate alone (no model call) and
+    compare with gold. Per threshold: the share of pairs whose factors are
+    all at least that confident (the rest would fall back to the LLM) and
+    the surrogate's metrics on them; with a baseline results file from a
+    full run, also the hybrid (surrogate where confident, baseline elsewhere).
+    Pairs the surrogate was trained on are left out of all metrics.
+    """
+    model = SurrogateModel.load(surrogate)
+    rows = load_rows(csv_path)
+    all_pairs = [(r.get("Item 1", "").strip(), r.get("Item 2", "").strip()) for r in rows]
+    gold = np.asarray([g if g is not None else -1 for g in (_parse_gold(r.get("Level of similarity")) for r in rows)], dtype=np.int8)
+    seen = model.seen(all_pairs)
+    unseen = np.flatnonzero(~seen)
+    pairs = [all_pairs[i] for i in unseen]
+    gold = gold[unseen]
+    judge = model.judge()
+    t0 = time.perf_counter()
+    scored = score_pairs(model, pairs, judge)
+    seconds = time.perf_counter() - t0
+    # A pair is only answered by the surrogate when every judged factor is confident
+    weights = judge.normalized_weights(list(model.factors))
+    weighted = [i for i, f in enumerate(model.factors) if weights[f] > 0]
+    pair_conf = scored["confidence"][:, weighted].min(axis=1) if len(pairs) else np.zeros(0)
+
+    base: Optional[np.ndarray] = None
+    if baseline_jsonl:
+        base = baseline_preds(baseline_jsonl, len(rows))[unseen]
 
-        contexts = retrieve_contexts(p1, p2, top_k=3)
-        if include_spsc:
+    curve = []
+    for t in thresholds:
+        covered = pair_conf >= float(t)
+        point: Dict[str, object] = {
+            "threshold": float(t),
+            "coverage": round(float(covered.mean()), 4) if len(pairs) else None,
+            "llm_fallback": int((~covered).sum()),
+            "surrogate_metrics": compute_metrics(scored["overall"][covered], gold[covered], n_boot=0),
+        }
+        if base is not None:
+            point["hybrid_metrics"] = compute_metrics(np.where(covered, scored["overall"], base), gold, n_boot=0)
+        curve.append(point)
+    out: Dict[str, object] = {
+        "rows": len(pairs),
+        # None: the model predates recorded training pairs, so none could be excluded
+        "excluded_training_pairs": int(seen.sum()) if model.trained_pairs is not None else None,
+        "surrogate": {"path": surrogate, **model.meta},
+        "pairs_per_hour": round(len(pairs) / seconds * 3600) if seconds > 0 else None,
+        "metrics": compute_metrics(scored["overall"], gold, n_boot=0),
+        "curve": curve,
+    }
+    if base is not None:
+        out["baseline_metrics"] = compute_metrics(base, gold, n_boot=0)
+    return out
+
+
+# ---- Sharded multi-process evaluation ----
+
+# Shards are stored here by the parent just before forking, so children read
+# them (and the warmed retrieval caches) from inherited memory instead of pickles.
+# Under spawn nothing is inherited and each worker receives its rows as an argument.
+_SHARDS: List[List[Tuple[int, Dict[str, str]]]] = []
+
+
+def shard_rows(rows: List[Dict[str, str]], num_shards: int) -> List[List[Tuple[int, Dict[str, str]]]]:
+    """
+    Deterministically split rows round-robin by CSV position (row i -> shard i % n).
+    """
+    n = max(int(num_shards), 1)
+    shards: List[List[Tuple[int, Dict[str, str]]]] = [[] for _ in range(n)]
+    for i, r in enumerate(rows):
+        shards[i % n].append((i, r))
+    return shards
+
+
+def preload_shared_data(include_spsc: bool = True) -> Dict[str, Dict[str, object]]:
+    """
+    Load NICE chunks, few-shot cases, the flattened SPSC tree and the indexes
+    built on them into this process's caches (missing SPSC data is skipped).
+    """
+    names = ["nice_chunks", "nice_index", "fewshot_cases", "fewshot_index"]
+    if include_spsc:
+        names += ["spsc_flat", "spsc_index", "spsc_hierarchy"]
+    stats = preload(names)
+    # NICE data is required; surface a missing file as before
+    _get_nice_chunks_cached()
+    return stats
+
+
+def _run_shard(shard_idx: int, rows: Optional[List[Tuple[int, Dict[str, str]]]], out_path: str,
+               run_opts: Dict[str, object], queue: "mp.Queue") -> None:
+    t0 = time.perf_counter()
+    try:
+        if rows is None:
+            rows = _SHARDS[shard_idx]
+        out = evaluate_rows(rows, output_jsonl=out_path, keep_results=False, n_boot=0, **run_opts)
+        msg: Dict[str, object] = {
+            "shard": shard_idx,
+            "rows": len(rows),
+            "seconds": time.perf_counter() - t0,
+        }
+        for key in ("incremental", "routing"):
+            if key in out["metrics"]:  # type: ignore[operator]
+                msg[key] = out["metrics"][key]  # type: ignore[index]
+        queue.put(msg)
+    except Exception as exc:  # report instead of hanging the parent
+        queue.put({"shard": shard_idx, "error": repr(exc), "seconds": time.perf_counter() - t0})
+
+
+def evaluate_sharded(csv_path: str, *,
+                     workers: int,
+                     output_dir: str,
+                     output_jsonl: Optional[str] = None,
+                     share_models: bool = False,
+                     **run_opts: object) -> Dict[str, object]:
+    """
+    Evaluate the CSV on `workers` processes.
+
+    Retrieval data is loaded once in the parent and inherited copy-on-write by
+    forked children (gc.freeze keeps those pages from being dirtied by the GC).
+    With share_models=True local HF backends are also loaded before forking.
+    Each shard writes shard_<k>.jsonl; they are merged into results.jsonl in CSV order
+    (or into output_jsonl, converted when it has a columnar suffix).
+    run_opts are the keyword options of evaluate_dataset.
+    """
+    global _SHARDS
+    workers = max(int(workers), 1)
+    rows = load_rows(csv_path)
+    _SHARDS = shard_rows(rows, workers)
+
+    # Avoid CPU oversubscription: split cores between workers unless told otherwise
+    if run_opts.get("num_threads") is None:
+        run_opts["num_threads"] = max((os.cpu_count() or 1) // workers, 1)
+    # Each worker has its own scheduler, so split the provider limits between them
+    for key in ("chat_rpm", "chat_tpm"):
+        if run_opts.get(key):
+            run_opts[key] = float(run_opts[key]) / workers  # type: ignore[arg-type]
+
+    preload_shared_data(bool(run_opts.get("include_spsc", True)))
+    if share_models and not run_opts.get("chat_api_base_url"):
+        for task, name in (("text2text-generation", run_opts.get("model_name")),
+                           ("text-generation", run_opts.get("agent_model"))):
+            if name:
+                get_backend(
+                    model_name=str(name),
+                    task=task,
+                    device=int(run_opts.get("device", -1)),  # type: ignore[arg-type]
+                    max_new_tokens=int(run_opts.get("max_new_tokens", 256)),  # type: ignore[arg-type]
+                    backend=str(run_opts.get("backend", "torch")),
+                    num_threads=run_opts.get("num_threads"),  # type: ignore[arg-type]
+                )
+
+    os.makedirs(output_dir, exist_ok=True)
+    shard_paths = [os.path.join(output_dir, f"shard_{k}.jsonl") for k in range(workers)]
+
+    # fork shares the preloaded data; spawn (no fork on this platform) reloads it per worker
+    fork = "fork" in mp.get_all_start_methods()
+    ctx = mp.get_context("fork" if fork else "spawn")
+    queue = ctx.Queue()
+    gc.collect()
+    gc.freeze()
+    t0 = time.perf_counter()
+    procs = []
+    try:
+        for k in range(workers):
+            p = ctx.Process(target=_run_shard, args=(k, None if fork else _SHARDS[k], shard_paths[k], run_opts, queue))
+            p.start()
+            procs.append(p)
+        shard_stats: List[Dict[str, object]] = []
+        while len(shard_stats) < len(procs):
             try:
-                spsc_ctx = retrieve_spsc_contexts(p1, p2, top_k=spsc_top_k)
-                if spsc_ctx:
-                    contexts = contexts + spsc_ctx
-            except Exception:
-                pass
-        analyzer_text = run_analyzer(
-            p1,
-            p2,
-            contexts,
-            model_name=model_name,
-            chat_api_base_url=chat_api_base_url,
-            chat_api_key=chat_api_key,
-            chat_api_model=chat_api_model,
-            device=device,
-            max_new_tokens=max_new_tokens,
-        )
+                shard_stats.append(queue.get(timeout=1.0))
+            except queue_mod.Empty:
+                dead = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+                if dead:
+                    raise RuntimeError(f"Shard worker exited unexpectedly (exit codes {dead})")
+        for p in procs:
+            p.join()
+    finally:
+        gc.unfreeze()
+    wall = time.perf_counter() - t0
 
-        factor_outputs = run_agents(
-            p1,
-            p2,
-            contexts,
-            use_chat_api=bool(chat_api_base_url and chat_api_key and chat_api_model),
-            chat_api_base_url=chat_api_base_url,
-            chat_api_key=chat_api_key,
-            chat_api_model=chat_api_model,
-            default_model=agent_model,
-            device=device,
-            max_new_tokens=max_new_tokens,
+    errors = [s for s in shard_stats if "error" in s]
+    if errors:
+        raise RuntimeError(f"Shard(s) failed: {errors}")
+
+    columnar = bool(output_jsonl) and is_columnar(str(output_jsonl))
+    merged_path = output_jsonl if output_jsonl and not columnar else os.path.join(output_dir, "results.jsonl")
+    merge_jsonl(shard_paths, merged_path, sort_key="row_index")
+
+    shard_stats.sort(key=lambda s: s["shard"])
+    metrics = score_results_file(merged_path, group_keys=GROUP_COLUMNS)
+    if run_opts.get("cascade"):
+        short = sum(1 for row in iter_jsonl(merged_path) if row.get("cascade"))
+        metrics["cascade"] = {"short_circuited": short, "fraction": (short / len(rows)) if rows else None}
+    busy = sum(float(s["seconds"]) for s in shard_stats)
+    # Average number of busy workers; not a speedup (no 1-worker baseline, and
+    # contention between workers inflates every shard's busy time)
+    parallelism = (busy / wall) if wall > 0 else None
+    if columnar:
+        convert_results(
+            merged_path,
+            str(output_jsonl),
+            factors=FACTORS,
+            group_keys=GROUP_COLUMNS,
+            tiers=bool(run_opts.get("route")),
+            verbosity=str(run_opts.get("verbosity", "full")),
         )
-        judged = judge.combine_factor_scores(factor_outputs)
-
-        pred = int(judged.get("overall_similarity", 0))
-        if gold is not None:
-            total += 1
-            if pred == gold:
-                correct += 1
-
-        results.append({
-            "product_1": p1,
-            "product_2": p2,
-            "contexts": contexts,
-            "analyzer": analyzer_text,
-            "factors": factor_outputs,
-            "judge": judged,
-            "gold_overall": gold,
-            "pred_overall": pred,
-        })
-
-    metrics = {
-        "total_labeled": total,
-        "exact_match": (correct / total) if total > 0 else None,
+        merged_path = str(output_jsonl)
+
+    with open(os.path.join(output_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+    return {
+        "metrics": metrics,
+        "results_path": merged_path,
+        "scaling": {
+            "workers": workers,
+            "rows": len(rows),
+            "wall_seconds": round(wall, 3),
+            "shard_busy_seconds": round(busy, 3),
+            "parallelism": round(parallelism, 2) if parallelism is not None else None,
+            "utilization": round(parallelism / workers, 3) if parallelism is not None else None,
+            "shards": [
+                {"shard": s["shard"], "rows": s["rows"], "seconds": round(float(s["seconds"]), 3),  # type: ignore[arg-type]
+                 **{k: s[k] for k in ("incremental", "routing") if k in s}}
+                for s in shard_stats
+            ],
+        },
     }
-    return {"metrics": metrics, "results": results}
+
+
+def _printable(out: Dict[str, object], args: argparse.Namespace) -> Dict[str, object]:
+    if not args.metrics_only:
+        return out
+    return {"metrics": out["metrics"], "results_path": out.get("results_path", args.output_jsonl)}
 
 
 def main() -> int:
@@ -166,10 +1068,85 @@ def main() -> int:
     parser.add_argument("--chat-api-base-url", default=None)
     parser.add_argument("--chat-api-key", default=None)
     parser.add_argument("--chat-api-model", default=None)
+    parser.add_argument("--backend", choices=list(LOCAL_BACKENDS), default="torch", help="Local inference backend for HF models")
+    parser.add_argument("--num-threads", type=int, default=None, help="CPU threads for local inference")
+    parser.add_argument("--chat-rpm", type=float, default=None, help="Client-side chat API limit: requests per minute (enables the adaptive scheduler)")
+    parser.add_argument("--chat-tpm", type=float, default=None, help="Client-side chat API limit: tokens per minute")
+    parser.add_argument("--output-jsonl", default=None, help="Stream per-row results to this file: JSONL, or flat columnar with a .parquet (pyarrow) / .cols (numpy) suffix")
+    parser.add_argument("--metrics-only", action="store_true", help="Print only metrics and the output path instead of every result (use with --output-jsonl)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes (sharded evaluation when > 1)")
+    parser.add_argument("--output-dir", default="eval_shards", help="Directory for shard JSONL outputs (with --workers > 1)")
+    parser.add_argument("--share-models", action="store_true", help="Load local HF models before forking so workers share them")
+    parser.add_argument("--rescore", default=None, help="Recompute metrics from a saved results file (.jsonl/.npz/.parquet/.cols) without inference")
+    parser.add_argument("--cache-columns", action="store_true", help="With --rescore on JSONL, keep a <results>.cols.npz sidecar so later re-scores skip JSON parsing")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap replicates for metric confidence intervals")
+    parser.add_argument("--search-weights", default=None, help="Grid-search judge weights against gold labels on a saved results file")
+    parser.add_argument("--weight-steps", type=int, default=10, help="Grid resolution per factor weight for --search-weights")
+    parser.add_argument("--weight-objective", choices=["accuracy", "mse"], default="accuracy")
+    parser.add_argument("--cascade", action="store_true", help="Resolve clear-cut pairs with a retrieval-only pre-screen; only ambiguous pairs call the models")
+    parser.add_argument("--verbosity", choices=list(VERBOSITY_LEVELS), default="full",
+                        help="Result detail: scores (labels/scores only), compact (+contexts, factor reasoning), full (+analyzer, raw output)")
+    parser.add_argument("--fewshot", choices=list(FEWSHOT_SELECTIONS), default="first", help="Analyzer few-shot examples: the first cases or the nearest to each pair")
+    parser.add_argument("--samples", type=int, default=1, help="Self-consistency: samples per factor prompt, drawn in one request (chat `n` / num_return_sequences)")
+    parser.add_argument("--sample-temperature", type=float, default=0.7, help="Sampling temperature used when --samples > 1")
+    parser.add_argument("--aggregate", choices=list(AGGREGATES), default="majority", help="Combine sampled scores by majority vote or rounded mean")
+    parser.add_argument("--judge-confidence", action="store_true", help="Scale judge weights by each factor's sample agreement")
+    parser.add_argument("--route-small-model", default=None, help="Model routing: score factors with this small model first (chat model name or HF id); low-confidence factors go to the agent model")
+    parser.add_argument("--route-small-task", default="text2text-generation", help="HF pipeline task of a local small model")
+    parser.add_argument("--route-threshold", type=float, default=0.6, help="Escalate factors whose small-model confidence is below this")
+    parser.add_argument("--route-samples", type=int, default=3, help="Small-model samples per factor for agreement confidence")
+    parser.add_argument("--route-confidence", choices=list(CONFIDENCE_SOURCES), default="agreement", help="Confidence from sample agreement or from the score token's logprob (chat API)")
+    parser.add_argument("--routing-report", action="store_true", help="Run both tiers on --csv and report accuracy / escalation / model seconds per threshold")
+    parser.add_argument("--surrogate", default=None, help="Trained surrogate (.npz) as the small routing tier; factors below --route-threshold fall back to the agent model (0 = surrogate only)")
+    parser.add_argument("--surrogate-report", action="store_true", help="Score --csv with --surrogate alone and report metrics vs gold and LLM fallback per threshold (no model calls; hybrid with --baseline)")
+    parser.add_argument("--train-surrogate", nargs="+", default=None, metavar="RESULTS", help="Train a surrogate on the factor scores of these results JSONL files")
+    parser.add_argument("--surrogate-out", default="surrogate.npz", help="Where --train-surrogate writes the model")
+    parser.add_argument("--previous", default=None, help="Earlier results JSONL: reuse analyzer/factor outputs whose prompt hash is unchanged (incremental re-evaluation)")
+    parser.add_argument("--plan", action="store_true", help="With --previous: report the model calls a re-evaluation would make, without running it")
+    parser.add_argument("--cascade-report", action="store_true", help="Report the pre-screen's short-circuit fraction and accuracy on --csv without model calls")
+    parser.add_argument("--baseline", default=None, help="Full-run results JSONL to compare against in --cascade-report / --surrogate-report / --sequential")
+    parser.add_argument("--sequential", action="store_true", help="Evaluate rows in gold-stratified random order and stop once the metric interval (or the paired difference to --baseline) is precise enough")
+    parser.add_argument("--seq-metric", choices=list(STOP_METRICS), default="accuracy", help="Metric whose interval decides when --sequential stops")
+    parser.add_argument("--seq-width", type=float, default=0.1, help="Stop when the interval is at most this wide (paired mode also stops once it excludes 0)")
+    parser.add_argument("--seq-min-rows", type=int, default=30, help="Rows evaluated before the first stopping check")
+    parser.add_argument("--seq-check-every", type=int, default=10, help="Rows between stopping checks")
+    parser.add_argument("--seq-alpha", type=float, default=0.05, help="Interval level 1 - alpha for --sequential (repeated checks: a smaller alpha keeps early stops honest)")
+    parser.add_argument("--seed", type=int, default=0, help="Row order seed for --sequential")
     args = parser.parse_args()
 
-    out = evaluate_dataset(
-        args.csv,
+    if args.train_surrogate:
+        model, report = train_surrogate(args.train_surrogate, FACTORS, include_spsc=(not args.no_spsc),
+                                        judge_weights=default_judge().weights)
+        model.save(args.surrogate_out)
+        print(json.dumps({"model": args.surrogate_out, **report}, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.surrogate_report:
+        if not args.surrogate:
+            parser.error("--surrogate-report needs --surrogate")
+        print(json.dumps(surrogate_report(args.csv, args.surrogate, baseline_jsonl=args.baseline), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.cascade_report:
+        report = cascade_report(args.csv, baseline_jsonl=args.baseline, include_spsc=(not args.no_spsc))
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.search_weights:
+        print(json.dumps(search_judge_weights(
+            args.search_weights,
+            steps=args.weight_steps,
+            objective=args.weight_objective,
+            judge_confidence=args.judge_confidence,
+        ), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.rescore:
+        metrics = score_results_file(args.rescore, group_keys=GROUP_COLUMNS, n_boot=args.bootstrap, cache=args.cache_columns)
+        print(json.dumps({"metrics": metrics}, ensure_ascii=False, indent=2))
+        return 0
+
+    run_opts = dict(
         model_name=args.analyzer_model or None,
         agent_model=args.agent_model,
         chat_api_base_url=args.chat_api_base_url,
@@ -179,12 +1156,78 @@ def main() -> int:
         max_new_tokens=args.max_new_tokens,
         include_spsc=(not args.no_spsc),
         spsc_top_k=args.spsc_top_k,
+        backend=args.backend,
+        num_threads=args.num_threads,
+        chat_rpm=args.chat_rpm,
+        chat_tpm=args.chat_tpm,
+        cascade=args.cascade,
+        verbosity=args.verbosity,
+        fewshot_selection=args.fewshot,
+        samples=args.samples,
+        sample_temperature=args.sample_temperature,
+        aggregate=args.aggregate,
+        judge_confidence=args.judge_confidence,
     )
-    print(json.dumps(out, ensure_ascii=False, indent=2))
+    if args.routing_report and not (args.route_small_model or args.surrogate):
+        parser.error("--routing-report needs --route-small-model or --surrogate")
+    if args.route_small_model and args.surrogate:
+        parser.error("--route-small-model and --surrogate are alternative small tiers")
+    if args.route_small_model and args.route_confidence == "logprob" and not (
+            args.chat_api_base_url and args.chat_api_key and args.chat_api_model):
+        parser.error("--route-confidence logprob needs the chat API (local HF models report no score probabilities)")
+    if args.route_small_model or args.surrogate:
+        run_opts["route"] = dict(
+            route_small_model=args.route_small_model,
+            surrogate=args.surrogate,
+            route_small_task=args.route_small_task,
+            route_threshold=args.route_threshold,
+            route_samples=args.route_samples,
+            route_confidence=args.route_confidence,
+        )
+        if args.routing_report:
+            route = run_opts.pop("route")
+            print(json.dumps(routing_report(args.csv, route, **run_opts), ensure_ascii=False, indent=2))  # type: ignore[arg-type]
+            return 0
+    if args.previous:
+        if is_columnar(args.previous):
+            parser.error("--previous needs a results JSONL file; columnar results do not keep the row hashes")
+        previous = PreviousResults.from_jsonl(args.previous)
+        if args.plan:
+            print(json.dumps(plan_reevaluation(args.csv, previous, **run_opts), ensure_ascii=False, indent=2))
+            return 0
+        run_opts["previous"] = previous
+    if args.sequential:
+        if args.workers > 1:
+            parser.error("--sequential runs in a single process")
+        config = SequentialConfig(
+            metric=args.seq_metric,
+            max_width=args.seq_width,
+            min_rows=args.seq_min_rows,
+            check_every=args.seq_check_every,
+            alpha=args.seq_alpha,
+            seed=args.seed,
+        )
+        out = evaluate_sequential(args.csv, config=config, baseline_jsonl=args.baseline, output_jsonl=args.output_jsonl,
+                                  n_boot=args.bootstrap, keep_results=not args.metrics_only, **run_opts)
+        print(json.dumps(_printable(out, args), ensure_ascii=False, indent=2))
+        return 0
+    if args.workers > 1:
+        out = evaluate_sharded(
+            args.csv,
+            workers=args.workers,
+            output_dir=args.output_dir,
+            output_jsonl=args.output_jsonl,
+            share_models=args.share_models,
+            **run_opts,
+        )
+        print(json.dumps(_printable(out, args), ensure_ascii=False, indent=2))
+        return 0
+
+    out = evaluate_dataset(args.csv, output_jsonl=args.output_jsonl, n_boot=args.bootstrap,
+                           keep_results=not args.metrics_only, **run_opts)
+    print(json.dumps(_printable(out, args), ensure_ascii=False, indent=2))
     return 0
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
-
@@ -8,19 +8,29 @@ Includes:
 """
 
 from .prompt import build_prompt, format_fewshot
+from .fewshot import select_fewshot_blocks
 from .retriever import retrieve_contexts
 from .model import LLMWrapper
+from .backends import InferenceBackend, get_backend
 from .pipeline import run_similarity, parse_scores
+from .parsing import parse_many
+from .cache import cache_stats, preload
 from .agents import FactorAgent, FactorAgentConfig, evaluate_multiple_factors
 from .judge import LLMJudge, JudgeConfig
 
 __all__ = [
 	"build_prompt",
 	"format_fewshot",
+	"select_fewshot_blocks",
 	"retrieve_contexts",
 	"LLMWrapper",
+	"InferenceBackend",
+	"get_backend",
 	"run_similarity",
 	"parse_scores",
+	"parse_many",
+	"preload",
+	"cache_stats",
     "FactorAgent",
     "FactorAgentConfig",
     "evaluate_multiple_factors",
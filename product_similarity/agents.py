@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
+
+from .backends import InferenceBackend, get_backend
+from .consistency import aggregate_scores, sample_texts
+from .parsing import parse_factor_score
 
 
 DEFAULT_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
@@ -39,6 +43,18 @@ class FactorAgentConfig:
 	max_new_tokens: int = 256
 	temperature: float = 0.0
 	top_p: float = 1.0
+	backend: str = "torch"  # "torch" | "int8" | "onnx" (see model.LOCAL_BACKENDS)
+	num_threads: Optional[int] = None
+	# Stream chat completions and stop reading once the score is parsed
+	stream: bool = False
+	# Self-consistency: samples > 1 draws that many completions in one call
+	# (use temperature > 0) and combines their scores ("majority" | "mean")
+	samples: int = 1
+	aggregate: str = "majority"
+	# Single-sample confidence from the score token's probability (chat API logprobs)
+	score_logprobs: bool = False
+	# HF pipeline task: "text-generation" (instruction LMs) or "text2text-generation" (e.g. flan-t5)
+	task: str = "text-generation"
 
 
 class FactorAgent:
@@ -46,7 +62,8 @@ class FactorAgent:
 	Evaluate a single factor using a dedicated HF/NVIDIA pipeline.
 
 	By default uses a Hugging Face text-generation pipeline for instruction models.
-	Set per-factor model overrides via constructor map.
+	Set per-factor model overrides via constructor map, or pass any
+	InferenceBackend (e.g. a ChatAPIWrapper pointed at the stub server).
 	"""
 
 	def __init__(
@@ -58,6 +75,9 @@ class FactorAgent:
 		chat_api_base_url: Optional[str] = None,
 		chat_api_key: Optional[str] = None,
 		chat_api_model: Optional[str] = None,
+		inference_backend: Optional[InferenceBackend] = None,
+		chat_rpm: Optional[float] = None,
+		chat_tpm: Optional[float] = None,
 	):
 		self._default = default or FactorAgentConfig()
 		self._per_factor = per_factor or {}
@@ -65,71 +85,75 @@ class FactorAgent:
 		self._chat_base = chat_api_base_url
 		self._chat_key = chat_api_key
 		self._chat_model = chat_api_model
-
-		self._pipeline_cache: Dict[str, object] = {}
+		self._chat_rpm = chat_rpm
+		self._chat_tpm = chat_tpm
+		# An explicit backend overrides both the chat API and the HF model settings
+		self._inference_backend = inference_backend
 
 	def _get_config(self, factor_name: str) -> FactorAgentConfig:
 		return self._per_factor.get(factor_name, self._default)
 
-	def _get_pipeline(self, model_name: str, device: int) -> object:
-		if model_name in self._pipeline_cache:
-			return self._pipeline_cache[model_name]
-		try:
-			from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline  # type: ignore
-		except Exception as exc:
-			raise RuntimeError(
-				"Transformers is required for FactorAgent. Install with: pip install transformers accelerate"
-			) from exc
-		tokenizer = AutoTokenizer.from_pretrained(model_name)
-		model = AutoModelForCausalLM.from_pretrained(model_name)
-		pipe = pipeline(
-			"text-generation",
-			model=model,
-			tokenizer=tokenizer,
-			device=device,
-		)
-		self._pipeline_cache[model_name] = pipe
-		return pipe
-
-	def _run_hf(self, cfg: FactorAgentConfig, prompt: str) -> str:
-		pipe = self._get_pipeline(cfg.model_name, cfg.device)
-		out = pipe(
-			prompt,
-			max_new_tokens=cfg.max_new_tokens,
-			temperature=cfg.temperature,
-			top_p=cfg.top_p,
-			do_sample=cfg.temperature > 0.0,
-		)[0]["generated_text"]
-		return str(out).strip()
-
-	def _run_chat(self, prompt: str, cfg: FactorAgentConfig) -> str:
-		if not (self._chat_base and self._chat_key and self._chat_model):
-			raise RuntimeError("Chat API configuration is incomplete for FactorAgent.")
-		try:
-			from openai import OpenAI  # type: ignore
-		except Exception as exc:
-			raise RuntimeError("Install openai for chat API: pip install openai") from exc
-		client = OpenAI(base_url=str(self._chat_base), api_key=str(self._chat_key))
-		resp = client.chat.completions.create(
-			model=str(self._chat_model),
-			messages=[{"role": "user", "content": prompt}],
-			max_tokens=cfg.max_new_tokens,
-			temperature=max(cfg.temperature, 0.0),
-			top_p=cfg.top_p,
-			stream=False,
-		)
-		msg = resp.choices[0].message
-		reasoning = getattr(msg, "reasoning_content", None)
-		content = (getattr(msg, "content", None) or "").strip()
-		if reasoning:
-			return (str(reasoning).strip() + "\n" + content).strip()
-		return content
+	def _get_backend(self, cfg: FactorAgentConfig) -> InferenceBackend:
+		if self._inference_backend is not None:
+			return self._inference_backend
+		if self._use_chat_api:
+			if not (self._chat_base and self._chat_key and self._chat_model):
+				raise RuntimeError("Chat API configuration is incomplete for FactorAgent.")
+			backend = get_backend(
+				chat_api_base_url=self._chat_base,
+				chat_api_key=self._chat_key,
+				chat_api_model=self._chat_model,
+				max_new_tokens=cfg.max_new_tokens,
+				chat_rpm=self._chat_rpm,
+				chat_tpm=self._chat_tpm,
+			)
+		else:
+			backend = get_backend(
+				model_name=cfg.model_name,
+				task=cfg.task,
+				device=cfg.device,
+				max_new_tokens=cfg.max_new_tokens,
+				backend=cfg.backend,
+				num_threads=cfg.num_threads,
+			)
+		assert backend is not None
+		return backend
+
+	def _generate(
+		self,
+		cfg: FactorAgentConfig,
+		prompt: str,
+		on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+	) -> str:
+		backend = self._get_backend(cfg)
+		run_streaming = getattr(backend, "run_streaming", None)
+		if (cfg.stream or on_update is not None) and run_streaming is not None:
+			return run_streaming(
+				prompt,
+				temperature=max(cfg.temperature, 0.0),
+				top_p=cfg.top_p,
+				fields=("score",),
+				stop_when_scored=True,
+				on_update=on_update,
+			)
+		text = backend.run(prompt, temperature=max(cfg.temperature, 0.0), top_p=cfg.top_p)
+		if on_update is not None:
+			# Backends without streaming report a single final update
+			on_update({"delta": text, "reasoning_delta": "", "scores": {"score": self._parse_score(text)}, "done": True, "stopped_early": False, "text": text})
+		return text
+
+	async def _agenerate(self, cfg: FactorAgentConfig, prompt: str) -> str:
+		backend = self._get_backend(cfg)
+		return await backend.arun(prompt, temperature=max(cfg.temperature, 0.0), top_p=cfg.top_p)
 
 	@staticmethod
 	def _parse_score(output_text: str) -> Optional[int]:
-		import re
-		m = re.search(r"Score\s*[:\-]\s*(\d)", output_text, flags=re.IGNORECASE)
-		return int(m.group(1)) if m else None
+		return parse_factor_score(output_text)
+
+	@staticmethod
+	def build_prompt(factor_name: str, product_1: str, product_2: str, context: Optional[str] = None) -> str:
+		"""The exact prompt evaluate() sends for this factor (also hashed for incremental re-evaluation)."""
+		return _build_agent_prompt(factor_name, product_1, product_2, context)
 
 	def evaluate(
 		self,
@@ -137,17 +161,51 @@ class FactorAgent:
 		product_1: str,
 		product_2: str,
 		context: Optional[str] = None,
+		on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
 	) -> Dict[str, Optional[object]]:
 		"""
 		Run the agent for one factor and return a dict with text and score.
-		Keys: factor, reasoning_text, raw_output, score
+		Keys: factor, reasoning_text, raw_output, score (+ samples, spread and
+		confidence when the factor's config has samples > 1; confidence alone
+		with score_logprobs on a backend that reports logprobs)
+		on_update (chat API) receives partial results while the completion
+		streams; the stream is closed as soon as the score has been parsed.
 		"""
 		cfg = self._get_config(factor_name)
-		prompt = _build_agent_prompt(factor_name, product_1, product_2, context)
-		if self._use_chat_api:
-			generated = self._run_chat(prompt, cfg)
-		else:
-			generated = self._run_hf(cfg, prompt)
+		prompt = self.build_prompt(factor_name, product_1, product_2, context)
+		if cfg.samples > 1:
+			texts = sample_texts(self._get_backend(cfg), prompt, cfg.samples, temperature=max(cfg.temperature, 0.0), top_p=cfg.top_p)
+			return self._to_sampled_result(factor_name, texts, cfg.aggregate)
+		if cfg.score_logprobs:
+			run_with_confidence = getattr(self._get_backend(cfg), "run_with_confidence", None)
+			if run_with_confidence is not None:
+				generated, confidence = run_with_confidence(prompt, temperature=max(cfg.temperature, 0.0), top_p=cfg.top_p)
+				return {**self._to_result(factor_name, generated), "confidence": confidence}
+		generated = self._generate(cfg, prompt, on_update)
+		return self._to_result(factor_name, generated)
+
+	async def aevaluate(
+		self,
+		factor_name: str,
+		product_1: str,
+		product_2: str,
+		context: Optional[str] = None,
+	) -> Dict[str, Optional[object]]:
+		"""
+		Async variant of evaluate(); lets several factors/pairs share one event loop.
+		"""
+		cfg = self._get_config(factor_name)
+		prompt = self.build_prompt(factor_name, product_1, product_2, context)
+		if cfg.samples > 1:
+			import asyncio
+			texts = await asyncio.to_thread(
+				sample_texts, self._get_backend(cfg), prompt, cfg.samples, temperature=max(cfg.temperature, 0.0), top_p=cfg.top_p
+			)
+			return self._to_sampled_result(factor_name, texts, cfg.aggregate)
+		generated = await self._agenerate(cfg, prompt)
+		return self._to_result(factor_name, generated)
+
+	def _to_result(self, factor_name: str, generated: str) -> Dict[str, Optional[object]]:
 		score = self._parse_score(generated)
 		return {
 			"factor": factor_name,
@@ -156,6 +214,24 @@ class FactorAgent:
 			"score": score,
 		}
 
+	def _to_sampled_result(self, factor_name: str, texts: List[str], aggregate: str) -> Dict[str, Optional[object]]:
+		"""
+		Aggregate of several samples; the reasoning shown is the first sample
+		that agrees with the aggregated score. Adds samples, spread and confidence.
+		"""
+		scores = [self._parse_score(t) for t in texts]
+		agg = aggregate_scores(scores, aggregate)
+		text = next((t for t, s in zip(texts, scores) if s == agg.score), texts[0] if texts else "")
+		return {
+			"factor": factor_name,
+			"reasoning_text": text,
+			"raw_output": text,
+			"score": agg.score,
+			"samples": list(agg.scores),
+			"spread": agg.spread,
+			"confidence": agg.confidence,
+		}
+
 
 def evaluate_multiple_factors(
 	agent: FactorAgent,
@@ -171,3 +247,18 @@ def evaluate_multiple_factors(
 	return results
 
 
+async def aevaluate_multiple_factors(
+	agent: FactorAgent,
+	product_1: str,
+	product_2: str,
+	factors: list[str],
+	contexts: Optional[Dict[str, str]] = None,
+) -> Dict[str, Dict[str, Optional[object]]]:
+	"""
+	Concurrent variant of evaluate_multiple_factors() (all factors in flight at once).
+	"""
+	import asyncio
+	outs = await asyncio.gather(*[
+		agent.aevaluate(f, product_1, product_2, (contexts or {}).get(f)) for f in factors
+	])
+	return {f: out for f, out in zip(factors, outs)}
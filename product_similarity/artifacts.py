@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+	"""
+	Hex SHA-256 of a file's bytes, read in chunks.
+	"""
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(chunk_size), b""):
+			h.update(block)
+	return h.hexdigest()
+
+
+def content_hash(obj: Any) -> str:
+	"""
+	Hex SHA-256 of a JSON-serializable object (key order independent).
+	"""
+	data = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+	"""
+	Cheap change marker (mtime_ns, size); None if the file does not exist.
+	"""
+	try:
+		st = os.stat(path)
+	except FileNotFoundError:
+		return None
+	return (st.st_mtime_ns, st.st_size)
+
+
+def atomic_write_json(path: str, obj: Any, *, indent: Optional[int] = None) -> None:
+	"""
+	Write JSON to a temp file in the target directory, then os.replace() it over path.
+	Readers never observe a partially written file.
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+	fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+	try:
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			json.dump(obj, f, ensure_ascii=False, indent=indent)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp_path, path)
+	except BaseException:
+		try:
+			os.remove(tmp_path)
+		except OSError:
+			pass
+		raise
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+	"""
+	Load a build manifest, or an empty one if missing/corrupt.
+	"""
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			data = json.load(f)
+		return data if isinstance(data, dict) else {}
+	except (FileNotFoundError, ValueError):
+		return {}
+
+
+def reload_changed_artifacts() -> Dict[str, bool]:
+	"""
+	Hot-reload NICE chunks and the SPSC tree in this process if their files changed.
+	"""
+	from .retriever import reload_nice_if_changed
+	from .spsc import reload_spsc_if_changed
+	return {"nice": reload_nice_if_changed(), "spsc": reload_spsc_if_changed()}
+
+
+def start_reload_watcher(interval: float = 5.0) -> threading.Event:
+	"""
+	Poll artifact files every `interval` seconds from a daemon thread and reload
+	them when they change (e.g. after `cli.py build-nice`). Set the returned event to stop.
+	"""
+	stop = threading.Event()
+
+	def _loop() -> None:
+		while not stop.wait(interval):
+			try:
+				reload_changed_artifacts()
+			except Exception:
+				# A half-finished external edit must not kill the watcher; retry next tick
+				pass
+
+	threading.Thread(target=_loop, name="artifact-reload", daemon=True).start()
+	return stop
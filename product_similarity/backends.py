@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple, runtime_checkable
+
+
+@runtime_checkable
+class InferenceBackend(Protocol):
+	"""
+	Common interface for text generation backends.
+
+	Implemented by model.LLMWrapper (local HF pipelines) and
+	model.ChatAPIWrapper (OpenAI-compatible chat APIs).
+	"""
+
+	def run(self, prompt: str, *, temperature: float = ..., top_p: float = ..., **kwargs: Any) -> str:
+		...
+
+	async def arun(self, prompt: str, *, temperature: float = ..., top_p: float = ..., **kwargs: Any) -> str:
+		...
+
+	def run_batch(self, prompts: Sequence[str], *, temperature: float = ..., top_p: float = ..., **kwargs: Any) -> List[str]:
+		...
+
+
+# Backends are expensive to build (model weights, HTTP connection pools), so
+# they are shared per process and keyed by their full configuration.
+_BACKEND_CACHE: Dict[Tuple[Any, ...], InferenceBackend] = {}
+_BACKEND_LOCK = threading.Lock()
+# Provider rate limits apply per API key, so every model reached through one
+# (base_url, api_key) shares a single scheduler and rpm/tpm budget.
+_SCHEDULERS: Dict[Tuple[str, str], Any] = {}
+
+
+def get_backend(
+	*,
+	model_name: Optional[str] = None,
+	chat_api_base_url: Optional[str] = None,
+	chat_api_key: Optional[str] = None,
+	chat_api_model: Optional[str] = None,
+	task: str = "text2text-generation",
+	device: int = -1,
+	max_new_tokens: int = 256,
+	backend: str = "torch",
+	num_threads: Optional[int] = None,
+	chat_rpm: Optional[float] = None,
+	chat_tpm: Optional[float] = None,
+) -> Optional[InferenceBackend]:
+	"""
+	Return a cached backend for the given configuration.
+	Chat API settings take precedence over model_name; returns None when neither is set.
+	chat_rpm / chat_tpm put the chat backend behind a RequestScheduler
+	(rate limits, adaptive concurrency, retry on 429) shared by all models on
+	the same base URL and API key; the first backend's limits configure it.
+	"""
+	if chat_api_base_url and chat_api_key and chat_api_model:
+		key: Tuple[Any, ...] = ("chat", str(chat_api_base_url), str(chat_api_key), str(chat_api_model), max_new_tokens, chat_rpm, chat_tpm)
+	elif model_name:
+		key = ("hf", model_name, task, device, max_new_tokens, backend, num_threads)
+	else:
+		return None
+
+	with _BACKEND_LOCK:
+		cached = _BACKEND_CACHE.get(key)
+		if cached is not None:
+			return cached
+		from .model import ChatAPIWrapper, LLMWrapper
+		if key[0] == "chat":
+			scheduler = None
+			if chat_rpm or chat_tpm:
+				from .scheduler import RequestScheduler
+				account = (str(chat_api_base_url), str(chat_api_key))
+				scheduler = _SCHEDULERS.get(account)
+				if scheduler is None:
+					scheduler = _SCHEDULERS[account] = RequestScheduler(rpm=chat_rpm, tpm=chat_tpm)
+			instance: InferenceBackend = ChatAPIWrapper(
+				base_url=str(chat_api_base_url),
+				api_key=str(chat_api_key),
+				model=str(chat_api_model),
+				max_tokens=max_new_tokens,
+				scheduler=scheduler,
+			)
+		else:
+			instance = LLMWrapper(
+				model_name=str(model_name),
+				device=device,
+				max_new_tokens=max_new_tokens,
+				task=task,
+				backend=backend,
+				num_threads=num_threads,
+			)
+		_BACKEND_CACHE[key] = instance
+		return instance
+
+
+def clear_backend_cache() -> None:
+	"""
+	Drop all cached backends (releases model memory once no one else holds them).
+	"""
+	with _BACKEND_LOCK:
+		_BACKEND_CACHE.clear()
+		_SCHEDULERS.clear()
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Hashable, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+
+def approx_size(obj: Any) -> int:
+	"""
+	Rough deep size in bytes of containers, strings, NumPy arrays and plain objects
+	(shared objects counted once).
+	"""
+	seen = set()
+	total = 0
+	stack = [obj]
+	while stack:
+		o = stack.pop()
+		if id(o) in seen:
+			continue
+		seen.add(id(o))
+		nbytes = getattr(o, "nbytes", None)
+		if isinstance(nbytes, int) and hasattr(o, "dtype"):
+			total += sys.getsizeof(o) if getattr(o, "base", None) is None else nbytes
+			continue
+		total += sys.getsizeof(o)
+		if isinstance(o, dict):
+			stack.extend(o.keys())
+			stack.extend(o.values())
+		elif isinstance(o, (list, tuple, set, frozenset)):
+			stack.extend(o)
+		elif isinstance(o, (str, bytes, int, float, bool, type(None))):
+			continue
+		else:
+			d = getattr(o, "__dict__", None)
+			if d is not None:
+				stack.append(d)
+			for name in getattr(type(o), "__slots__", ()):
+				if hasattr(o, name):
+					stack.append(getattr(o, name))
+	return total
+
+
+class _Entry(NamedTuple):
+	value: Any
+	signature: Optional[Hashable]
+	source: Any  # value of the cache this one is derived from
+	loaded_at: float
+	seconds: float
+	nbytes: Optional[int]
+
+
+_REGISTRY: Dict[str, "DataCache[Any]"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class DataCache(Generic[T]):
+	"""
+	Process-wide lazily loaded value, e.g. a parsed data file.
+
+	Once loaded, get() is a single attribute read with no locking. On a miss
+	the first caller loads under the lock while concurrent callers wait for
+	that result (single flight), so a thread pool never loads the same file
+	twice. `signature` returns a cheap change marker (file mtime/size);
+	reload_if_changed() loads a fresh value and swaps it in with one
+	assignment, so readers see either the old or the new value.
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		loader: Callable[[], T],
+		*,
+		signature: Optional[Callable[[], Optional[Hashable]]] = None,
+		measure_memory: bool = True,
+	) -> None:
+		self.name = name
+		self._loader = loader
+		self._signature = signature
+		self.measure_memory = measure_memory
+		self._entry: Optional[_Entry] = None
+		self._lock = threading.Lock()
+		self.loads = 0
+		self.reloads = 0
+		self.coalesced = 0  # misses that waited for another thread's load
+		self.total_load_seconds = 0.0
+		with _REGISTRY_LOCK:
+			_REGISTRY[name] = self
+
+	@property
+	def loaded(self) -> bool:
+		return self._entry is not None
+
+	def _build(self, source: Any = None) -> T:
+		return self._loader()
+
+	def _store(self, value: T, signature: Optional[Hashable], source: Any, t0: float) -> None:
+		seconds = time.perf_counter() - t0
+		nbytes = approx_size(value) if self.measure_memory else None
+		self._entry = _Entry(value, signature, source, time.time(), seconds, nbytes)
+		self.loads += 1
+		self.total_load_seconds += seconds
+
+	def _current_signature(self) -> Optional[Hashable]:
+		return self._signature() if self._signature is not None else None
+
+	def get(self) -> T:
+		entry = self._entry
+		if entry is not None:
+			return entry.value
+		if self._lock.locked():
+			self.coalesced += 1
+		with self._lock:
+			entry = self._entry
+			if entry is None:
+				t0 = time.perf_counter()
+				# Marker read before loading: a change during the load triggers another reload later
+				sig = self._current_signature()
+				self._store(self._build(), sig, None, t0)
+				entry = self._entry
+			return entry.value  # type: ignore[union-attr]
+
+	def reload_if_changed(self) -> bool:
+		"""
+		Reload if the signature changed since the value was loaded (no-op
+		when never loaded or when the source disappeared). Returns True on reload.
+		"""
+		entry = self._entry
+		if entry is None or self._signature is None:
+			return False
+		sig = self._current_signature()
+		if sig is None or sig == entry.signature:
+			return False
+		with self._lock:
+			entry = self._entry
+			if entry is None or sig == entry.signature:
+				return False
+			t0 = time.perf_counter()
+			self._store(self._build(), sig, None, t0)
+			self.reloads += 1
+		return True
+
+	def invalidate(self) -> None:
+		"""Drop the value; the next get() loads it again."""
+		with self._lock:
+			self._entry = None
+
+	def derive(self, name: str, build: Callable[[T], S], *, measure_memory: bool = True) -> "DerivedCache[T, S]":
+		"""
+		Cache of build(value), rebuilt (single flight) whenever this cache's value is replaced.
+		"""
+		return DerivedCache(name, self, build, measure_memory=measure_memory)
+
+	def stats(self) -> Dict[str, Any]:
+		entry = self._entry
+		return {
+			"loaded": entry is not None,
+			"loads": self.loads,
+			"reloads": self.reloads,
+			"coalesced_misses": self.coalesced,
+			"last_load_seconds": round(entry.seconds, 4) if entry else None,
+			"total_load_seconds": round(self.total_load_seconds, 4),
+			"approx_bytes": entry.nbytes if entry else None,
+			"loaded_at": entry.loaded_at if entry else None,
+		}
+
+
+class DerivedCache(DataCache[S], Generic[T, S]):
+	"""
+	Value computed from another cache's value (e.g. an index over loaded data).
+	"""
+
+	def __init__(self, name: str, source: DataCache[T], build: Callable[[T], S], *, measure_memory: bool = True) -> None:
+		super().__init__(name, lambda: build(source.get()), measure_memory=measure_memory)
+		self.source_cache = source
+		self._build_fn = build
+
+	def get_with_source(self) -> Tuple[T, S]:
+		"""The source value together with the value built from it (always consistent)."""
+		src = self.source_cache.get()
+		entry = self._entry
+		if entry is not None and entry.source is src:
+			return src, entry.value
+		if self._lock.locked():
+			self.coalesced += 1
+		with self._lock:
+			entry = self._entry
+			if entry is None or entry.source is not src:
+				if entry is not None:
+					self.reloads += 1
+				t0 = time.perf_counter()
+				self._store(self._build_fn(src), None, src, t0)
+				entry = self._entry
+			return src, entry.value  # type: ignore[union-attr]
+
+	def get(self) -> S:
+		return self.get_with_source()[1]
+
+	def reload_if_changed(self) -> bool:
+		# Follows the source: rebuilt lazily on the next get() after the source reloads
+		return False
+
+
+def _register_builtin() -> None:
+	# Importing the data modules registers their caches
+	from . import fewshot, retriever, spsc, spsc_hierarchy  # noqa: F401
+
+
+def registered_caches() -> List[str]:
+	_register_builtin()
+	with _REGISTRY_LOCK:
+		return list(_REGISTRY)
+
+
+def get_cache(name: str) -> DataCache[Any]:
+	_register_builtin()
+	try:
+		return _REGISTRY[name]
+	except KeyError:
+		raise KeyError(f"Unknown cache {name!r}; registered: {', '.join(_REGISTRY)}") from None
+
+
+def preload(names: Optional[Iterable[str]] = None, *, ignore_missing: bool = True) -> Dict[str, Dict[str, Any]]:
+	"""
+	Load caches up front (all registered ones by default), e.g. when a server
+	starts or before forking workers. Missing data files are skipped unless
+	ignore_missing=False. Returns cache_stats() for the requested caches.
+	"""
+	selected = list(names) if names is not None else registered_caches()
+	out: Dict[str, Dict[str, Any]] = {}
+	for name in selected:
+		cache = get_cache(name)
+		try:
+			cache.get()
+			out[name] = cache.stats()
+		except FileNotFoundError as exc:
+			if not ignore_missing:
+				raise
+			out[name] = {**cache.stats(), "error": str(exc)}
+	return out
+
+
+def reload_changed(names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+	"""
+	reload_if_changed() on each (loaded) cache; derived caches follow their source.
+	"""
+	selected = list(names) if names is not None else registered_caches()
+	return {name: get_cache(name).reload_if_changed() for name in selected}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+	"""Load time, reload counts and approximate memory of every registered cache."""
+	_register_builtin()
+	with _REGISTRY_LOCK:
+		caches = list(_REGISTRY.values())
+	return {c.name: c.stats() for c in caches}
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .retriever import _get_nice_index
+from .spsc_hierarchy import spsc_proximity
+from .term_index import extract_terms, normalize_product
+
+
+@dataclass
+class CascadeConfig:
+	nice_top: int = 3  # NICE classes kept per product
+	spsc_top: int = 3  # SPSC nodes kept per product
+	# Pairs at or below this cheap similarity are resolved as score 0 ...
+	low_threshold: float = 0.0
+	# ... but only when both products matched something in NICE (otherwise we know nothing)
+	require_signal: bool = True
+	# Identical normalized descriptions are resolved as score 4
+	resolve_identical: bool = True
+	include_spsc: bool = True
+	weights: Dict[str, float] = field(default_factory=lambda: {"class": 0.4, "spsc": 0.4, "terms": 0.2})
+
+
+@dataclass
+class PreScreen:
+	class_overlap: float
+	spsc_overlap: float
+	term_overlap: float
+	similarity: float
+	resolved: bool
+	score: Optional[int]
+	reason: str
+	classes_1: List[str]
+	classes_2: List[str]
+
+	def as_dict(self) -> Dict[str, object]:
+		return asdict(self)
+
+
+def _jaccard(a: object, b: object) -> float:
+	sa, sb = set(a), set(b)  # type: ignore[call-overload]
+	union = sa | sb
+	return len(sa & sb) / len(union) if union else 0.0
+
+
+def class_overlap(product_1: str, product_2: str, *, top: int = 3) -> Tuple[float, List[str], List[str]]:
+	"""
+	Jaccard overlap of each product's top NICE classes (keyword retrieval per product).
+	"""
+	chunks, index = _get_nice_index()
+	c1 = [str(chunks[i].get("class_number", "")) for i in index.product_top(product_1, top)]
+	c2 = [str(chunks[i].get("class_number", "")) for i in index.product_top(product_2, top)]
+	return _jaccard(c1, c2), c1, c2
+
+
+def spsc_overlap(product_1: str, product_2: str, *, top: int = 3) -> float:
+	"""
+	Best shared SPSC path-prefix depth between the products' top nodes,
+	normalized by the deeper of the two paths (0 = different segments).
+	Answered by LCA depth on the precomputed hierarchy.
+	"""
+	return spsc_proximity(product_1, product_2, top=top)
+
+
+def prescreen(
+	product_1: str,
+	product_2: str,
+	*,
+	class_1: Optional[object] = None,
+	class_2: Optional[object] = None,
+	config: Optional[CascadeConfig] = None,
+) -> PreScreen:
+	"""
+	Cheap retrieval-only similarity for a pair and whether it can skip the LLM.
+	Known NICE classes (class_1/class_2) replace the keyword-retrieved ones.
+	"""
+	cfg = config or CascadeConfig()
+	if class_1 and class_2:
+		c1, c2 = [str(class_1).strip()], [str(class_2).strip()]
+		cls = _jaccard(c1, c2)
+	else:
+		cls, c1, c2 = class_overlap(product_1, product_2, top=cfg.nice_top)
+	spsc = 0.0
+	if cfg.include_spsc:
+		try:
+			spsc = spsc_overlap(product_1, product_2, top=cfg.spsc_top)
+		except FileNotFoundError:
+			spsc = 0.0
+	terms = _jaccard(extract_terms(product_1), extract_terms(product_2))
+	w = cfg.weights
+	total_w = sum(w.values()) or 1.0
+	similarity = (w.get("class", 0.0) * cls + w.get("spsc", 0.0) * spsc + w.get("terms", 0.0) * terms) / total_w
+
+	resolved, score, reason = False, None, "ambiguous"
+	if cfg.resolve_identical and normalize_product(product_1) and normalize_product(product_1) == normalize_product(product_2):
+		resolved, score, reason = True, 4, "identical"
+	elif similarity <= cfg.low_threshold:
+		if not cfg.require_signal or (c1 and c2):
+			resolved, score, reason = True, 0, "no_overlap"
+		else:
+			reason = "no_signal"
+	return PreScreen(
+		class_overlap=round(cls, 4),
+		spsc_overlap=round(spsc, 4),
+		term_overlap=round(terms, 4),
+		similarity=round(similarity, 4),
+		resolved=resolved,
+		score=score,
+		reason=reason,
+		classes_1=c1,
+		classes_2=c2,
+	)
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import csv
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retriever import _get_nice_index
+from .term_index import TermIndex, extract_terms
+
+
+# (query, catalog product) -> similarity score (higher is more similar), None if unscored
+Scorer = Callable[[str, str], Optional[float]]
+
+
+@dataclass
+class CatalogConfig:
+	nice_top: int = 3  # NICE classes kept per product
+	spsc_top: int = 3  # SPSC nodes kept per product
+	# SPSC ancestor depth used as a block key (1 = segment, 2 = family, ...)
+	block_depth: int = 2
+	# Terms found in more than this fraction of the catalog do not open a block (still scored)
+	max_df: float = 0.05
+	candidates: int = 50  # blocked items kept (by pre-score) for model scoring
+	include_spsc: bool = True
+	# Same pre-score as the cascade: class Jaccard, SPSC proximity, term Jaccard
+	weights: Dict[str, float] = field(default_factory=lambda: {"class": 0.4, "spsc": 0.4, "terms": 0.2})
+
+
+class _TermMatcher:
+	"""
+	TermIndex.product_top() with per-term (blob index, count) arrays kept for
+	the whole catalog vocabulary and dense NumPy accumulation, since catalog
+	products hit many more distinct terms than the shared LRUs hold.
+	"""
+
+	def __init__(self, index: TermIndex) -> None:
+		self.index = index
+		self.size = len(index.blobs)
+		self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+	def _term(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+		arrays = self._arrays.get(term)
+		if arrays is None:
+			vec = self.index.term_vector(term)
+			arrays = (np.fromiter(vec.keys(), dtype=np.int64, count=len(vec)), np.fromiter(vec.values(), dtype=np.int64, count=len(vec)))
+			self._arrays[term] = arrays
+		return arrays
+
+	def top(self, terms: Iterable[str], k: int) -> np.ndarray:
+		acc = np.zeros(self.size, dtype=np.int64)
+		for t in terms:
+			idx, counts = self._term(t)
+			acc[idx] += counts  # blob indices are unique within a term
+		idx = np.flatnonzero(acc)
+		if not len(idx) or k <= 0:
+			return np.zeros(0, dtype=np.int64)
+		# Same order as TermIndex.product_top: descending score, ties in blob order
+		return idx[np.lexsort((idx, -acc[idx]))[:k]]
+
+
+class CatalogIndex:
+	"""
+	Inverted index over a product catalog for top-N similar-product search.
+
+	Each product is indexed once by its terms, its top NICE classes (keyword
+	retrieval) and its top SPSC nodes. A query only considers items sharing a
+	block with it: a NICE class, an SPSC ancestor at `block_depth`, or a term
+	that is rare in the catalog. The blocked items are ranked by the cascade
+	pre-score and only the best `candidates` are sent to the (expensive) scorer.
+	The index reflects the NICE/SPSC data loaded when it was built.
+	"""
+
+	def __init__(
+		self,
+		products: Sequence[str],
+		*,
+		ids: Optional[Sequence[Hashable]] = None,
+		config: Optional[CatalogConfig] = None,
+	) -> None:
+		t0 = time.perf_counter()
+		self.config = cfg = config or CatalogConfig()
+		self.products = [str(p) for p in products]
+		self.ids = list(ids) if ids is not None else list(range(len(self.products)))
+		if len(self.ids) != len(self.products):
+			raise ValueError("ids and products must have the same length")
+		n = len(self.products)
+
+		chunks, nice_index = _get_nice_index()
+		self._class_of_chunk = [str(c.get("class_number", "")) for c in chunks]
+		self._nice = _TermMatcher(nice_index)
+		self._spsc: Optional[_TermMatcher] = None
+		self._hierarchy = None
+		if cfg.include_spsc:
+			try:
+				from .spsc import _get_spsc_index
+				from .spsc_hierarchy import get_spsc_hierarchy
+				_, spsc_index = _get_spsc_index()
+				self._spsc = _TermMatcher(spsc_index)
+				self._hierarchy = get_spsc_hierarchy()
+			except FileNotFoundError:
+				pass
+
+		postings: Dict[Tuple[str, object], List[int]] = {}
+		self.n_terms = np.zeros(n, dtype=np.int32)
+		self.n_classes = np.zeros(n, dtype=np.int32)
+		self.nodes = np.full((n, max(cfg.spsc_top, 0)), -1, dtype=np.int32)
+		for i, product in enumerate(self.products):
+			terms, classes, nodes = self._signals(product)
+			self.n_terms[i] = len(terms)
+			self.n_classes[i] = len(classes)
+			self.nodes[i, :len(nodes)] = nodes
+			for key in self._keys(terms, classes, nodes):
+				postings.setdefault(key, []).append(i)
+		self._postings = {k: np.asarray(v, dtype=np.int32) for k, v in postings.items()}
+		self.build_seconds = time.perf_counter() - t0
+
+	@classmethod
+	def from_csv(
+		cls,
+		path: str,
+		*,
+		column: Optional[str] = None,
+		id_column: Optional[str] = None,
+		config: Optional[CatalogConfig] = None,
+	) -> "CatalogIndex":
+		products, ids = load_catalog_csv(path, column=column, id_column=id_column)
+		return cls(products, ids=ids, config=config)
+
+	def __len__(self) -> int:
+		return len(self.products)
+
+	# ---- per-product signals ----
+
+	def _signals(self, product: str) -> Tuple[frozenset, List[str], np.ndarray]:
+		terms = extract_terms(product)
+		classes = list(dict.fromkeys(self._class_of_chunk[i] for i in self._nice.top(terms, self.config.nice_top)))
+		if self._spsc is not None and self._hierarchy is not None:
+			nodes = self._hierarchy.node_of_flat[self._spsc.top(terms, self.config.spsc_top)]
+		else:
+			nodes = np.zeros(0, dtype=np.int32)
+		return terms, classes, nodes
+
+	def _blocks(self, nodes: np.ndarray) -> List[int]:
+		if self._hierarchy is None or not len(nodes):
+			return []
+		return sorted(set(int(b) for b in self._hierarchy.ancestor_at(nodes, self.config.block_depth) if b != 0))
+
+	def _keys(self, terms: Iterable[str], classes: Iterable[str], nodes: np.ndarray) -> List[Tuple[str, object]]:
+		keys: List[Tuple[str, object]] = [("t", t) for t in terms]
+		keys += [("c", c) for c in classes]
+		keys += [("s", b) for b in self._blocks(nodes)]
+		return keys
+
+	# ---- scoring ----
+
+	def _overlap(self, keys: Iterable[Tuple[str, object]]) -> np.ndarray:
+		counts = np.zeros(len(self.products), dtype=np.int32)
+		for key in keys:
+			ids = self._postings.get(key)
+			if ids is not None:
+				counts[ids] += 1  # postings hold each item at most once
+		return counts
+
+	def _prescore(self, product: str, idx: Optional[np.ndarray] = None) -> np.ndarray:
+		"""
+		Cascade pre-score of the query against items idx (all items when None).
+		"""
+		terms, classes, nodes = self._signals(product)
+		w = self.config.weights
+		total_w = sum(w.values()) or 1.0
+
+		def jaccard(inter: np.ndarray, size: np.ndarray, q: int) -> np.ndarray:
+			union = size + q - inter
+			return np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+
+		term_inter = self._overlap(("t", t) for t in terms)
+		class_inter = self._overlap(("c", c) for c in classes)
+		if idx is None:
+			idx = np.arange(len(self.products))
+		score = w.get("terms", 0.0) * jaccard(term_inter[idx], self.n_terms[idx], len(terms))
+		score = score + w.get("class", 0.0) * jaccard(class_inter[idx], self.n_classes[idx], len(classes))
+		if self._hierarchy is not None and len(nodes) and self.nodes.shape[1] and len(idx):
+			cand = self.nodes[idx]
+			best = np.zeros(len(idx))
+			for q in nodes:
+				flat = cand.ravel()
+				valid = flat >= 0
+				prox = np.zeros(len(flat))
+				prox[valid] = self._hierarchy.proximity_many(np.full(int(valid.sum()), q), flat[valid])
+				best = np.maximum(best, prox.reshape(cand.shape).max(axis=1))
+			score = score + w.get("spsc", 0.0) * best
+		return score / total_w
+
+	def candidates(self, product: str, k: Optional[int] = None, *, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Blocked candidate item indices (best k by pre-score, ties in catalog order) and their pre-scores.
+		"""
+		k = self.config.candidates if k is None else int(k)
+		terms, classes, nodes = self._signals(product)
+		max_df = max(int(self.config.max_df * len(self.products)), 1)
+		lists = []
+		for key in self._keys(terms, classes, nodes):
+			ids = self._postings.get(key)
+			if ids is not None and (key[0] != "t" or len(ids) <= max_df):
+				lists.append(ids)
+		if not lists:
+			return np.zeros(0, dtype=np.int32), np.zeros(0)
+		idx = np.unique(np.concatenate(lists))
+		if exclude is not None:
+			idx = idx[idx != exclude]
+		pre = self._prescore(product, idx)
+		order = np.lexsort((idx, -pre))[:max(k, 0)]
+		return idx[order], pre[order]
+
+	def search(
+		self,
+		product: str,
+		top_n: int = 10,
+		*,
+		scorer: Optional[Scorer] = None,
+		candidates: Optional[int] = None,
+		workers: int = 1,
+		exclude: Optional[int] = None,
+	) -> List[Dict[str, object]]:
+		"""
+		Top-N most similar catalog items. Without a scorer they are ranked by
+		the pre-score; with one (e.g. pipeline_scorer()) only the blocked
+		candidates are scored and ranked by score, then pre-score.
+		"""
+		idx, pre = self.candidates(product, candidates, exclude=exclude)
+		scores = _score_many(scorer, product, [self.products[i] for i in idx], workers) if scorer else [None] * len(idx)
+		ranked = sorted(range(len(idx)), key=lambda j: (-_rank_value(scores[j]), -pre[j], idx[j]))
+		return [
+			{
+				"id": self.ids[int(idx[j])],
+				"product": self.products[int(idx[j])],
+				"score": scores[j],
+				"prescore": round(float(pre[j]), 4),
+			}
+			for j in ranked[:max(int(top_n), 0)]
+		]
+
+	def stats(self) -> Dict[str, object]:
+		sizes = np.asarray([len(v) for v in self._postings.values()]) if self._postings else np.zeros(1)
+		return {
+			"items": len(self.products),
+			"blocks": len(self._postings),
+			"largest_block": int(sizes.max()),
+			"mean_block": round(float(sizes.mean()), 2),
+			"spsc": self._hierarchy is not None,
+			"build_seconds": round(self.build_seconds, 3),
+		}
+
+
+def _rank_value(score: Optional[float]) -> float:
+	return -1.0 if score is None else float(score)
+
+
+def _score_many(scorer: Scorer, query: str, products: List[str], workers: int) -> List[Optional[float]]:
+	if workers > 1 and len(products) > 1:
+		with ThreadPoolExecutor(max_workers=workers) as ex:
+			return list(ex.map(lambda p: scorer(query, p), products))
+	return [scorer(query, p) for p in products]
+
+
+def pipeline_scorer(**run_opts: object) -> Scorer:
+	"""
+	Scorer running run_similarity() on each pair and returning the overall score (0-4).
+	run_opts are run_similarity's keyword options (model / chat API settings).
+	"""
+	from .pipeline import run_similarity
+
+	def score(query: str, product: str) -> Optional[float]:
+		record = run_similarity(query, product, verbosity="scores", as_record=True, **run_opts)  # type: ignore[arg-type]
+		return record.score_dict()["overall"]  # type: ignore[union-attr]
+
+	return score
+
+
+def recall_at_n(
+	index: CatalogIndex,
+	queries: Sequence[Tuple[str, Optional[int]]],
+	*,
+	top_n: int = 10,
+	scorer: Optional[Scorer] = None,
+	candidates: Optional[int] = None,
+	workers: int = 1,
+) -> Dict[str, object]:
+	"""
+	Recall@N of blocked search against comparing each query with the whole catalog.
+
+	queries are (product, catalog index to exclude or None). The reference
+	top-N is the best N items with a positive score (scorer, or the pre-score
+	when scorer is None) over the full catalog; queries with no such item are
+	skipped. Ties are broken by pre-score, then catalog order, in both rankings.
+	"""
+	t0 = time.perf_counter()
+	recalls: List[float] = []
+	full_calls = blocked_calls = 0
+	for product, exclude in queries:
+		all_idx = np.arange(len(index))
+		if exclude is not None:
+			all_idx = all_idx[all_idx != exclude]
+		pre_all = index._prescore(product, all_idx)
+		if scorer is None:
+			full = pre_all
+		else:
+			full = np.asarray([_rank_value(s) for s in _score_many(scorer, product, [index.products[i] for i in all_idx], workers)])
+			full_calls += len(all_idx)
+		order = np.lexsort((all_idx, -pre_all, -full))
+		relevant = [int(all_idx[j]) for j in order[:max(int(top_n), 0)] if full[j] > 0]
+		if not relevant:
+			continue
+		cand, _ = index.candidates(product, candidates, exclude=exclude)
+		blocked_calls += len(cand)
+		# The blocked ranking is the same total order restricted to the candidates,
+		# so a relevant item is in the blocked top-N exactly when it is a candidate
+		recalls.append(len(set(relevant) & set(int(i) for i in cand)) / len(relevant))
+	return {
+		"queries": len(queries),
+		"evaluated": len(recalls),
+		"top_n": top_n,
+		"recall_at_n": round(float(np.mean(recalls)), 4) if recalls else None,
+		"scored_by": "pre-score" if scorer is None else "scorer",
+		"full_comparisons": full_calls if scorer is not None else len(queries) * len(index),
+		"blocked_comparisons": blocked_calls,
+		"seconds": round(time.perf_counter() - t0, 3),
+	}
+
+
+def sample_queries(index: CatalogIndex, size: int, *, seed: int = 0) -> List[Tuple[str, Optional[int]]]:
+	"""A random sample of catalog items as queries (each excluding itself)."""
+	rng = random.Random(seed)
+	picks = rng.sample(range(len(index)), min(max(int(size), 0), len(index)))
+	return [(index.products[i], i) for i in picks]
+
+
+def load_catalog_csv(path: str, *, column: Optional[str] = None, id_column: Optional[str] = None) -> Tuple[List[str], Optional[List[str]]]:
+	"""
+	Product descriptions (and optional ids) from a CSV; column defaults to the first one.
+	Rows with an empty description are skipped.
+	"""
+	products: List[str] = []
+	ids: List[str] = []
+	with open(path, "r", encoding="utf-8-sig", newline="") as f:
+		reader = csv.DictReader(f)
+		fields = reader.fieldnames or []
+		col = column or (fields[0] if fields else None)
+		if col is None or col not in fields:
+			raise ValueError(f"Column {col!r} not found in {path} (columns: {', '.join(fields)})")
+		if id_column is not None and id_column not in fields:
+			raise ValueError(f"Column {id_column!r} not found in {path} (columns: {', '.join(fields)})")
+		for row in reader:
+			text = (row.get(col) or "").strip()
+			if not text:
+				continue
+			products.append(text)
+			if id_column is not None:
+				ids.append(str(row.get(id_column) or ""))
+	return products, (ids if id_column is not None else None)
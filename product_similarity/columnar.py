@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .artifacts import atomic_write_json
+from .records import VERBOSITY_LEVELS, verbosity_level
+from .results_io import JsonlWriter, iter_jsonl
+
+
+# Columnar result formats, chosen by path suffix:
+# - ".parquet": one row group per chunk, zstd-compressed (needs pyarrow)
+# - ".cols": a directory of per-chunk .npy column files (memory-mapped on
+#   read) plus gzip-compressed JSON Lines for the text columns; numpy only
+COLUMNAR_SUFFIXES = (".parquet", ".cols")
+
+# Text columns; numeric reads never touch them. Which of the optional ones a
+# row has depends on the run's verbosity (reasoning:<factor> per factor).
+TEXT_COLUMNS = ("product_1", "product_2", "analyzer", "contexts")
+# Lowest verbosity level (records.VERBOSITY_LEVELS) that keeps each one
+_TEXT_LEVEL = {"product_1": 0, "product_2": 0, "contexts": 1, "reasoning": 1, "analyzer": 2}
+
+
+def is_columnar(path: str) -> bool:
+	return path.rstrip("/").endswith(COLUMNAR_SUFFIXES)
+
+
+def _float(value: object) -> float:
+	return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else float("nan")
+
+
+def _level(value: object) -> int:
+	return int(value) if isinstance(value, int) and 0 <= value <= 4 else -1
+
+
+class ColumnarWriter:
+	"""
+	Write eval result rows (the JSONL layout) as a flat columnar table in
+	chunks of chunk_rows:
+
+	row_index, gold, pred (int8, -1 = missing), factor:<f> and
+	factor_confidence:<f> (float32, NaN = missing), tier:<f> for routed runs,
+	confidence and spsc_proximity (float32), cascade (int8, 1 = answered by
+	the cascade), one string column per group key, and the text columns
+	(products, analyzer, contexts, reasoning:<f>) present in the rows.
+	Column names match metrics.results_to_columns, so load_columns() reads
+	either format. Row hashes and judge weights are not stored, so these
+	files cannot seed incremental re-evaluation.
+
+	The schema is fixed by the first chunk unless factors / tiers /
+	verbosity (the run's records.VERBOSITY_LEVELS entry, which decides the
+	text columns) are given; a later row with a factor, tier or text field
+	outside it raises ValueError rather than being dropped. text=False drops
+	all text columns. Drop-in for JsonlWriter (write / close / count).
+	"""
+
+	def __init__(
+		self,
+		path: str,
+		*,
+		factors: Optional[Sequence[str]] = None,
+		group_keys: Sequence[str] = (),
+		chunk_rows: int = 10000,
+		text: bool = True,
+		tiers: Optional[bool] = None,
+		verbosity: Optional[str] = None,
+	) -> None:
+		if not is_columnar(path):
+			raise ValueError(f"Unknown columnar format for {path}; use one of {', '.join(COLUMNAR_SUFFIXES)}")
+		self.path = path.rstrip("/")
+		self.factors = list(factors) if factors is not None else None
+		self.group_keys = list(group_keys)
+		self.chunk_rows = max(int(chunk_rows), 1)
+		self.text = bool(text)
+		self.tiers = tiers
+		self.verbosity = verbosity
+		if verbosity is not None:
+			verbosity_level(verbosity)  # validate before any row is buffered
+		self.count = 0
+		self._rows: List[Dict[str, object]] = []
+		self._schema: Optional[Dict[str, str]] = None  # column -> numpy dtype str ("str" for text)
+		self._chunks: List[int] = []
+		self._parquet = None
+		parent = os.path.dirname(os.path.abspath(self.path))
+		os.makedirs(parent, exist_ok=True)
+		if self.path.endswith(".cols"):
+			os.makedirs(self.path, exist_ok=True)
+
+	def write(self, row: Dict[str, object]) -> None:
+		self._rows.append(row)
+		self.count += 1
+		if len(self._rows) >= self.chunk_rows:
+			self.flush()
+
+	def _build_schema(self, rows: Sequence[Dict[str, object]]) -> Dict[str, str]:
+		if self.factors is None:
+			seen: Dict[str, None] = {}
+			for row in rows:
+				for f in (row.get("factors") or {}):  # type: ignore[union-attr]
+					seen.setdefault(str(f), None)
+			self.factors = list(seen)
+		schema = {"row_index": "int32", "gold": "int8", "pred": "int8"}
+		for f in self.factors:
+			schema[f"factor:{f}"] = "float32"
+			schema[f"factor_confidence:{f}"] = "float32"
+		if self.tiers is None:
+			self.tiers = any("tier" in (o or {}) for row in rows for o in (row.get("factors") or {}).values())  # type: ignore[union-attr]
+		if self.tiers:
+			schema.update({f"tier:{f}": "category" for f in self.factors})
+		schema["confidence"] = "float32"
+		schema["spsc_proximity"] = "float32"
+		schema["cascade"] = "int8"
+		for k in self.group_keys:
+			schema[k] = "category"
+		if self.text:
+			if self.verbosity is not None:
+				level = verbosity_level(self.verbosity)
+				present = {k for k, lowest in _TEXT_LEVEL.items() if level >= lowest}
+			else:
+				present = {k for row in rows for k in TEXT_COLUMNS if k in row}
+				if any("reasoning_text" in (o or {}) for row in rows for o in (row.get("factors") or {}).values()):  # type: ignore[union-attr]
+					present.add("reasoning")
+			schema.update({k: "str" for k in TEXT_COLUMNS if k in present})
+			if "reasoning" in present:
+				schema.update({f"reasoning:{f}": "str" for f in self.factors})
+		return schema
+
+	def _check_schema(self, rows: Sequence[Dict[str, object]]) -> None:
+		assert self._schema is not None
+		schema = self._schema
+		known = set(self.factors or ())
+		for row in rows:
+			outputs = row.get("factors") or {}
+			unknown = [f for f in outputs if f not in known]  # type: ignore[union-attr]
+			if unknown:
+				raise ValueError(f"Factor(s) {unknown} in row {row.get('row_index')} are not in the columnar schema {sorted(known)}; pass factors=")
+			if not self.tiers and any("tier" in (o or {}) for o in outputs.values()):  # type: ignore[union-attr]
+				raise ValueError(f"Row {row.get('row_index')} has routing tiers but the columnar schema has none; pass tiers=True")
+			if not self.text:
+				continue
+			missing = [k for k in TEXT_COLUMNS if row.get(k) is not None and k not in schema]
+			if any(o and o.get("reasoning_text") is not None and f"reasoning:{f}" not in schema for f, o in outputs.items()):  # type: ignore[union-attr]
+				missing.append("reasoning")
+			if missing:
+				raise ValueError(f"Row {row.get('row_index')} has text {missing} that the columnar schema has no column for; pass verbosity=")
+
+	def _columns(self, rows: Sequence[Dict[str, object]]) -> Dict[str, Union[np.ndarray, List[Optional[str]]]]:
+		assert self._schema is not None
+		cols: Dict[str, Union[np.ndarray, List[Optional[str]]]] = {}
+		start = self.count - len(rows)
+		cols["row_index"] = np.asarray([int(r.get("row_index", start + i)) for i, r in enumerate(rows)], dtype=np.int32)  # type: ignore[arg-type]
+		cols["gold"] = np.asarray([_level(r.get("gold_overall")) for r in rows], dtype=np.int8)
+		cols["pred"] = np.asarray([_level(r.get("pred_overall")) for r in rows], dtype=np.int8)
+		outputs = [r.get("factors") or {} for r in rows]
+		for f in self.factors or ():
+			entries = [o.get(f) or {} for o in outputs]  # type: ignore[union-attr]
+			cols[f"factor:{f}"] = np.asarray([_float(e.get("score")) for e in entries], dtype=np.float32)
+			cols[f"factor_confidence:{f}"] = np.asarray([_float(e.get("confidence")) for e in entries], dtype=np.float32)
+			if f"tier:{f}" in self._schema:
+				cols[f"tier:{f}"] = np.asarray([str(e.get("tier") or "") for e in entries], dtype=str)
+			if f"reasoning:{f}" in self._schema:
+				cols[f"reasoning:{f}"] = [e.get("reasoning_text") for e in entries]
+		cols["confidence"] = np.asarray([_float((r.get("judge") or {}).get("confidence")) for r in rows], dtype=np.float32)  # type: ignore[union-attr]
+		cols["spsc_proximity"] = np.asarray([_float(r.get("spsc_proximity")) for r in rows], dtype=np.float32)
+		cols["cascade"] = np.asarray([1 if r.get("cascade") else 0 for r in rows], dtype=np.int8)
+		for k in self.group_keys:
+			cols[k] = np.asarray(["" if r.get(k) is None else str(r.get(k)) for r in rows], dtype=str)
+		for k in TEXT_COLUMNS:
+			if k in self._schema:
+				values = [r.get(k) for r in rows]
+				# contexts is a list per row; store it as one JSON string
+				cols[k] = [json.dumps(v, ensure_ascii=False) if isinstance(v, list) else v for v in values]  # type: ignore[misc]
+		return cols
+
+	def flush(self) -> None:
+		if not self._rows:
+			return
+		if self._schema is None:
+			self._schema = self._build_schema(self._rows)
+		self._check_schema(self._rows)
+		cols = self._columns(self._rows)
+		if self.path.endswith(".parquet"):
+			self._write_parquet(cols)
+		else:
+			self._write_npy(cols)
+		self._chunks.append(len(self._rows))
+		self._rows = []
+
+	def _write_parquet(self, cols: Dict[str, Union[np.ndarray, List[Optional[str]]]]) -> None:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+
+		assert self._schema is not None
+		arrays = {}
+		for k, v in cols.items():
+			kind = self._schema[k]
+			if kind == "category":
+				arrays[k] = pa.array(list(v), type=pa.string()).dictionary_encode()
+			elif kind == "str":
+				# Typed explicitly so an all-None first chunk does not fix a null schema
+				arrays[k] = pa.array(v, type=pa.string())
+			else:
+				arrays[k] = pa.array(v)
+		table = pa.table(arrays)
+		if self._parquet is None:
+			self._parquet = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+		self._parquet.write_table(table)
+
+	def _write_npy(self, cols: Dict[str, Union[np.ndarray, List[Optional[str]]]]) -> None:
+		assert self._schema is not None
+		chunk_dir = os.path.join(self.path, f"{len(self._chunks):05d}")
+		os.makedirs(chunk_dir, exist_ok=True)
+		names = list(self._schema)
+		text: Dict[str, List[Optional[str]]] = {}
+		for i, name in enumerate(names):
+			if self._schema[name] == "str":
+				text[name] = cols[name]  # type: ignore[assignment]
+			else:
+				np.save(os.path.join(chunk_dir, f"{i}.npy"), np.asarray(cols[name]))
+		if text:
+			with gzip.open(os.path.join(chunk_dir, "text.jsonl.gz"), "wt", encoding="utf-8") as f:
+				for j in range(len(self._rows)):
+					f.write(json.dumps({k: v[j] for k, v in text.items()}, ensure_ascii=False))
+					f.write("\n")
+		# Rewritten after every chunk, so a partial run is readable
+		atomic_write_json(os.path.join(self.path, "meta.json"), {
+			"format": 1,
+			"columns": names,
+			"dtypes": self._schema,
+			"chunks": self._chunks + [len(self._rows)],
+		})
+
+	def close(self) -> None:
+		self.flush()
+		if self._parquet is not None:
+			self._parquet.close()
+			self._parquet = None
+
+	def __enter__(self) -> "ColumnarWriter":
+		return self
+
+	def __exit__(self, *exc: object) -> None:
+		self.close()
+
+
+def open_results_writer(path: str, **options: object) -> Union[JsonlWriter, ColumnarWriter]:
+	"""
+	Result writer for path: ColumnarWriter for .parquet / .cols (options are
+	its keyword arguments), JsonlWriter otherwise.
+	"""
+	if is_columnar(path):
+		return ColumnarWriter(path, **options)  # type: ignore[arg-type]
+	return JsonlWriter(path)
+
+
+def column_names(path: str) -> List[str]:
+	path = path.rstrip("/")
+	if path.endswith(".parquet"):
+		import pyarrow.parquet as pq
+
+		return list(pq.read_schema(path).names)
+	with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+		return list(json.load(f)["columns"])
+
+
+def read_columns(path: str, columns: Optional[Sequence[str]] = None, *, text: bool = False) -> Dict[str, np.ndarray]:
+	"""
+	Load `columns` (default: all numeric and group columns, plus the text
+	columns with text=True) from a .parquet file or .cols directory.
+	Numeric columns are memory-mapped: a single-chunk .cols column is
+	returned as a read-only np.memmap, Parquet is read with memory_map=True.
+	Text columns are object arrays (None = missing).
+	"""
+	path = path.rstrip("/")
+	if path.endswith(".parquet"):
+		return _read_parquet(path, columns, text)
+	with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+		meta = json.load(f)
+	names: List[str] = meta["columns"]
+	dtypes: Dict[str, str] = meta["dtypes"]
+	wanted = list(columns) if columns is not None else [n for n in names if text or dtypes[n] != "str"]
+	unknown = [c for c in wanted if c not in dtypes]
+	if unknown:
+		raise KeyError(f"No column(s) {unknown} in {path}")
+	out: Dict[str, np.ndarray] = {}
+	text_wanted = [c for c in wanted if dtypes[c] == "str"]
+	for c in wanted:
+		if dtypes[c] == "str":
+			continue
+		i = names.index(c)
+		parts = [np.load(os.path.join(path, f"{k:05d}", f"{i}.npy"), mmap_mode="r") for k in range(len(meta["chunks"]))]
+		out[c] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+	if text_wanted:
+		values: Dict[str, List[Optional[str]]] = {c: [] for c in text_wanted}
+		for k in range(len(meta["chunks"])):
+			for row in _iter_text(os.path.join(path, f"{k:05d}", "text.jsonl.gz")):
+				for c in text_wanted:
+					values[c].append(row.get(c))  # type: ignore[arg-type]
+		for c, v in values.items():
+			arr = np.empty(len(v), dtype=object)
+			arr[:] = v
+			out[c] = arr
+	return out
+
+
+def _iter_text(path: str) -> Iterator[Dict[str, object]]:
+	with gzip.open(path, "rt", encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				yield json.loads(line)
+
+
+def _read_parquet(path: str, columns: Optional[Sequence[str]], text: bool) -> Dict[str, np.ndarray]:
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	schema = pq.read_schema(path)
+	if columns is None:
+		columns = [f.name for f in schema if text or not pa.types.is_string(f.type)]
+	table = pq.read_table(path, columns=list(columns), memory_map=True)
+	out: Dict[str, np.ndarray] = {}
+	for name in columns:
+		col = table.column(name)
+		if pa.types.is_dictionary(col.type):
+			out[name] = np.asarray(col.cast(pa.string()).to_pylist(), dtype=str)
+		elif pa.types.is_string(col.type):
+			out[name] = np.asarray(col.to_pylist(), dtype=object)
+		else:
+			out[name] = col.to_numpy()
+	return out
+
+
+def convert_results(src: str, dst: str, **options: object) -> int:
+	"""
+	Rewrite a results JSONL file in another format (by dst suffix); returns rows written.
+	Unless factors, tiers and verbosity are all given the source is scanned once
+	first, so the columnar schema covers every factor, tier and text field in
+	the file, not just the first chunk's.
+	"""
+	if is_columnar(dst) and any(options.get(k) is None for k in ("factors", "tiers", "verbosity")):
+		factors: Dict[str, None] = {}
+		tiers = False
+		level = 0
+		for row in iter_jsonl(src):
+			for f, o in (row.get("factors") or {}).items():  # type: ignore[union-attr]
+				factors.setdefault(str(f), None)
+				tiers = tiers or "tier" in (o or {})
+				if (o or {}).get("reasoning_text") is not None:
+					level = max(level, _TEXT_LEVEL["reasoning"])
+			level = max([level] + [_TEXT_LEVEL[k] for k in TEXT_COLUMNS if row.get(k) is not None])
+		options = {k: v for k, v in options.items() if v is not None}
+		options.setdefault("factors", list(factors))
+		options.setdefault("tiers", tiers)
+		options.setdefault("verbosity", VERBOSITY_LEVELS[level])
+	with open_results_writer(dst, **options) as writer:  # type: ignore[attr-defined]
+		for row in iter_jsonl(src):
+			writer.write(row)
+		return writer.count
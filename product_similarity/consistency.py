@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# How the n sampled scores of one prompt are combined:
+# - "majority": most frequent score (ties -> the tied score closest to the mean, then the lower)
+# - "mean": rounded mean of the parsed scores
+AGGREGATES = ("majority", "mean")
+
+
+@dataclass(frozen=True)
+class ConsistencyResult:
+	"""
+	Scores of n samples of one prompt and their aggregate. spread is the
+	standard deviation of the parsed scores; confidence is the share of all
+	n samples whose score equals the aggregate (unparsed samples count against it).
+	"""
+
+	score: Optional[int]
+	scores: Tuple[Optional[int], ...]
+	spread: Optional[float]
+	confidence: float
+
+	def as_dict(self) -> Dict[str, object]:
+		return {"score": self.score, "samples": list(self.scores), "spread": self.spread, "confidence": self.confidence}
+
+
+def aggregate_scores(scores: Sequence[Optional[int]], method: str = "majority") -> ConsistencyResult:
+	if method not in AGGREGATES:
+		raise ValueError(f"Unknown aggregate {method!r}; expected one of {', '.join(AGGREGATES)}")
+	valid = [int(s) for s in scores if isinstance(s, int)]
+	if not valid:
+		return ConsistencyResult(None, tuple(scores), None, 0.0)
+	mean = float(np.mean(valid))
+	if method == "mean":
+		score = int(np.rint(mean))
+	else:
+		counts = Counter(valid)
+		top = max(counts.values())
+		score = min((s for s, c in counts.items() if c == top), key=lambda s: (abs(s - mean), s))
+	agree = sum(1 for s in valid if s == score)
+	return ConsistencyResult(score, tuple(scores), round(float(np.std(valid)), 4), round(agree / max(len(scores), 1), 4))
+
+
+def sample_texts(backend: Any, prompt: str, n: int, *, temperature: float, top_p: float = 1.0) -> List[str]:
+	"""
+	n completions of one prompt: one request/generate call via the backend's
+	run_samples() when it has one, otherwise n run() calls.
+	"""
+	n = max(int(n), 1)
+	run_samples = getattr(backend, "run_samples", None)
+	if run_samples is not None:
+		return list(run_samples(prompt, n, temperature=temperature, top_p=top_p))
+	return [backend.run(prompt, temperature=temperature, top_p=top_p) for _ in range(n)]
@@ -0,0 +1,118 @@
+import json
+import os
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .artifacts import file_signature
+from .cache import DataCache
+from .prompt import format_fewshot
+from .retriever import DATA_DIR, _get_nice_index
+from .term_index import extract_terms
+
+
+FEWSHOT_PATH = os.path.join(DATA_DIR, "fewshot_cases.json")
+
+# "first": the first max_fewshot cases of the file (original behaviour)
+# "nearest": the max_fewshot cases most similar to the pair being scored
+FEWSHOT_SELECTIONS = ("first", "nearest")
+
+
+def _load_fewshot_cases() -> list:
+	if not os.path.exists(FEWSHOT_PATH):
+		raise FileNotFoundError(f"Missing fewshot cases at: {FEWSHOT_PATH}")
+	with open(FEWSHOT_PATH, "r", encoding="utf-8") as f:
+		return json.load(f)
+
+
+FEWSHOT_CACHE: DataCache[list] = DataCache("fewshot_cases", _load_fewshot_cases, signature=lambda: file_signature(FEWSHOT_PATH))
+
+
+def get_fewshot_cases() -> list:
+	return FEWSHOT_CACHE.get()
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+	union = a | b
+	return len(a & b) / len(union) if union else 0.0
+
+
+class FewshotIndex:
+	"""
+	Few-shot cases keyed by product terms and class info, with each case's
+	format_fewshot() block rendered once.
+
+	select() ranks cases for a pair by term overlap of the aligned (or
+	swapped) products and by overlap of NICE classes; ties keep file order,
+	so pairs that match nothing get the same cases as "first".
+	"""
+
+	def __init__(self, cases: Sequence[Dict], *, term_weight: float = 0.7, class_weight: float = 0.3) -> None:
+		self.cases = list(cases)
+		self.blocks = [format_fewshot(c) for c in self.cases]
+		self.term_weight = float(term_weight)
+		self.class_weight = float(class_weight)
+		self._terms: List[Tuple[FrozenSet[str], FrozenSet[str]]] = []
+		self._classes: List[FrozenSet[str]] = []
+		for c in self.cases:
+			inp = c.get("input", {}) or {}
+			self._terms.append((extract_terms(inp.get("product_1") or ""), extract_terms(inp.get("product_2") or "")))
+			info = inp.get("class_info", {}) or {}
+			values = info.values() if isinstance(info, dict) else []
+			self._classes.append(frozenset(str(v).strip() for v in values if v not in (None, "")))
+
+	def __len__(self) -> int:
+		return len(self.cases)
+
+	def scores(self, product_1: str, product_2: str, classes: Optional[FrozenSet[str]] = None) -> List[float]:
+		q1, q2 = extract_terms(product_1), extract_terms(product_2)
+		out = []
+		for (c1, c2), cls in zip(self._terms, self._classes):
+			terms = max(_jaccard(q1, c1) + _jaccard(q2, c2), _jaccard(q1, c2) + _jaccard(q2, c1)) / 2
+			out.append(self.term_weight * terms + (self.class_weight * _jaccard(classes, cls) if classes else 0.0))
+		return out
+
+	def select(self, product_1: str, product_2: str, k: int, *, classes: Optional[FrozenSet[str]] = None) -> List[int]:
+		"""Indices of the k most relevant cases, most relevant first."""
+		s = self.scores(product_1, product_2, classes)
+		return sorted(range(len(s)), key=lambda i: (-s[i], i))[:max(int(k), 0)]
+
+
+FEWSHOT_INDEX = FEWSHOT_CACHE.derive("fewshot_index", FewshotIndex)
+
+
+def _query_classes(product_1: str, product_2: str, class_1: Optional[object], class_2: Optional[object]) -> FrozenSet[str]:
+	# Known classes win; otherwise each product's best keyword-matched NICE class
+	known = [str(c).strip() for c in (class_1, class_2) if c not in (None, "")]
+	if known:
+		return frozenset(known)
+	chunks, index = _get_nice_index()
+	out = set()
+	for product in (product_1, product_2):
+		for i in index.product_top(product, 1):
+			out.add(str(chunks[i].get("class_number", "")).strip())
+	return frozenset(c for c in out if c)
+
+
+def select_fewshot_blocks(
+	product_1: str,
+	product_2: str,
+	max_fewshot: Optional[int],
+	*,
+	selection: str = "first",
+	class_1: Optional[object] = None,
+	class_2: Optional[object] = None,
+) -> List[str]:
+	"""
+	Rendered few-shot blocks for a prompt. max_fewshot None/<=0 means all cases
+	(in file order for "first", by relevance for "nearest").
+	"""
+	if selection not in FEWSHOT_SELECTIONS:
+		raise ValueError(f"Unknown few-shot selection {selection!r}; expected one of {', '.join(FEWSHOT_SELECTIONS)}")
+	index = FEWSHOT_INDEX.get()
+	k = max_fewshot if isinstance(max_fewshot, int) and max_fewshot > 0 else len(index)
+	if selection == "first":
+		return index.blocks[:k]
+	try:
+		classes = _query_classes(product_1, product_2, class_1, class_2)
+	except FileNotFoundError:
+		classes = frozenset()
+	return [index.blocks[i] for i in index.select(product_1, product_2, k, classes=classes)]
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from .artifacts import content_hash
+from .columnar import is_columnar
+from .results_io import iter_jsonl
+
+
+def model_identity(
+	*,
+	model_name: Optional[str] = None,
+	chat_api_base_url: Optional[str] = None,
+	chat_api_key: Optional[str] = None,
+	chat_api_model: Optional[str] = None,
+	backend: str = "torch",
+	inference_backend: Optional[Any] = None,
+) -> Optional[str]:
+	"""
+	Id of the model get_backend() would use for these settings (None when no model runs).
+	"""
+	if inference_backend is not None:
+		name = getattr(inference_backend, "model_name", None) or getattr(inference_backend, "_model", None)
+		return f"{type(inference_backend).__name__}:{name}" if name else type(inference_backend).__name__
+	if chat_api_base_url and chat_api_key and chat_api_model:
+		return f"chat:{chat_api_base_url}:{chat_api_model}"
+	if model_name:
+		return f"hf:{model_name}:{backend}"
+	return None
+
+
+def component_hash(prompt: str, model: Optional[str], **params: Any) -> str:
+	"""
+	Short hash of everything that determines one model call's output:
+	the exact prompt, the model id and generation parameters.
+	"""
+	return content_hash({"prompt": prompt, "model": model, **params})[:16]
+
+
+def judge_hash(weights: Mapping[str, float], **options: Any) -> str:
+	payload: Dict[str, Any] = {k: round(float(v), 9) for k, v in weights.items()}
+	return content_hash({"weights": payload, **options} if options else payload)[:16]
+
+
+def component_hashes(
+	*,
+	analyzer_prompt: Optional[str],
+	analyzer_model: Optional[str],
+	factor_prompts: Mapping[str, str],
+	agent_model: Optional[str],
+	factor_options: Optional[Mapping[str, Any]] = None,
+	judge_weights: Mapping[str, float],
+	judge_options: Optional[Mapping[str, Any]] = None,
+	**params: Any,
+) -> Dict[str, object]:
+	"""
+	The "hashes" entry of a result row: analyzer, each factor prompt and the
+	judge weights, plus the model ids they were computed with. analyzer is
+	None when no analyzer model runs. factor_options / judge_options (e.g.
+	sampling settings) only enter the hashes when given.
+	"""
+	return {
+		"analyzer": component_hash(analyzer_prompt, analyzer_model, **params) if analyzer_model and analyzer_prompt is not None else None,
+		"factors": {f: component_hash(p, agent_model, **params, **(factor_options or {})) for f, p in factor_prompts.items()},
+		"judge": judge_hash(judge_weights, **(judge_options or {})),
+		"models": {"analyzer": analyzer_model, "agent": agent_model},
+	}
+
+
+class PreviousResults:
+	"""
+	Rows of an earlier results JSONL indexed by product pair.
+
+	reuse() returns the stored analyzer text and factor outputs whose
+	component hash equals the current one, so a re-evaluation only calls the
+	models for components that changed. Judge weights are never reused: the
+	judge is cheap and always re-run over the (reused or fresh) factor scores.
+	Counters record what was reused vs. recomputed.
+	"""
+
+	def __init__(self, rows: Iterable[Mapping[str, object]]) -> None:
+		self._rows: Dict[Tuple[str, str], Mapping[str, object]] = {}
+		for row in rows:
+			if isinstance(row.get("hashes"), dict):
+				self._rows[(str(row.get("product_1", "")), str(row.get("product_2", "")))] = row
+		self.rows_matched = 0
+		self.analyzer_reused = 0
+		self.analyzer_calls = 0
+		self.factor_reused: Dict[str, int] = {}
+		self.factor_calls: Dict[str, int] = {}
+
+	@classmethod
+	def from_jsonl(cls, path: str) -> "PreviousResults":
+		if is_columnar(path):
+			raise ValueError(f"{path} is a columnar results file; incremental reuse needs the JSONL rows (with their hashes)")
+		return cls(iter_jsonl(path))
+
+	def __len__(self) -> int:
+		return len(self._rows)
+
+	def lookup(self, product_1: str, product_2: str) -> Optional[Mapping[str, object]]:
+		return self._rows.get((product_1, product_2))
+
+	def reuse(
+		self,
+		product_1: str,
+		product_2: str,
+		hashes: Mapping[str, Any],
+		*,
+		need_reasoning: bool = True,
+		need_analyzer: bool = True,
+	) -> Tuple[Optional[str], Dict[str, Dict[str, object]]]:
+		"""
+		(analyzer text or None, {factor: output}) reusable for this pair.
+		Outputs are only reused when the stored row still has the text the
+		current verbosity keeps (need_reasoning / need_analyzer).
+		"""
+		prior = self.lookup(product_1, product_2)
+		old = (prior or {}).get("hashes") or {}
+		if prior is not None:
+			self.rows_matched += 1
+
+		analyzer: Optional[str] = None
+		if hashes.get("analyzer") is not None:
+			if old.get("analyzer") == hashes["analyzer"] and (not need_analyzer or "analyzer" in prior):  # type: ignore[operator]
+				analyzer = str(prior.get("analyzer") or "")  # type: ignore[union-attr]
+				self.analyzer_reused += 1
+			else:
+				self.analyzer_calls += 1
+
+		factors: Dict[str, Dict[str, object]] = {}
+		old_factors = old.get("factors") or {}
+		stored = (prior or {}).get("factors") or {}
+		for f, h in (hashes.get("factors") or {}).items():
+			entry = stored.get(f) if isinstance(stored, dict) else None
+			if entry is not None and old_factors.get(f) == h and (not need_reasoning or "reasoning_text" in entry):
+				text = str(entry.get("reasoning_text") or "")
+				factors[f] = {"factor": f, "reasoning_text": text, "raw_output": text, "score": entry.get("score")}
+				for key in ("confidence", "spread", "tier"):
+					if key in entry:
+						factors[f][key] = entry[key]
+				self.factor_reused[f] = self.factor_reused.get(f, 0) + 1
+			else:
+				self.factor_calls[f] = self.factor_calls.get(f, 0) + 1
+		return analyzer, factors
+
+	def stats(self) -> Dict[str, object]:
+		return {
+			"previous_rows": len(self._rows),
+			"rows_matched": self.rows_matched,
+			"analyzer": {"reused": self.analyzer_reused, "calls": self.analyzer_calls},
+			"factors": {
+				f: {"reused": self.factor_reused.get(f, 0), "calls": self.factor_calls.get(f, 0)}
+				for f in sorted(set(self.factor_reused) | set(self.factor_calls))
+			},
+			"model_calls": self.analyzer_calls + sum(self.factor_calls.values()),
+		}
+
+
+def merge_factor_outputs(
+	factors: Sequence[str],
+	reused: Mapping[str, Dict[str, object]],
+	fresh: Mapping[str, Dict[str, object]],
+) -> Dict[str, Dict[str, object]]:
+	"""Reused and freshly computed factor outputs in canonical factor order."""
+	return {f: dict(reused[f]) if f in reused else fresh[f] for f in factors}
@@ -1,12 +1,24 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from itertools import product
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+def _round_overall(x: np.ndarray) -> np.ndarray:
+	# Weighted means that are .5 ties in exact arithmetic land a few ulps either
+	# side depending on summation order; snapping to 9 decimals first makes the
+	# per-row and vectorized paths round them (half to even) the same way.
+	return np.rint(np.round(x, 9))
 
 
 @dataclass
 class JudgeConfig:
 	weights: Optional[Dict[str, float]] = None  # per-factor weights; defaults applied if None
+	# Scale each factor's weight by its self-consistency confidence (when the agent reports one)
+	use_confidence: bool = False
 
 
 class LLMJudge:
@@ -19,13 +31,20 @@ class LLMJudge:
 
 	def __init__(self, config: Optional[JudgeConfig] = None) -> None:
 		cfg = config or JudgeConfig()
+		self.use_confidence = cfg.use_confidence
 		self._weights = cfg.weights or {
 			"Nature": 0.5,
 			"Intended Purpose": 0.5,
 			# Other factors may be added, default to 0 if missing
 		}
 
-	def _normalize_weights(self, factors: List[str]) -> Dict[str, float]:
+	@property
+	def weights(self) -> Dict[str, float]:
+		"""Configured (unnormalized) factor weights."""
+		return dict(self._weights)
+
+	def normalized_weights(self, factors: Sequence[str]) -> Dict[str, float]:
+		"""Weights of `factors` scaled to sum to 1 (uniform if they are all 0)."""
 		weights: Dict[str, float] = {}
 		total = 0.0
 		for f in factors:
@@ -42,12 +61,17 @@ class LLMJudge:
 		"""
 		factor_outputs: mapping factor -> { score: int|None, reasoning_text: str, ... }
 		Returns a dict containing final_overall (int), details per factor, and weighted breakdown.
+		Factors sampled with self-consistency also carry "confidence"; the result
+		then adds the weighted mean confidence, and with use_confidence the
+		factor weights are scaled by it.
 		"""
 		factors = list(factor_outputs.keys())
-		weights = self._normalize_weights(factors)
+		weights = self.normalized_weights(factors)
 
 		weighted_sum = 0.0
 		sum_weights = 0.0
+		conf_sum = 0.0
+		conf_weights = 0.0
 		details: Dict[str, Dict[str, object]] = {}
 
 		for f in factors:
@@ -60,16 +84,132 @@ class LLMJudge:
 				"score": raw_score,
 				"text": entry.get("reasoning_text", ""),
 			}
+			conf = entry.get("confidence")
+			if isinstance(conf, (int, float)):
+				details[f]["confidence"] = conf
+				conf_sum += float(conf) * w
+				conf_weights += w
+				if self.use_confidence:
+					w *= float(conf)
 			if score_val is not None:
 				weighted_sum += score_val * w
 				sum_weights += w
 
-		final_score = round(weighted_sum / sum_weights) if sum_weights > 0 else 0
+		final_score = int(_round_overall(np.float64(weighted_sum / sum_weights))) if sum_weights > 0 else 0
 
-		return {
+		out: Dict[str, object] = {
 			"overall_similarity": int(final_score),
 			"weights": weights,
 			"details": details,
 		}
+		if conf_weights > 0:
+			out["confidence"] = round(conf_sum / conf_weights, 4)
+		return out
+
+	def _weight_vector(self, factors: Sequence[str]) -> np.ndarray:
+		weights = self.normalized_weights(list(factors))
+		return np.asarray([weights[f] for f in factors], dtype=np.float64)
+
+	def combine_batch(
+		self,
+		scores: np.ndarray,
+		factors: Sequence[str],
+		mask: Optional[np.ndarray] = None,
+		*,
+		weights: Optional[np.ndarray] = None,
+		confidence: Optional[np.ndarray] = None,
+	) -> np.ndarray:
+		"""
+		Vectorized combine_factor_scores over many rows.
 
+		scores: (N, F) factor scores, columns ordered as `factors`.
+		mask: (N, F) True where a score is present; defaults to ~isnan(scores).
+		weights: optional (F,) or (K, F) weight rows overriding the configured
+		weights (rows need not be normalized). Returns int overall scores of
+		shape (N,) or (N, K); rows with no weighted score present get 0.
+		confidence: (N, F) factor confidences (NaN = none, weight unscaled);
+		required with use_confidence, which scales each weight by it.
+		"""
+		s = np.asarray(scores, dtype=np.float64)
+		if s.ndim != 2 or s.shape[1] != len(factors):
+			raise ValueError(f"scores must have shape (N, {len(factors)}), got {s.shape}")
+		m = ~np.isnan(s) if mask is None else np.asarray(mask, dtype=bool)
+		s = np.where(m, s, 0.0)
+		w = self._weight_vector(factors) if weights is None else np.asarray(weights, dtype=np.float64)
+		mf = m.astype(np.float64)
+		if self.use_confidence:
+			if confidence is None:
+				raise ValueError("use_confidence needs the factor confidences (confidence=)")
+			c = np.asarray(confidence, dtype=np.float64)
+			if c.shape != s.shape:
+				raise ValueError(f"confidence must have shape {s.shape}, got {c.shape}")
+			# Per-row weights w * c, factored into the operands
+			c = np.where(np.isnan(c), 1.0, c)
+			s = s * c
+			mf = mf * c
+		# Weighted mean over present factors, rounded like the per-row path
+		num = s @ w.T
+		den = mf @ w.T
+		with np.errstate(divide="ignore", invalid="ignore"):
+			overall = np.where(den > 0, _round_overall(num / np.where(den > 0, den, 1.0)), 0.0)
+		return overall.astype(np.int64)
+
+	def search_weights(
+		self,
+		scores: np.ndarray,
+		gold: np.ndarray,
+		factors: Sequence[str],
+		mask: Optional[np.ndarray] = None,
+		*,
+		steps: int = 10,
+		objective: str = "accuracy",
+		chunk_size: int = 256,
+		confidence: Optional[np.ndarray] = None,
+	) -> Dict[str, object]:
+		"""
+		Grid-search factor weights (each in {0, 1/steps, ..., 1}, up to scale)
+		against gold labels. objective is "accuracy" (maximized) or "mse"
+		(minimized); rows without a gold label are ignored. confidence is
+		passed to combine_batch (needed with use_confidence).
+		Returns the best normalized weights, its score and the grid size.
+		"""
+		if objective not in ("accuracy", "mse"):
+			raise ValueError(f"Unknown objective: {objective}")
+		if steps < 1:
+			raise ValueError(f"steps must be >= 1, got {steps}")
+		g = np.asarray(gold, dtype=np.float64)
+		labeled = ~np.isnan(g) & (g >= 0)
+		s = np.asarray(scores, dtype=np.float64)[labeled]
+		m = None if mask is None else np.asarray(mask, dtype=bool)[labeled]
+		c = None if confidence is None else np.asarray(confidence, dtype=np.float64)[labeled]
+		g = g[labeled]
+		if g.size == 0:
+			raise ValueError("No labeled rows to search weights against")
 
+		# Candidate weight rows on the grid, deduplicated after normalization
+		levels = np.arange(steps + 1, dtype=np.float64) / steps
+		grid = np.asarray(list(product(levels, repeat=len(factors))))
+		grid = grid[grid.sum(axis=1) > 0]
+		grid = np.unique(np.round(grid / grid.sum(axis=1, keepdims=True), 9), axis=0)
+
+		best_i, best_val = -1, None
+		for start in range(0, len(grid), chunk_size):
+			preds = self.combine_batch(s, factors, m, weights=grid[start:start + chunk_size], confidence=c)
+			if objective == "accuracy":
+				vals = (preds == g[:, None]).mean(axis=0)
+				i = int(np.argmax(vals))
+				better = best_val is None or vals[i] > best_val
+			else:
+				vals = ((preds - g[:, None]) ** 2).mean(axis=0)
+				i = int(np.argmin(vals))
+				better = best_val is None or vals[i] < best_val
+			if better:
+				best_i, best_val = start + i, float(vals[i])
+
+		return {
+			"weights": {f: float(w) for f, w in zip(factors, grid[best_i])},
+			objective: best_val,
+			"objective": objective,
+			"candidates": int(len(grid)),
+			"rows": int(g.size),
+		}
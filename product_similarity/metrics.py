@@ -0,0 +1,340 @@
+"""
+Vectorized evaluation metrics on the 0–4 similarity scale.
+
+Predictions and gold labels are integers in [0, 4], so every metric here
+(accuracy, MSE, MAE, RMSE, quadratic-weighted kappa) is a function of the
+5x5 confusion matrix. Grouped breakdowns are one bincount over
+(group, gold, pred) and bootstrap resampling of rows is an exact multinomial
+draw over the confusion cells, so cost does not grow with the row count
+beyond the initial bincount.
+"""
+
+import contextlib
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+NUM_LEVELS = 5  # scores 0..4
+MISSING = -1
+
+_LEVELS = np.arange(NUM_LEVELS)
+_SQ_DIFF = (_LEVELS[:, None] - _LEVELS[None, :]) ** 2  # (gold, pred)
+_ABS_DIFF = np.abs(_LEVELS[:, None] - _LEVELS[None, :])
+
+
+def _as_levels(values: Sequence[object]) -> np.ndarray:
+	"""
+	Convert scores to int8 levels; None / out-of-range / non-numeric -> MISSING.
+	"""
+	arr = np.asarray(values, dtype=object) if not isinstance(values, np.ndarray) else values
+	if arr.dtype == object:
+		out = np.full(len(arr), MISSING, dtype=np.int8)
+		for i, v in enumerate(arr):
+			try:
+				iv = int(float(v))  # type: ignore[arg-type]
+			except (TypeError, ValueError):
+				continue
+			if 0 <= iv < NUM_LEVELS:
+				out[i] = iv
+		return out
+	arr = np.asarray(arr)
+	if arr.dtype.kind == "f":
+		valid = np.isfinite(arr)
+		arr = np.where(valid, arr, MISSING)
+	arr = arr.astype(np.int64)
+	return np.where((arr >= 0) & (arr < NUM_LEVELS), arr, MISSING).astype(np.int8)
+
+
+def confusion_matrix(pred: np.ndarray, gold: np.ndarray) -> np.ndarray:
+	"""
+	5x5 counts indexed [gold, pred] over rows where both are present.
+	"""
+	pred = _as_levels(pred)
+	gold = _as_levels(gold)
+	ok = (pred >= 0) & (gold >= 0)
+	cells = gold[ok].astype(np.int64) * NUM_LEVELS + pred[ok]
+	return np.bincount(cells, minlength=NUM_LEVELS * NUM_LEVELS).reshape(NUM_LEVELS, NUM_LEVELS)
+
+
+def _metrics_batch(cms: np.ndarray) -> Dict[str, np.ndarray]:
+	"""
+	Metrics for a stack of confusion matrices with shape (..., 5, 5).
+	"""
+	cms = cms.astype(np.float64)
+	n = cms.sum(axis=(-2, -1))
+	safe_n = np.where(n > 0, n, 1.0)
+	correct = np.trace(cms, axis1=-2, axis2=-1)
+	mse = (cms * _SQ_DIFF).sum(axis=(-2, -1)) / safe_n
+	mae = (cms * _ABS_DIFF).sum(axis=(-2, -1)) / safe_n
+
+	# Quadratic-weighted Cohen's kappa: 1 - sum(W*O) / sum(W*E), E from the marginals
+	gold_marg = cms.sum(axis=-1)
+	pred_marg = cms.sum(axis=-2)
+	expected = gold_marg[..., :, None] * pred_marg[..., None, :] / safe_n[..., None, None]
+	observed_w = (cms * _SQ_DIFF).sum(axis=(-2, -1))
+	expected_w = (expected * _SQ_DIFF).sum(axis=(-2, -1))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		qwk = np.where(expected_w > 0, 1.0 - observed_w / np.where(expected_w > 0, expected_w, 1.0), np.nan)
+
+	nan = np.where(n > 0, 1.0, np.nan)
+	return {
+		"accuracy": correct / safe_n * nan,
+		"mse": mse * nan,
+		"mae": mae * nan,
+		"rmse": np.sqrt(mse) * nan,
+		"qwk": qwk * nan,
+	}
+
+
+def _to_float(x: object) -> Optional[float]:
+	f = float(x)  # type: ignore[arg-type]
+	return None if np.isnan(f) else f
+
+
+def metrics_from_confusion(cm: np.ndarray) -> Dict[str, object]:
+	point = _metrics_batch(cm)
+	out: Dict[str, object] = {"n": int(cm.sum())}
+	out.update({k: _to_float(v) for k, v in point.items()})
+	return out
+
+
+def bootstrap_ci(
+	cm: np.ndarray,
+	*,
+	n_boot: int = 1000,
+	alpha: float = 0.05,
+	seed: Optional[int] = 0,
+) -> Dict[str, List[Optional[float]]]:
+	"""
+	Percentile bootstrap intervals. Resampling n rows with replacement is the
+	same as one multinomial draw over the confusion cells, so all n_boot
+	replicates are generated and scored as a (n_boot, 5, 5) array.
+	"""
+	n = int(cm.sum())
+	if n == 0 or n_boot <= 0:
+		return {}
+	rng = np.random.default_rng(seed)
+	probs = cm.reshape(-1) / n
+	draws = rng.multinomial(n, probs, size=n_boot).reshape(n_boot, NUM_LEVELS, NUM_LEVELS)
+	stats = _metrics_batch(draws)
+	lo, hi = 100 * (alpha / 2), 100 * (1 - alpha / 2)
+	out: Dict[str, List[Optional[float]]] = {}
+	for k, v in stats.items():
+		v = v[~np.isnan(v)]
+		if v.size == 0:
+			out[k] = [None, None]
+		else:
+			a, b = np.percentile(v, [lo, hi])
+			out[k] = [float(a), float(b)]
+	return out
+
+
+def paired_difference(
+	pred: Sequence[object],
+	baseline: Sequence[object],
+	gold: Sequence[object],
+	*,
+	metric: str = "accuracy",
+	n_boot: int = 1000,
+	alpha: float = 0.05,
+	seed: Optional[int] = 0,
+) -> Dict[str, object]:
+	"""
+	Mean per-row difference pred - baseline of exact match ("accuracy") or
+	squared error ("mse") over rows where pred, baseline and gold are all
+	present, with a percentile bootstrap interval. The per-row differences
+	take few distinct values, so resampling is one multinomial draw over them.
+	"""
+	if metric not in ("accuracy", "mse"):
+		raise ValueError(f"Unknown metric: {metric}")
+	p, b, g = _as_levels(pred), _as_levels(baseline), _as_levels(gold)
+	ok = (p >= 0) & (b >= 0) & (g >= 0)
+	p, b, g = p[ok].astype(np.int64), b[ok].astype(np.int64), g[ok].astype(np.int64)
+	if metric == "accuracy":
+		d = (p == g).astype(np.int64) - (b == g)
+	else:
+		d = (p - g) ** 2 - (b - g) ** 2
+	n = int(d.size)
+	out: Dict[str, object] = {"metric": metric, "n": n, "difference": float(d.mean()) if n else None, "ci": [None, None]}
+	if n == 0 or n_boot <= 0:
+		return out
+	values, counts = np.unique(d, return_counts=True)
+	draws = np.random.default_rng(seed).multinomial(n, counts / n, size=n_boot)
+	means = draws @ values / n
+	lo, hi = np.percentile(means, [100 * (alpha / 2), 100 * (1 - alpha / 2)])
+	out["ci"] = [float(lo), float(hi)]
+	return out
+
+
+def grouped_confusion(pred: np.ndarray, gold: np.ndarray, groups: Sequence[object]) -> Dict[str, np.ndarray]:
+	"""
+	Confusion matrix per group label, computed with a single bincount.
+	"""
+	pred = _as_levels(pred)
+	gold = _as_levels(gold)
+	labels, inverse = np.unique(np.asarray(groups, dtype=str), return_inverse=True)
+	ok = (pred >= 0) & (gold >= 0)
+	cells = (inverse[ok].astype(np.int64) * NUM_LEVELS + gold[ok]) * NUM_LEVELS + pred[ok]
+	counts = np.bincount(cells, minlength=len(labels) * NUM_LEVELS * NUM_LEVELS)
+	cms = counts.reshape(len(labels), NUM_LEVELS, NUM_LEVELS)
+	return {str(label): cms[i] for i, label in enumerate(labels)}
+
+
+def compute_metrics(
+	pred: Sequence[object],
+	gold: Sequence[object],
+	*,
+	groups: Optional[Dict[str, Sequence[object]]] = None,
+	n_boot: int = 1000,
+	alpha: float = 0.05,
+	seed: Optional[int] = 0,
+) -> Dict[str, object]:
+	"""
+	Accuracy (exact match), MSE, MAE, RMSE, QWK, confusion matrix and bootstrap
+	confidence intervals, plus the same point metrics per group for each
+	column in `groups` (e.g. {"channels_of_trade": [...]}).
+	Rows missing pred or gold are excluded (see METRICS.md).
+	"""
+	pred_l = _as_levels(pred)
+	gold_l = _as_levels(gold)
+	cm = confusion_matrix(pred_l, gold_l)
+	out = metrics_from_confusion(cm)
+	# Backwards-compatible keys used by eval.py consumers
+	out["total_labeled"] = int((gold_l >= 0).sum())
+	out["exact_match"] = out["accuracy"]
+	out["confusion"] = cm.tolist()
+	out["ci"] = bootstrap_ci(cm, n_boot=n_boot, alpha=alpha, seed=seed)
+	out["ci_level"] = 1 - alpha
+
+	if groups:
+		breakdown: Dict[str, Dict[str, object]] = {}
+		for name, labels in groups.items():
+			per = grouped_confusion(pred_l, gold_l, labels)
+			breakdown[name] = {label: metrics_from_confusion(g_cm) for label, g_cm in per.items()}
+		out["by_group"] = breakdown
+	return out
+
+
+# ---- Columnar results ----
+
+def results_to_columns(rows: Iterable[Dict[str, object]], *, group_keys: Sequence[str] = ()) -> Dict[str, np.ndarray]:
+	"""
+	Turn streamed result rows (eval.py records) into NumPy columns:
+	pred, gold (int8, -1 = missing), factor:<name>, factor_confidence:<name>
+	(when any factor has one), spsc_proximity and the judge's sampling
+	confidence (float32, NaN = missing) and one string column per group key.
+	"""
+	pred: List[object] = []
+	gold: List[object] = []
+	factor_cols: Dict[str, List[float]] = {}
+	factor_conf: Dict[str, List[float]] = {}
+	proximity: List[float] = []
+	confidence: List[float] = []
+	group_cols: Dict[str, List[str]] = {k: [] for k in group_keys}
+	n = 0
+	for row in rows:
+		pred.append(row.get("pred_overall"))
+		gold.append(row.get("gold_overall"))
+		factors = row.get("factors") or {}
+		if isinstance(factors, dict):
+			for fname, fout in factors.items():
+				col = factor_cols.setdefault(fname, [float("nan")] * n)
+				score = fout.get("score") if isinstance(fout, dict) else fout
+				col.append(float(score) if isinstance(score, (int, float)) else float("nan"))
+				conf = fout.get("confidence") if isinstance(fout, dict) else None
+				if isinstance(conf, (int, float)):
+					factor_conf.setdefault(fname, [float("nan")] * n).append(float(conf))
+		for col in (*factor_cols.values(), *factor_conf.values()):
+			if len(col) < n + 1:
+				col.append(float("nan"))
+		prox = row.get("spsc_proximity")
+		proximity.append(float(prox) if isinstance(prox, (int, float)) else float("nan"))
+		conf = (row.get("judge") or {}).get("confidence")  # type: ignore[union-attr]
+		confidence.append(float(conf) if isinstance(conf, (int, float)) else float("nan"))
+		for k in group_keys:
+			v = row.get(k)
+			group_cols[k].append("" if v is None else str(v))
+		n += 1
+
+	cols: Dict[str, np.ndarray] = {
+		"pred": _as_levels(pred),
+		"gold": _as_levels(gold),
+	}
+	for fname, values in factor_cols.items():
+		cols[f"factor:{fname}"] = np.asarray(values, dtype=np.float32)
+	for fname, values in factor_conf.items():
+		cols[f"factor_confidence:{fname}"] = np.asarray(values, dtype=np.float32)
+	if not all(np.isnan(proximity)):
+		cols["spsc_proximity"] = np.asarray(proximity, dtype=np.float32)
+	if not all(np.isnan(confidence)):
+		cols["confidence"] = np.asarray(confidence, dtype=np.float32)
+	for k, values in group_cols.items():
+		cols[k] = np.asarray(values, dtype=str)
+	return cols
+
+
+def save_columns(path: str, cols: Dict[str, np.ndarray]) -> None:
+	np.savez(path, **cols)
+
+
+def load_columns(
+	path: str,
+	*,
+	group_keys: Sequence[str] = (),
+	cache: bool = False,
+	columns: Optional[Sequence[str]] = None,
+) -> Dict[str, np.ndarray]:
+	"""
+	Load result columns from a .npz file, a columnar result file
+	(.parquet / .cols, see columnar.py) or a results JSONL file.
+	For JSONL with cache=True, a sidecar '<path>.cols.npz' is written next to
+	it and reused while it is newer than the JSONL, so re-scoring skips JSON
+	parsing; if it cannot be written (e.g. read-only input) nothing is cached.
+	With `columns`, only those (of the ones present) are returned; columnar
+	files then read nothing else.
+	"""
+	from .columnar import column_names, is_columnar, read_columns
+
+	if is_columnar(path):
+		present = column_names(path)
+		return read_columns(path, [c for c in columns if c in present] if columns is not None else None)
+
+	if path.endswith(".npz"):
+		with np.load(path, allow_pickle=False) as data:
+			return {k: data[k] for k in data.files if columns is None or k in columns}
+
+	sidecar = path + ".cols.npz"
+	if cache and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+		cols = load_columns(sidecar, columns=columns)
+		if all(k in cols for k in group_keys if columns is None or k in columns):
+			return cols
+
+	from .results_io import iter_jsonl
+	cols = results_to_columns(iter_jsonl(path), group_keys=group_keys)
+	if cache:
+		try:
+			save_columns(sidecar, cols)
+		except OSError:
+			with contextlib.suppress(OSError):
+				os.remove(sidecar)
+	return {k: v for k, v in cols.items() if columns is None or k in columns}
+
+
+def score_results_file(
+	path: str,
+	*,
+	group_keys: Sequence[str] = ("channels_of_trade",),
+	n_boot: int = 1000,
+	alpha: float = 0.05,
+	seed: Optional[int] = 0,
+	cache: bool = False,
+) -> Dict[str, object]:
+	"""
+	Re-score a saved results file without re-running inference
+	(cache: see load_columns).
+	"""
+	cols = load_columns(path, group_keys=group_keys, cache=cache, columns=["pred", "gold", *group_keys])
+	groups = {k: cols[k] for k in group_keys if k in cols and np.any(cols[k] != "")}
+	return compute_metrics(cols["pred"], cols["gold"], groups=groups or None, n_boot=n_boot, alpha=alpha, seed=seed)
@@ -1,4 +1,91 @@
-from typing import Optional, Any, Dict
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from .parsing import IncrementalScoreParser, score_value_offset
+from .scheduler import RequestScheduler, current_priority, estimate_tokens
+
+
+# Local inference backends. "torch" is the original full-precision path,
+# "int8" applies PyTorch dynamic quantization to the Linear layers and
+# "onnx" runs an ONNX Runtime export through optimum.
+LOCAL_BACKENDS = ("torch", "int8", "onnx")
+
+
+def _configure_threads(num_threads: Optional[int]) -> None:
+	"""
+	Apply CPU thread-count limits for torch and ONNX Runtime.
+	"""
+	if not num_threads or num_threads <= 0:
+		return
+	os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+	os.environ.setdefault("MKL_NUM_THREADS", str(num_threads))
+	try:
+		import torch  # type: ignore
+		torch.set_num_threads(int(num_threads))
+	except Exception:
+		pass
+
+
+def load_local_model(
+	model_name: str,
+	*,
+	task: str,
+	backend: str = "torch",
+	num_threads: Optional[int] = None,
+) -> Tuple[Any, Any]:
+	"""
+	Load (model, tokenizer) for a HF task using the requested backend.
+	task is "text2text-generation" (seq2seq) or "text-generation" (causal).
+	"""
+	if backend not in LOCAL_BACKENDS:
+		raise ValueError(f"Unknown backend '{backend}', expected one of {LOCAL_BACKENDS}")
+	seq2seq = task == "text2text-generation"
+	_configure_threads(num_threads)
+
+	try:
+		from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForCausalLM  # type: ignore
+	except Exception as exc:  # pragma: no cover - import error path
+		raise RuntimeError(
+			"Transformers is required for local inference. Install with: pip install transformers sentencepiece accelerate"
+		) from exc
+
+	tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+	if backend == "onnx":
+		try:
+			import onnxruntime  # type: ignore
+			from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTModelForCausalLM  # type: ignore
+		except Exception as exc:  # pragma: no cover - import error path
+			raise RuntimeError(
+				"ONNX backend requires optimum. Install with: pip install optimum[onnxruntime]"
+			) from exc
+		session_options = onnxruntime.SessionOptions()
+		if num_threads and num_threads > 0:
+			session_options.intra_op_num_threads = int(num_threads)
+			session_options.inter_op_num_threads = 1
+		# Export on the fly unless the model id already points at an ONNX export
+		already_onnx = os.path.isdir(model_name) and any(
+			f.endswith(".onnx") for f in os.listdir(model_name)
+		)
+		ort_cls = ORTModelForSeq2SeqLM if seq2seq else ORTModelForCausalLM
+		model = ort_cls.from_pretrained(
+			model_name,
+			export=not already_onnx,
+			provider="CPUExecutionProvider",
+			session_options=session_options,
+		)
+		return model, tokenizer
+
+	model_cls = AutoModelForSeq2SeqLM if seq2seq else AutoModelForCausalLM
+	model = model_cls.from_pretrained(model_name, low_cpu_mem_usage=True)
+	if backend == "int8":
+		import torch  # type: ignore
+		model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+	model.eval()
+	return model, tokenizer
 
 
 class LLMWrapper:
@@ -6,45 +93,191 @@ class LLMWrapper:
 	Wrapper for loading and running a HuggingFace model.
 	This class imports Transformers lazily so that installing heavy
 	dependencies is optional if you only need the prompt and retriever.
+
+	task selects the pipeline: "text2text-generation" (seq2seq, e.g. flan-t5)
+	or "text-generation" (causal instruction models used by FactorAgent).
 	"""
 
-	def __init__(self, model_name: str = "google/flan-t5-base", device: int = -1, max_new_tokens: int = 512):
+	def __init__(
+		self,
+		model_name: str = "google/flan-t5-base",
+		device: int = -1,
+		max_new_tokens: int = 512,
+		*,
+		task: str = "text2text-generation",
+		backend: str = "torch",
+		num_threads: Optional[int] = None,
+	):
 		self.model_name = model_name
 		self.device = device
 		self.max_new_tokens = max_new_tokens
+		self.task = task
+		self.backend = backend
+		self.num_threads = num_threads
 
 		try:
-			from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline  # type: ignore
+			from transformers import pipeline  # type: ignore
 		except Exception as exc:  # pragma: no cover - import error path
 			raise RuntimeError(
 				"Transformers is required for local inference. Install with: pip install transformers sentencepiece accelerate"
 			) from exc
 
 		# Load model + tokenizer
-		self._tokenizer = AutoTokenizer.from_pretrained(model_name)
-		self._model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+		self._model, self._tokenizer = load_local_model(
+			model_name,
+			task=task,
+			backend=backend,
+			num_threads=num_threads,
+		)
 
-		# Build text generation pipeline
+		# Build text generation pipeline (quantized / ONNX models are CPU-only)
 		self._generator = pipeline(
-			"text2text-generation",
+			task,
 			model=self._model,
 			tokenizer=self._tokenizer,
-			device=device,
+			device=device if backend == "torch" else -1,
 		)
 
-	def run(self, prompt: str, temperature: float = 0.0, top_p: float = 1.0) -> str:
+	def _gen_kwargs(self, temperature: float, top_p: float, max_new_tokens: Optional[int]) -> Dict[str, Any]:
+		return {
+			"max_new_tokens": max_new_tokens or self.max_new_tokens,
+			"temperature": temperature,
+			"top_p": top_p,
+			"do_sample": temperature > 0.0,
+		}
+
+	def run(
+		self,
+		prompt: str,
+		temperature: float = 0.0,
+		top_p: float = 1.0,
+		*,
+		max_new_tokens: Optional[int] = None,
+	) -> str:
 		"""
 		Run the model on a given prompt and return generated text.
 		"""
-		output = self._generator(
-			prompt,
-			max_new_tokens=self.max_new_tokens,
-			temperature=temperature,
-			top_p=top_p,
-			do_sample=temperature > 0.0,
-		)
+		output = self._generator(prompt, **self._gen_kwargs(temperature, top_p, max_new_tokens))
 		return str(output[0]["generated_text"]).strip()
 
+	def run_samples(
+		self,
+		prompt: str,
+		n: int,
+		temperature: float = 0.7,
+		top_p: float = 1.0,
+		*,
+		max_new_tokens: Optional[int] = None,
+	) -> List[str]:
+		"""
+		n sampled completions from one generate call: the prompt is encoded
+		once and expanded with num_return_sequences. Greedy decoding
+		(temperature 0) gives n copies of a single completion.
+		"""
+		n = max(int(n), 1)
+		if n == 1 or temperature <= 0.0:
+			return [self.run(prompt, temperature, top_p, max_new_tokens=max_new_tokens)] * n
+		outputs = self._generator(prompt, num_return_sequences=n, **self._gen_kwargs(temperature, top_p, max_new_tokens))
+		return [str(o["generated_text"]).strip() for o in outputs]
+
+	async def arun(self, prompt: str, temperature: float = 0.0, top_p: float = 1.0, **kwargs: Any) -> str:
+		"""
+		Async variant of run(); generation happens in a worker thread.
+		"""
+		return await asyncio.to_thread(self.run, prompt, temperature, top_p, **kwargs)
+
+	def run_batch(
+		self,
+		prompts: Sequence[str],
+		temperature: float = 0.0,
+		top_p: float = 1.0,
+		*,
+		max_new_tokens: Optional[int] = None,
+		batch_size: int = 4,
+	) -> List[str]:
+		"""
+		Run several prompts through the pipeline in batches.
+		"""
+		if not prompts:
+			return []
+		outputs = self._generator(
+			list(prompts),
+			batch_size=batch_size,
+			**self._gen_kwargs(temperature, top_p, max_new_tokens),
+		)
+		texts: List[str] = []
+		for out in outputs:
+			# text2text returns a dict per prompt, text-generation a list of dicts
+			first = out[0] if isinstance(out, list) else out
+			texts.append(str(first["generated_text"]).strip())
+		return texts
+
+
+def _merge_reasoning(msg: Any) -> str:
+	"""
+	Join reasoning_content (if the provider returns it) and content into one text.
+	"""
+	reasoning = getattr(msg, "reasoning_content", None)
+	content = (getattr(msg, "content", None) or "").strip()
+	if reasoning:
+		return (str(reasoning).strip() + "\n" + content).strip()
+	return content
+
+
+def _score_token_prob(choice: Any) -> Optional[float]:
+	"""
+	Probability of the content token that carries the final "Score: N" digit.
+	"""
+	tokens = getattr(getattr(choice, "logprobs", None), "content", None)
+	offset = score_value_offset(getattr(choice.message, "content", None) or "")
+	if not tokens or offset is None:
+		return None
+	pos = 0
+	for tok in tokens:
+		pos += len(tok.token)
+		if pos > offset:
+			return round(math.exp(tok.logprob), 4)
+	return None
+
+
+class _StreamState:
+	"""
+	Accumulates streamed chat deltas. Scores are parsed incrementally from the
+	answer content only, so numbers quoted in a reasoning trace are ignored.
+	"""
+
+	def __init__(self, fields: Iterable[str]) -> None:
+		self.reasoning: List[str] = []
+		self.parser = IncrementalScoreParser(fields)
+		self.stopped_early = False
+
+	def text(self) -> str:
+		reasoning = "".join(self.reasoning).strip()
+		content = self.parser.text.strip()
+		return (reasoning + "\n" + content).strip() if reasoning else content
+
+	def consume(self, chunk: Any) -> Optional[Dict[str, Any]]:
+		if not getattr(chunk, "choices", None):
+			return None  # e.g. a trailing usage-only chunk
+		delta = chunk.choices[0].delta
+		reasoning = getattr(delta, "reasoning_content", None) or ""
+		content = getattr(delta, "content", None) or ""
+		if not (reasoning or content):
+			return None
+		if reasoning:
+			self.reasoning.append(str(reasoning))
+		scores = self.parser.feed(str(content)) if content else dict(self.parser.scores)
+		return {"delta": content, "reasoning_delta": reasoning, "scores": scores, "done": False}
+
+	def final(self) -> Dict[str, Any]:
+		return {
+			"delta": "",
+			"reasoning_delta": "",
+			"scores": self.parser.finish(),
+			"done": True,
+			"stopped_early": self.stopped_early,
+			"text": self.text(),
+		}
 
 
 class ChatAPIWrapper:
@@ -60,6 +293,8 @@ class ChatAPIWrapper:
 		api_key: str,
 		model: str,
 		max_tokens: int = 512,
+		max_concurrency: int = 8,
+		scheduler: Optional[RequestScheduler] = None,
 	):
 		try:
 			from openai import OpenAI  # type: ignore
@@ -68,10 +303,37 @@ class ChatAPIWrapper:
 				"OpenAI client is required for chat API. Install with: pip install openai"
 			) from exc
 
-		self._client = OpenAI(base_url=base_url, api_key=api_key)
+		# With a scheduler, 429s must reach it instead of the client's own retry loop
+		self._client_kwargs: Dict[str, Any] = {"max_retries": 0} if scheduler is not None else {}
+		self._client = OpenAI(base_url=base_url, api_key=api_key, **self._client_kwargs)
+		self.scheduler = scheduler
+		self._async_client: Optional[Any] = None
+		self._api_key = api_key
 		self._model = model
 		self._max_tokens = max_tokens
 		self._base_url = base_url
+		self._max_concurrency = max(int(max_concurrency), 1)
+
+	def _request(
+		self,
+		prompt: str,
+		temperature: float,
+		top_p: float,
+		max_tokens: Optional[int],
+		extra_body: Optional[Dict[str, Any]],
+		stream: bool = False,
+	) -> Dict[str, Any]:
+		return {
+			"model": self._model,
+			"messages": [{"role": "user", "content": prompt}],
+			"temperature": max(temperature, 0.0),
+			"top_p": top_p,
+			"max_tokens": max_tokens or self._max_tokens,
+			"frequency_penalty": 0,
+			"presence_penalty": 0,
+			"stream": stream,
+			"extra_body": extra_body or {},
+		}
 
 	def run(
 		self,
@@ -79,26 +341,214 @@ class ChatAPIWrapper:
 		*,
 		temperature: float = 0.6,
 		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
 		extra_body: Optional[Dict[str, Any]] = None,
+		priority: Optional[str] = None,
 	) -> str:
-		messages = [{"role": "user", "content": prompt}]
+		request = self._request(prompt, temperature, top_p, max_tokens, extra_body)
+		resp = self._call(lambda: self._client.chat.completions.create(**request), request, priority)
+		return _merge_reasoning(resp.choices[0].message)
 
+	def run_samples(
+		self,
+		prompt: str,
+		n: int,
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		priority: Optional[str] = None,
+	) -> List[str]:
+		"""
+		n completions of one prompt in a single request (the API's `n`
+		parameter). Providers that return fewer choices are topped up with
+		further requests for the missing samples.
+		"""
+		n = max(int(n), 1)
+		texts: List[str] = []
+		while len(texts) < n:
+			request = self._request(prompt, temperature, top_p, max_tokens, extra_body)
+			request["n"] = n - len(texts)
+			resp = self._call(lambda: self._client.chat.completions.create(**request), request, priority)
+			got = [_merge_reasoning(c.message) for c in resp.choices or []]
+			if not got:
+				raise RuntimeError("Chat API returned no choices")
+			texts.extend(got)
+		return texts[:n]
 
-		resp = self._client.chat.completions.create(
-			model=self._model,
-			messages=messages,
+	def run_with_confidence(
+		self,
+		prompt: str,
+		*,
+		temperature: float = 0.0,
+		top_p: float = 1.0,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		priority: Optional[str] = None,
+	) -> Tuple[str, Optional[float]]:
+		"""
+		run() plus the probability of the final score's digit token (from the
+		API's logprobs); None when the provider returns no logprobs or no score.
+		"""
+		request = self._request(prompt, temperature, top_p, max_tokens, extra_body)
+		request["logprobs"] = True
+		resp = self._call(lambda: self._client.chat.completions.create(**request), request, priority)
+		choice = resp.choices[0]
+		return _merge_reasoning(choice.message), _score_token_prob(choice)
+
+	def _call(self, fn: Callable[[], Any], request: Dict[str, Any], priority: Optional[str]) -> Any:
+		if self.scheduler is None:
+			return fn()
+		tokens = estimate_tokens(request["messages"][-1]["content"], request["max_tokens"] * int(request.get("n", 1)))
+		return self.scheduler.call(fn, priority=priority, tokens=tokens)
+
+	async def _acall(self, fn: Callable[[], Any], request: Dict[str, Any], priority: Optional[str]) -> Any:
+		if self.scheduler is None:
+			return await fn()
+		tokens = estimate_tokens(request["messages"][-1]["content"], request["max_tokens"] * int(request.get("n", 1)))
+		return await self.scheduler.acall(fn, priority=priority, tokens=tokens)
+
+	async def arun(
+		self,
+		prompt: str,
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		priority: Optional[str] = None,
+	) -> str:
+		client = self._get_async_client()
+		request = self._request(prompt, temperature, top_p, max_tokens, extra_body)
+		resp = await self._acall(lambda: client.chat.completions.create(**request), request, priority)
+		return _merge_reasoning(resp.choices[0].message)
+
+	def _get_async_client(self) -> Any:
+		if self._async_client is None:
+			from openai import AsyncOpenAI  # type: ignore
+			self._async_client = AsyncOpenAI(base_url=self._base_url, api_key=self._api_key, **self._client_kwargs)
+		return self._async_client
+
+	def run_batch(
+		self,
+		prompts: Sequence[str],
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		priority: Optional[str] = None,
+	) -> List[str]:
+		"""
+		Send prompts concurrently (up to max_concurrency in flight), preserving order.
+		"""
+		if not prompts:
+			return []
+		# Pool threads do not inherit the caller's context, so resolve the priority here
+		priority = priority or current_priority()
+
+		def _one(p: str) -> str:
+			return self.run(p, temperature=temperature, top_p=top_p, max_tokens=max_tokens, extra_body=extra_body, priority=priority)
+
+		workers = min(self._max_concurrency, len(prompts))
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			return list(pool.map(_one, prompts))
+
+	def stream(
+		self,
+		prompt: str,
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		fields: Iterable[str] = ("score",),
+		stop_when_scored: bool = False,
+	) -> Iterator[Dict[str, Any]]:
+		"""
+		Stream a completion, yielding partial results as deltas arrive:
+		{"delta", "reasoning_delta", "scores", "done"}. The last item has
+		done=True plus "text" (reasoning + content, as run() returns) and
+		"stopped_early". With stop_when_scored=True the HTTP stream is closed
+		as soon as every requested score field has a value.
+		"""
+		state = _StreamState(fields)
+		request = self._request(prompt, temperature, top_p, max_tokens, extra_body, stream=True)
+		# The scheduler admits (and retries) opening the stream; reading it is not throttled
+		resp = self._call(lambda: self._client.chat.completions.create(**request), request, None)
+		try:
+			for chunk in resp:
+				update = state.consume(chunk)
+				if update is None:
+					continue
+				yield update
+				if stop_when_scored and state.parser.complete:
+					state.stopped_early = True
+					break
+		finally:
+			resp.close()
+		yield state.final()
+
+	async def astream(
+		self,
+		prompt: str,
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		fields: Iterable[str] = ("score",),
+		stop_when_scored: bool = False,
+	) -> AsyncIterator[Dict[str, Any]]:
+		"""
+		Async variant of stream().
+		"""
+		client = self._get_async_client()
+		state = _StreamState(fields)
+		request = self._request(prompt, temperature, top_p, max_tokens, extra_body, stream=True)
+		resp = await self._acall(lambda: client.chat.completions.create(**request), request, None)
+		try:
+			async for chunk in resp:
+				update = state.consume(chunk)
+				if update is None:
+					continue
+				yield update
+				if stop_when_scored and state.parser.complete:
+					state.stopped_early = True
+					break
+		finally:
+			await resp.close()
+		yield state.final()
+
+	def run_streaming(
+		self,
+		prompt: str,
+		*,
+		temperature: float = 0.6,
+		top_p: float = 0.95,
+		max_tokens: Optional[int] = None,
+		extra_body: Optional[Dict[str, Any]] = None,
+		fields: Iterable[str] = ("score",),
+		stop_when_scored: bool = True,
+		on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+	) -> str:
+		"""
+		Like run(), but streamed: on_update receives each partial result and the
+		request is cut short once the score is known (unless stop_when_scored=False).
+		Returns the text received so far.
+		"""
+		final: Dict[str, Any] = {}
+		for update in self.stream(
+			prompt,
 			temperature=temperature,
 			top_p=top_p,
-			max_tokens=self._max_tokens,
-			frequency_penalty=0,
-			presence_penalty=0,
-			stream=False,
-			extra_body=extra_body or {},
-		)
-		msg = resp.choices[0].message
-		reasoning = getattr(msg, "reasoning_content", None)
-		content = (getattr(msg, "content", None) or "").strip()
-		if reasoning:
-			return (str(reasoning).strip() + "\n" + content).strip()
-		return content
-
+			max_tokens=max_tokens,
+			extra_body=extra_body,
+			fields=fields,
+			stop_when_scored=stop_when_scored,
+		):
+			if on_update is not None:
+				on_update(update)
+			final = update
+		return str(final.get("text", ""))
@@ -0,0 +1,184 @@
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+
+# Score grammar: a label, ':' or '-', then a single digit. Markdown emphasis
+# around label/value is allowed (e.g. "**Nature Score**: 3") and the trailing
+# \b rejects multi-digit numbers. SCORE_RE is the forward reference form;
+# parse_fields locates the separator+digit first and checks the label
+# behind it, which is much cheaper than trying the alternation at every offset.
+_LABEL = (
+	r"(?:"
+	r"(?P<nature>Nature\s*Score)"
+	r"|(?P<purpose>Purpose\s*Score)"
+	r"|(?P<overall>Overall(?:\s+Similarity)?(?:\s+Score)?)"
+	r"|Score"
+	r")[*_]*\s*"
+)
+_VALUE = r"[:\-]\s*[*_]*\s*(?P<value>\d)\b"
+
+SCORE_RE = re.compile(_LABEL + _VALUE, re.IGNORECASE)
+_VALUE_RE = re.compile(_VALUE)
+_LABEL_END_RE = re.compile(_LABEL + r"\Z", re.IGNORECASE)
+
+PIPELINE_FIELDS: FrozenSet[str] = frozenset({"nature", "purpose", "overall"})
+ALL_FIELDS: FrozenSet[str] = PIPELINE_FIELDS | {"score"}
+
+_LABELS = ("nature", "purpose", "overall")
+_FIELD_ORDER = _LABELS + ("score",)
+# Longest label text examined in front of a separator
+_LABEL_SPAN = 64
+# First tail window scanned (characters); grown 4x while a requested field is missing
+TAIL_WINDOW = 1024
+
+
+def _scan(text: str, start: int, fields: FrozenSet[str]) -> Dict[str, int]:
+	"""
+	Reference forward scan: last value of each field in text[start:].
+	"score" is the last score under any label.
+	"""
+	found: Dict[str, int] = {}
+	for m in SCORE_RE.finditer(text, start):
+		value = int(m.group("value"))
+		found["score"] = value
+		for name in _LABELS:
+			if m.group(name) is not None:
+				found[name] = value
+				break
+	return {k: v for k, v in found.items() if k in fields}
+
+
+def _label_before(text: str, pos: int) -> Optional[str]:
+	m = _LABEL_END_RE.search(text, max(pos - _LABEL_SPAN, 0), pos)
+	if m is None:
+		return None
+	for name in _LABELS:
+		if m.group(name) is not None:
+			return name
+	return "score"
+
+
+def parse_fields(text: str, fields: Iterable[str] = ALL_FIELDS) -> Dict[str, Optional[int]]:
+	"""
+	Extract the final value of each requested score field.
+
+	The final answer sits at the end of the output (after any reasoning trace),
+	so candidates are examined from the end of a tail window backwards; the
+	window only grows, line-aligned and without rescanning, while a requested
+	field is still missing. Later mentions win over earlier ones.
+	"""
+	wanted = frozenset(fields)
+	unknown = wanted - ALL_FIELDS
+	if unknown:
+		raise ValueError(f"Unknown score field(s): {', '.join(sorted(unknown))}")
+	out: Dict[str, Optional[int]] = {k: None for k in _FIELD_ORDER if k in wanted}
+	missing = set(wanted)
+	n = len(text or "")
+	end = n  # separators starting at or after `end` were already examined
+	window = TAIL_WINDOW
+	while missing and end > 0:
+		start = 0 if window >= n else text.rfind("\n", 0, n - window) + 1
+		window *= 4
+		if start >= end:
+			continue
+		candidates = []
+		for m in _VALUE_RE.finditer(text, start):
+			if m.start() >= end:
+				break
+			candidates.append(m)
+		for m in reversed(candidates):
+			label = _label_before(text, m.start())
+			if label is None:
+				continue
+			value = int(m.group("value"))
+			if "score" in missing:
+				out["score"] = value
+				missing.discard("score")
+			if label in missing:
+				out[label] = value
+				missing.discard(label)
+			if not missing:
+				break
+		end = start
+	return out
+
+
+def parse_scores(output: str) -> Dict[str, Optional[int]]:
+	"""
+	Parse model output to extract integer scores for nature, purpose, and overall.
+	If a score cannot be found, value is None.
+	"""
+	scores = parse_fields(output, PIPELINE_FIELDS)
+	return {"nature": scores["nature"], "purpose": scores["purpose"], "overall": scores["overall"]}
+
+
+def parse_factor_score(output: str) -> Optional[int]:
+	"""
+	Final "... Score: N" value in a factor agent's output, or None.
+	"""
+	return parse_fields(output, ("score",))["score"]
+
+
+def score_value_offset(output: str) -> Optional[int]:
+	"""
+	Character offset of the digit parse_factor_score() returns, or None.
+	"""
+	offset = None
+	for m in SCORE_RE.finditer(output or ""):
+		offset = m.start("value")
+	return offset
+
+
+def parse_many(texts: Iterable[Optional[str]], fields: Iterable[str] = ALL_FIELDS) -> List[Dict[str, Optional[int]]]:
+	"""
+	parse_fields over many outputs, e.g. raw_output values from a results file.
+	"""
+	wanted = frozenset(fields)
+	return [parse_fields(t or "", wanted) for t in texts]
+
+
+class IncrementalScoreParser:
+	"""
+	Parse score fields from text that arrives in chunks (e.g. streamed tokens).
+
+	Each feed() only scans the new text plus a short overlap, and a digit is
+	reported once the character after it has arrived (so "Score: 1" is not
+	mistaken for the start of "Score: 10"). Later mentions replace earlier ones.
+	"""
+
+	# Overlap re-scanned before the new text so labels split across chunks are seen
+	_OVERLAP = _LABEL_SPAN * 2
+
+	def __init__(self, fields: Iterable[str] = ALL_FIELDS) -> None:
+		self.fields = frozenset(fields)
+		self.text = ""
+		self.scores: Dict[str, Optional[int]] = {k: None for k in _FIELD_ORDER if k in self.fields}
+		self._scanned = 0
+
+	@property
+	def complete(self) -> bool:
+		return all(v is not None for v in self.scores.values())
+
+	def _parse_until(self, end: int) -> None:
+		if end <= self._scanned:
+			return
+		start = max(self._scanned - self._OVERLAP, 0)
+		for k, v in parse_fields(self.text[start:end], self.fields).items():
+			if v is not None:
+				self.scores[k] = v
+		self._scanned = end
+
+	def feed(self, delta: str) -> Dict[str, Optional[int]]:
+		if delta:
+			self.text += delta
+			# Hold back a trailing run of digits: it may still be extended, and
+			# cutting inside it would let \b accept the first digit of "10"
+			end = len(self.text)
+			while end > self._scanned and self.text[end - 1].isdigit():
+				end -= 1
+			self._parse_until(end)
+		return dict(self.scores)
+
+	def finish(self) -> Dict[str, Optional[int]]:
+		self._parse_until(len(self.text))
+		return dict(self.scores)
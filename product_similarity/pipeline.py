@@ -1,45 +1,14 @@
-import json
-import os
-import re
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 
+from .backends import InferenceBackend, get_backend
+from .fewshot import FEWSHOT_PATH, _load_fewshot_cases, select_fewshot_blocks  # noqa: F401
+from .parsing import parse_scores
 from .prompt import build_prompt
-from .retriever import retrieve_contexts, contexts_from_class_numbers, DATA_DIR
+from .records import SimilarityRecord, verbosity_level
+from .retriever import retrieve_contexts, contexts_from_class_numbers
 from .spsc import retrieve_spsc_contexts
 
 
-FEWSHOT_PATH = os.path.join(DATA_DIR, "fewshot_cases.json")
-
-
-def _load_fewshot_cases() -> list:
-	if not os.path.exists(FEWSHOT_PATH):
-		raise FileNotFoundError(f"Missing fewshot cases at: {FEWSHOT_PATH}")
-	with open(FEWSHOT_PATH, "r", encoding="utf-8") as f:
-		return json.load(f)
-
-
-def parse_scores(output: str) -> Dict[str, Optional[int]]:
-	"""
-	Parse model output to extract integer scores for nature, purpose, and overall.
-	If a score cannot be found, value is None.
-	"""
-	scores: Dict[str, Optional[int]] = {"nature": None, "purpose": None, "overall": None}
-	if not output:
-		return scores
-
-	patterns = {
-		"nature": r"Nature\s*Score:\s*(\d)",
-		"purpose": r"Purpose\s*Score:\s*(\d)",
-		"overall": r"Overall(?:\s+Similarity)?(?:\s+Score)?\s*[:\-]\s*(\d)",
-	}
-
-	for key, pat in patterns.items():
-		m = re.search(pat, output, re.IGNORECASE)
-		if m:
-			scores[key] = int(m.group(1))
-	return scores
-
-
 def run_similarity(
     product_1: str,
     product_2: str,
@@ -47,6 +16,8 @@ def run_similarity(
     class_1: Optional[object] = None,
     class_2: Optional[object] = None,
     max_fewshot: int = 5,
+    # "first" = first max_fewshot cases; "nearest" = the most similar cases to this pair
+    fewshot_selection: str = "first",
     top_k: int = 3,
     include_spsc: bool = True,
     spsc_top_k: int = 2,
@@ -59,12 +30,28 @@ def run_similarity(
     max_new_tokens: int = 256,
     temperature: float = 0.0,
     top_p: float = 1.0,
-) -> Dict[str, object]:
+    # Local inference backend: "torch" | "int8" | "onnx"
+    backend: str = "torch",
+    num_threads: Optional[int] = None,
+    # Pre-built backend (any InferenceBackend); overrides model/chat settings
+    inference_backend: Optional[InferenceBackend] = None,
+    # Client-side chat API rate limits (requests / tokens per minute)
+    chat_rpm: Optional[float] = None,
+    chat_tpm: Optional[float] = None,
+    # Result detail: "full" | "compact" (no prompt/output text) | "scores"
+    verbosity: str = "full",
+    as_record: bool = False,
+) -> Union[Dict[str, object], SimilarityRecord]:
 	"""
 	Run the end-to-end similarity pipeline. If model_name is None, we skip
 	local inference and only return the built prompt and empty output.
+	Backends are cached per process, so repeated calls reuse loaded models.
+	as_record=True returns the slotted SimilarityRecord instead of a dict.
 	"""
-	fewshot_cases = _load_fewshot_cases()
+	verbosity_level(verbosity)  # fail before any model call
+	fewshot_blocks = select_fewshot_blocks(
+		product_1, product_2, max_fewshot, selection=fewshot_selection, class_1=class_1, class_2=class_2
+	)
 	# Build contexts: prefer provided classes if present, otherwise keyword retrieval
 	if class_1 or class_2:
 		contexts = contexts_from_class_numbers([class_1, class_2])
@@ -81,38 +68,41 @@ def run_similarity(
 			# Silently ignore SPSC retrieval errors to keep pipeline robust
 			pass
 
-	prompt = build_prompt(fewshot_cases, product_1, product_2, contexts, max_fewshot=max_fewshot)
+	prompt = build_prompt([], product_1, product_2, contexts, fewshot_blocks=fewshot_blocks)
 
 	output_text = ""
-	if chat_api_base_url and chat_api_key and chat_api_model:
-		try:
-			from .model import ChatAPIWrapper
-			chat = ChatAPIWrapper(
-                base_url=str(chat_api_base_url),
-                api_key=str(chat_api_key),
-                model=str(chat_api_model),
-                max_tokens=max_new_tokens,
-            )
-			output_text = chat.run(prompt, temperature=max(temperature, 0.0), top_p=top_p)
-		except Exception:
-			output_text = ""
-	elif model_name:
-		try:
-			from .model import LLMWrapper
-			llm = LLMWrapper(model_name=model_name, device=device, max_new_tokens=max_new_tokens)
-			output_text = llm.run(prompt, temperature=temperature, top_p=top_p)
-		except Exception:
-			# Keep output_text empty on any inference error
-			output_text = ""
-
-	return {
-		"product_1": product_1,
-		"product_2": product_2,
-		"class_1": class_1,
-		"class_2": class_2,
-		"contexts": contexts,
-		"prompt": prompt,
-		"output_text": output_text,
-		"scores": parse_scores(output_text),
-	}
+	error: Optional[str] = None
+	try:
+		llm = inference_backend or get_backend(
+			model_name=model_name,
+			chat_api_base_url=chat_api_base_url,
+			chat_api_key=chat_api_key,
+			chat_api_model=chat_api_model,
+			device=device,
+			max_new_tokens=max_new_tokens,
+			backend=backend,
+			num_threads=num_threads,
+			chat_rpm=chat_rpm,
+			chat_tpm=chat_tpm,
+		)
+		if llm is not None:
+			output_text = llm.run(prompt, temperature=max(temperature, 0.0), top_p=top_p)
+	except Exception as exc:
+		# Keep output_text empty on any inference error, but report why
+		output_text = ""
+		error = f"{type(exc).__name__}: {exc}"
+
+	record = SimilarityRecord.build(
+		product_1,
+		product_2,
+		class_1=class_1,
+		class_2=class_2,
+		scores=parse_scores(output_text),
+		error=error,
+		contexts=contexts,
+		prompt=prompt,
+		output_text=output_text,
+		verbosity=verbosity,
+	)
+	return record if as_record else record.as_dict()
 
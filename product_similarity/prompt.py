@@ -1,5 +1,5 @@
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence
 
 
 def format_fewshot(example: Dict) -> str:
@@ -30,10 +30,13 @@ def build_prompt(
     product_2: str,
     retrieved_contexts: List[str],
     max_fewshot: Optional[int] = None,
+    fewshot_blocks: Optional[Sequence[str]] = None,
 ) -> str:
     """
 	Build the full prompt for LLM evaluation focusing ONLY on the Nature factor.
 	Outputs a Nature Score in [0–4] with concise reasoning.
+	fewshot_blocks (already formatted examples, e.g. from fewshot.select_fewshot_blocks)
+	replace fewshot_examples/max_fewshot when given.
     """
 
     # ==== 1. Task description ====
@@ -57,12 +60,14 @@ def build_prompt(
     )
 
     # ==== 2. Few-shot examples ====
-    limited_examples = (
-        fewshot_examples[:max_fewshot]
-        if isinstance(max_fewshot, int) and max_fewshot > 0
-        else fewshot_examples
-    )
-    fewshot_text = "\n\n".join([format_fewshot(ex) for ex in limited_examples])
+    if fewshot_blocks is None:
+        limited_examples = (
+            fewshot_examples[:max_fewshot]
+            if isinstance(max_fewshot, int) and max_fewshot > 0
+            else fewshot_examples
+        )
+        fewshot_blocks = [format_fewshot(ex) for ex in limited_examples]
+    fewshot_text = "\n\n".join(fewshot_blocks)
 
     # ==== 3. NICE / guideline context ====
     context_text = ""
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Result verbosity, smallest first:
+# - "scores": products, labels and scores only (constant size per result)
+# - "compact": + retrieved contexts and per-factor reasoning text
+# - "full": + prompt, analyzer text and raw model output (the historical dict layout)
+VERBOSITY_LEVELS = ("scores", "compact", "full")
+
+_MISSING = -1
+_PIPELINE_FIELDS = ("nature", "purpose", "overall")
+
+
+def verbosity_level(verbosity: str) -> int:
+	try:
+		return VERBOSITY_LEVELS.index(verbosity)
+	except ValueError:
+		raise ValueError(f"Unknown verbosity {verbosity!r}; expected one of {', '.join(VERBOSITY_LEVELS)}") from None
+
+
+def _pack(values: Iterable[object]) -> array:
+	# int8 score column; anything that is not an int (None, parse failure) is -1
+	return array("b", (v if isinstance(v, int) and not isinstance(v, bool) else _MISSING for v in values))
+
+
+def _unpack(value: int) -> Optional[int]:
+	return None if value == _MISSING else int(value)
+
+
+def _float_or_nan(value: object) -> float:
+	return float(value) if isinstance(value, (int, float)) else float("nan")  # type: ignore[arg-type]
+
+
+@dataclass(slots=True)
+class SimilarityRecord:
+	"""
+	One run_similarity result. scores holds nature/purpose/overall as int8
+	(-1 = missing); text fields are None when dropped by the verbosity level.
+	"""
+
+	product_1: str
+	product_2: str
+	class_1: Optional[object]
+	class_2: Optional[object]
+	scores: array
+	error: Optional[str] = None
+	contexts: Optional[Tuple[str, ...]] = None
+	prompt: Optional[str] = None
+	output_text: Optional[str] = None
+
+	@classmethod
+	def build(
+		cls,
+		product_1: str,
+		product_2: str,
+		*,
+		class_1: Optional[object],
+		class_2: Optional[object],
+		scores: Dict[str, Optional[int]],
+		error: Optional[str],
+		contexts: Sequence[str],
+		prompt: str,
+		output_text: str,
+		verbosity: str = "full",
+	) -> "SimilarityRecord":
+		level = verbosity_level(verbosity)
+		return cls(
+			product_1=product_1,
+			product_2=product_2,
+			class_1=class_1,
+			class_2=class_2,
+			scores=_pack(scores.get(k) for k in _PIPELINE_FIELDS),
+			error=error,
+			contexts=tuple(contexts) if level >= 1 else None,
+			prompt=prompt if level >= 2 else None,
+			output_text=output_text if level >= 2 else None,
+		)
+
+	def score_dict(self) -> Dict[str, Optional[int]]:
+		return {k: _unpack(v) for k, v in zip(_PIPELINE_FIELDS, self.scores)}
+
+	def as_dict(self) -> Dict[str, object]:
+		out: Dict[str, object] = {
+			"product_1": self.product_1,
+			"product_2": self.product_2,
+			"class_1": self.class_1,
+			"class_2": self.class_2,
+		}
+		if self.contexts is not None:
+			out["contexts"] = list(self.contexts)
+		if self.prompt is not None:
+			out["prompt"] = self.prompt
+		if self.output_text is not None:
+			out["output_text"] = self.output_text
+		out["scores"] = self.score_dict()
+		out["error"] = self.error
+		return out
+
+
+@dataclass(slots=True)
+class EvalRecord:
+	"""
+	One eval.py result row. Factor scores (int8, -1 = missing) and judge
+	weights are typed arrays ordered as `factors`; text is kept per verbosity.
+	hashes (component hashes for incremental re-evaluation) are kept at every
+	level. as_dict() rebuilds the JSONL record layout.
+	"""
+
+	product_1: str
+	product_2: str
+	gold: int
+	pred: int
+	factors: Tuple[str, ...]
+	factor_scores: array
+	weights: array
+	spsc_proximity: Optional[float] = None
+	groups: Optional[Dict[str, str]] = None
+	cascade: Optional[Dict[str, object]] = None
+	hashes: Optional[Dict[str, object]] = None
+	# Self-consistency sampling: per-factor confidence/spread (NaN = not sampled) and the judge's confidence
+	factor_confidence: Optional[array] = None
+	factor_spread: Optional[array] = None
+	confidence: Optional[float] = None
+	# Model routing: tier ("small" | "large") that produced each factor score
+	factor_tiers: Optional[Tuple[str, ...]] = None
+	contexts: Optional[Tuple[str, ...]] = None
+	reasoning: Optional[Tuple[str, ...]] = None
+	analyzer: Optional[str] = None
+	full: bool = False
+
+	@classmethod
+	def build(
+		cls,
+		product_1: str,
+		product_2: str,
+		*,
+		gold: Optional[int],
+		pred: int,
+		factor_outputs: Dict[str, Dict[str, object]],
+		judged: Dict[str, object],
+		contexts: Sequence[str],
+		analyzer: str = "",
+		spsc_proximity: Optional[float] = None,
+		groups: Optional[Dict[str, str]] = None,
+		cascade: Optional[Dict[str, object]] = None,
+		hashes: Optional[Dict[str, object]] = None,
+		verbosity: str = "full",
+	) -> "EvalRecord":
+		level = verbosity_level(verbosity)
+		factors = tuple(factor_outputs)
+		weights = judged.get("weights") or {}
+		conf = spread = None
+		if any("confidence" in factor_outputs[f] for f in factors):
+			conf = array("d", (_float_or_nan(factor_outputs[f].get("confidence")) for f in factors))
+			spread = array("d", (_float_or_nan(factor_outputs[f].get("spread")) for f in factors))
+		tiers = None
+		if any("tier" in factor_outputs[f] for f in factors):
+			tiers = tuple(str(factor_outputs[f].get("tier") or "") for f in factors)
+		reasoning = None
+		if level >= 1:
+			reasoning = tuple(str(factor_outputs[f].get("reasoning_text") or "") for f in factors)
+		return cls(
+			product_1=product_1,
+			product_2=product_2,
+			gold=_MISSING if gold is None else int(gold),
+			pred=int(pred),
+			factors=factors,
+			factor_scores=_pack(factor_outputs[f].get("score") for f in factors),
+			weights=array("d", (float(weights.get(f, 0.0)) for f in factors)),  # type: ignore[union-attr]
+			spsc_proximity=spsc_proximity,
+			groups=groups or None,
+			cascade=cascade,
+			hashes=hashes,
+			factor_confidence=conf,
+			factor_spread=spread,
+			confidence=judged.get("confidence"),  # type: ignore[arg-type]
+			factor_tiers=tiers,
+			contexts=tuple(contexts) if level >= 1 else None,
+			reasoning=reasoning,
+			analyzer=analyzer if level >= 2 else None,
+			full=level >= 2,
+		)
+
+	@property
+	def gold_overall(self) -> Optional[int]:
+		return _unpack(self.gold)
+
+	def as_dict(self) -> Dict[str, object]:
+		factors: Dict[str, Dict[str, object]] = {}
+		details: Dict[str, Dict[str, object]] = {}
+		for i, f in enumerate(self.factors):
+			score = _unpack(self.factor_scores[i])
+			entry: Dict[str, object] = {"factor": f}
+			detail: Dict[str, object] = {"weight": self.weights[i], "score": score}
+			if self.reasoning is not None:
+				entry["reasoning_text"] = self.reasoning[i]
+				if self.full:
+					# raw_output duplicates reasoning_text; only the full layout keeps both
+					entry["raw_output"] = self.reasoning[i]
+					detail["text"] = self.reasoning[i]
+			entry["score"] = score
+			if self.factor_confidence is not None and self.factor_confidence[i] == self.factor_confidence[i]:
+				entry["confidence"] = self.factor_confidence[i]
+				entry["spread"] = self.factor_spread[i] if self.factor_spread[i] == self.factor_spread[i] else None  # type: ignore[index]
+				detail["confidence"] = self.factor_confidence[i]
+			if self.factor_tiers is not None:
+				entry["tier"] = self.factor_tiers[i]
+			factors[f] = entry
+			details[f] = detail
+
+		out: Dict[str, object] = {"product_1": self.product_1, "product_2": self.product_2}
+		if self.contexts is not None:
+			out["contexts"] = list(self.contexts)
+		if self.analyzer is not None:
+			out["analyzer"] = self.analyzer
+		out["factors"] = factors
+		out["judge"] = {
+			"overall_similarity": self.pred,
+			"weights": dict(zip(self.factors, self.weights)),
+			"details": details,
+		}
+		if self.confidence is not None:
+			out["judge"]["confidence"] = self.confidence  # type: ignore[index]
+		out["gold_overall"] = self.gold_overall
+		out["pred_overall"] = self.pred
+		out["spsc_proximity"] = self.spsc_proximity
+		if self.cascade is not None:
+			out["cascade"] = self.cascade
+		if self.hashes is not None:
+			out["hashes"] = self.hashes
+		if self.groups:
+			out.update(self.groups)
+		return out
+
+
+def records_as_dicts(records: Iterable[object]) -> List[Dict[str, object]]:
+	return [r.as_dict() for r in records]  # type: ignore[attr-defined]
@@ -0,0 +1,71 @@
+import heapq
+import json
+import os
+from typing import Dict, Iterable, Iterator, Optional
+
+
+class JsonlWriter:
+	"""
+	Append result rows to a JSON Lines file, one object per line.
+	Rows are written as they are produced so long runs never hold all results.
+	"""
+
+	def __init__(self, path: str, *, append: bool = False) -> None:
+		self.path = path
+		parent = os.path.dirname(os.path.abspath(path))
+		os.makedirs(parent, exist_ok=True)
+		self._f = open(path, "a" if append else "w", encoding="utf-8")
+		self.count = 0
+
+	def write(self, row: Dict[str, object]) -> None:
+		self._f.write(json.dumps(row, ensure_ascii=False))
+		self._f.write("\n")
+		self.count += 1
+
+	def flush(self) -> None:
+		self._f.flush()
+
+	def close(self) -> None:
+		if not self._f.closed:
+			self._f.close()
+
+	def __enter__(self) -> "JsonlWriter":
+		return self
+
+	def __exit__(self, *exc: object) -> None:
+		self.close()
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, object]]:
+	"""
+	Yield rows from a JSON Lines file, skipping blank lines.
+	"""
+	with open(path, "r", encoding="utf-8") as f:
+		for line in f:
+			line = line.strip()
+			if line:
+				yield json.loads(line)
+
+
+def write_jsonl(path: str, rows: Iterable[Dict[str, object]]) -> int:
+	"""
+	Write all rows to path and return the number written.
+	"""
+	with JsonlWriter(path) as w:
+		for row in rows:
+			w.write(row)
+		return w.count
+
+
+def merge_jsonl(paths: Iterable[str], out_path: str, *, sort_key: Optional[str] = None) -> int:
+	"""
+	Concatenate several JSONL files into out_path.
+	If sort_key is given (e.g. "row_index"), each input must already be sorted by it
+	and rows are k-way merged in streaming fashion.
+	"""
+	iters = [iter_jsonl(p) for p in paths]
+	if sort_key is None:
+		merged: Iterable[Dict[str, object]] = (row for it in iters for row in it)
+	else:
+		merged = heapq.merge(*iters, key=lambda r: r.get(sort_key, 0))  # type: ignore[arg-type, return-value]
+	return write_jsonl(out_path, merged)
@@ -1,7 +1,10 @@
 import json
 import os
-import re
-from typing import List, Optional, Iterable
+from typing import List, Optional, Iterable, Tuple
+
+from .artifacts import file_signature
+from .cache import DataCache
+from .term_index import TermIndex
 
 
 PACKAGE_DIR = os.path.dirname(__file__)
@@ -17,14 +20,45 @@ def _load_nice_chunks() -> list:
 		return json.load(f)
 
 
-_NICE_CHUNKS_CACHE: Optional[list] = None
+def _nice_signature() -> Optional[Tuple[int, int]]:
+	return file_signature(NICE_PATH)
+
+
+# Loaded once per process (single flight under concurrent first use)
+NICE_CACHE: DataCache[list] = DataCache("nice_chunks", _load_nice_chunks, signature=_nice_signature)
 
 
 def _get_nice_chunks_cached() -> list:
-	global _NICE_CHUNKS_CACHE
-	if _NICE_CHUNKS_CACHE is None:
-		_NICE_CHUNKS_CACHE = _load_nice_chunks()
-	return _NICE_CHUNKS_CACHE
+	return NICE_CACHE.get()
+
+
+def reload_nice_if_changed() -> bool:
+	"""
+	Hot-reload data/nice_chunks.json if it changed on disk since it was loaded.
+	The new list is swapped in with a single assignment, so concurrent readers
+	see either the old or the new data. Returns True if a reload happened.
+	"""
+	return NICE_CACHE.reload_if_changed()
+
+
+def _nice_blob(entry: dict) -> str:
+	return (
+		entry.get("heading", "")
+		+ "\n"
+		+ entry.get("explanatory_note", "")
+		+ "\n"
+		+ "\n".join([it.get("Goods and Service", "") for it in entry.get("items", [])])
+	).lower()
+
+
+NICE_INDEX = NICE_CACHE.derive("nice_index", lambda chunks: TermIndex([_nice_blob(e) for e in chunks]))
+
+
+def _get_nice_index() -> Tuple[list, TermIndex]:
+	"""
+	Term index over the currently loaded NICE chunks; rebuilt when they are reloaded.
+	"""
+	return NICE_INDEX.get_with_source()
 
 
 def retrieve_contexts(product_1: str, product_2: str, top_k: int = 3) -> List[str]:
@@ -32,40 +66,26 @@ def retrieve_contexts(product_1: str, product_2: str, top_k: int = 3) -> List[st
 	Keyword-based retriever over NICE data using local JSON.
 	Returns top_k short context strings.
 	"""
-	terms = set(
-		[t for t in re.findall(r"[A-Za-z]+", (product_1 + " " + product_2).lower()) if len(t) > 3]
-	)
+	chunks, index = _get_nice_index()
+	terms, top = index.top(product_1, product_2, top_k)
 
-	scored: list[tuple[int, str]] = []
-	for entry in _get_nice_chunks_cached():
+	contexts: List[str] = []
+	for _, i in top:
+		entry = chunks[i]
 		heading = entry.get("heading", "")
-		note = entry.get("explanatory_note", "")
 		items = entry.get("items", [])
 		class_no = entry.get("class_number", "?")
-
-		blob = (
-			heading
-			+ "\n"
-			+ note
-			+ "\n"
-			+ "\n".join([it.get("Goods and Service", "") for it in items])
-		).lower()
-		score = sum(blob.count(term) for term in terms)
-
-		if score > 0:
-			matched_items = [
-				it.get("Goods and Service", "")
-				for it in items
-				if any(term in it.get("Goods and Service", "").lower() for term in terms)
-			]
-			snippet_items = "; ".join(matched_items[:3])
-			context = f"Class {class_no}: {heading}"
-			if snippet_items:
-				context += f"\nExamples: {snippet_items}"
-			scored.append((score, context))
-
-	scored.sort(key=lambda x: x[0], reverse=True)
-	return [ctx for _, ctx in scored[:top_k]]
+		matched_items = [
+			it.get("Goods and Service", "")
+			for it in items
+			if any(term in it.get("Goods and Service", "").lower() for term in terms)
+		]
+		snippet_items = "; ".join(matched_items[:3])
+		context = f"Class {class_no}: {heading}"
+		if snippet_items:
+			context += f"\nExamples: {snippet_items}"
+		contexts.append(context)
+	return contexts
 
 
 
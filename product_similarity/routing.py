@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .agents import FactorAgent
+
+
+# Where the small tier's confidence comes from:
+# - "agreement": share of samples agreeing with the aggregated score (small config samples > 1)
+# - "logprob": probability of the score token (small config score_logprobs, chat API)
+CONFIDENCE_SOURCES = ("agreement", "logprob")
+TIERS = ("small", "large")
+
+
+def needs_escalation(result: Dict[str, Any], threshold: float) -> bool:
+	"""
+	True when a small-tier result is not trustworthy: no parsed score, no
+	confidence reported, or confidence below threshold.
+	"""
+	conf = result.get("confidence")
+	return result.get("score") is None or not isinstance(conf, (int, float)) or float(conf) < threshold
+
+
+class RoutedFactorAgent:
+	"""
+	Two-tier factor scoring. The small (cheap) agent scores every factor
+	first; only factors whose confidence is below `threshold` are re-scored
+	by the large agent. Drop-in for FactorAgent in evaluate_multiple_factors.
+
+	Results carry "tier" plus the small tier's score/confidence when the
+	large tier answered. stats() reports calls and seconds per tier.
+	"""
+
+	def __init__(self, small: FactorAgent, large: FactorAgent, *, threshold: float = 0.6) -> None:
+		self.small = small
+		self.large = large
+		self.threshold = float(threshold)
+		self._lock = threading.Lock()
+		self._calls = {t: 0 for t in TIERS}
+		self._seconds = {t: 0.0 for t in TIERS}
+		self._factors = 0
+
+	def _timed(self, tier: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+		t0 = time.perf_counter()
+		try:
+			return fn()
+		finally:
+			with self._lock:
+				self._calls[tier] += 1
+				self._seconds[tier] += time.perf_counter() - t0
+
+	def evaluate(
+		self,
+		factor_name: str,
+		product_1: str,
+		product_2: str,
+		context: Optional[str] = None,
+		on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+	) -> Dict[str, Any]:
+		with self._lock:
+			self._factors += 1
+		first = self._timed("small", lambda: self.small.evaluate(factor_name, product_1, product_2, context))
+		if not needs_escalation(first, self.threshold):
+			return {**first, "tier": "small"}
+		final = self._timed("large", lambda: self.large.evaluate(factor_name, product_1, product_2, context, on_update))
+		return {**final, "tier": "large", "small_score": first.get("score"), "small_confidence": first.get("confidence")}
+
+	def stats(self) -> Dict[str, object]:
+		with self._lock:
+			return {
+				"threshold": self.threshold,
+				"factors": self._factors,
+				"escalated": self._calls["large"],
+				"escalation_rate": round(self._calls["large"] / self._factors, 4) if self._factors else None,
+				"tiers": {t: {"calls": self._calls[t], "seconds": round(self._seconds[t], 3)} for t in TIERS},
+			}
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("request_priority", default="interactive")
+
+
+@contextlib.contextmanager
+def request_priority(priority: str) -> Iterator[None]:
+	"""
+	Set the scheduling priority ("interactive" or "bulk") for chat calls made
+	in this context, e.g. `with request_priority("bulk"): evaluate_rows(...)`.
+	"""
+	if priority not in PRIORITIES:
+		raise ValueError(f"Unknown priority {priority!r}; expected one of {', '.join(PRIORITIES)}")
+	token = _PRIORITY.set(priority)
+	try:
+		yield
+	finally:
+		_PRIORITY.reset(token)
+
+
+def current_priority() -> str:
+	return _PRIORITY.get()
+
+
+class RateLimitExceeded(RuntimeError):
+	"""Raised when a request is still rate limited after all retries."""
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+	# openai.RateLimitError and httpx-style errors both expose status_code
+	if getattr(exc, "status_code", None) == 429:
+		return True
+	response = getattr(exc, "response", None)
+	return getattr(response, "status_code", None) == 429
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+	headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+	try:
+		value = headers.get("retry-after")
+		return float(value) if value is not None else None
+	except (TypeError, ValueError):
+		return None
+
+
+class TokenBucket:
+	"""
+	Continuous-refill token bucket: `rate_per_minute` units per minute with a
+	burst of `burst_seconds` worth of refill. Not thread-safe on its own; the
+	scheduler calls it under its lock.
+	"""
+
+	def __init__(self, rate_per_minute: float, *, burst_seconds: float = 1.0) -> None:
+		self.rate = float(rate_per_minute) / 60.0
+		self.capacity = max(self.rate * float(burst_seconds), 1.0)
+		self.tokens = self.capacity
+		self._last = time.monotonic()
+
+	def _refill(self, now: float) -> None:
+		self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+		self._last = now
+
+	def wait_time(self, amount: float, now: float) -> float:
+		"""Seconds until `amount` units are available (0 if available now)."""
+		self._refill(now)
+		# Requests larger than the burst are admitted once the bucket is full
+		need = min(float(amount), self.capacity)
+		if self.tokens >= need:
+			return 0.0
+		return (need - self.tokens) / self.rate
+
+	def take(self, amount: float) -> None:
+		self.tokens -= float(amount)
+
+
+def _wake(fut: "asyncio.Future[None]") -> None:
+	if not fut.done():
+		fut.set_result(None)
+
+
+class RequestScheduler:
+	"""
+	Client-side admission control for rate-limited chat APIs.
+
+	- Token buckets cap requests/min (rpm) and tokens/min (tpm; prompt estimate
+	  plus max_tokens, as providers count it at admission).
+	- AIMD concurrency: the in-flight limit grows by ~1 per `limit` successes
+	  and is multiplied by `decrease` on a 429 (or when latency exceeds
+	  target_latency); a 429 also pauses all admissions for Retry-After.
+	- Waiting requests are admitted by priority (interactive before bulk), FIFO within one.
+	Rate-limited calls are retried with backoff up to max_retries times.
+	"""
+
+	def __init__(
+		self,
+		*,
+		rpm: Optional[float] = None,
+		tpm: Optional[float] = None,
+		max_concurrency: int = 8,
+		min_concurrency: int = 1,
+		initial_concurrency: Optional[int] = None,
+		target_latency: Optional[float] = None,
+		decrease: float = 0.5,
+		max_retries: int = 6,
+		base_backoff: float = 0.5,
+		burst_seconds: float = 1.0,
+	) -> None:
+		self._requests = TokenBucket(rpm, burst_seconds=burst_seconds) if rpm else None
+		self._tokens = TokenBucket(tpm, burst_seconds=burst_seconds) if tpm else None
+		self.max_concurrency = max(int(max_concurrency), 1)
+		self.min_concurrency = max(min(int(min_concurrency), self.max_concurrency), 1)
+		start = initial_concurrency if initial_concurrency is not None else self.max_concurrency
+		self.limit = float(max(min(int(start), self.max_concurrency), self.min_concurrency))
+		self.target_latency = target_latency
+		self.decrease = float(decrease)
+		self.max_retries = max(int(max_retries), 0)
+		self.base_backoff = float(base_backoff)
+
+		self._cond = threading.Condition()
+		self._waiting: List[Tuple[int, int]] = []  # heap of (priority, seq)
+		# Async waiters in the heap: entry -> (loop, future set on the next state change)
+		self._wakers: Dict[Tuple[int, int], Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = {}
+		self._seq = itertools.count()
+		self._in_flight = 0
+		self._paused_until = 0.0
+		self._last_decrease = 0.0
+		self.stats: Dict[str, Any] = {
+			"admitted": {p: 0 for p in PRIORITIES},
+			"completed": 0,
+			"rate_limited": 0,
+			"retries": 0,
+			"failed": 0,
+			"max_in_flight": 0,
+			"queue_wait_seconds": {p: 0.0 for p in PRIORITIES},
+		}
+
+	# ---- admission ----
+
+	def _admission_delay(self, tokens: float, now: float) -> float:
+		delay = max(self._paused_until - now, 0.0)
+		if self._requests is not None:
+			delay = max(delay, self._requests.wait_time(1, now))
+		if self._tokens is not None:
+			delay = max(delay, self._tokens.wait_time(tokens, now))
+		return delay
+
+	def _notify(self) -> None:
+		# Called under the lock after any state change: wakes sync and async waiters
+		self._cond.notify_all()
+		for loop, fut in self._wakers.values():
+			try:
+				loop.call_soon_threadsafe(_wake, fut)
+			except RuntimeError:  # loop already closed
+				pass
+
+	def _wait_delay(self, entry: Tuple[int, int], tokens: float) -> Optional[float]:
+		"""Under the lock: 0 if entry can be admitted now, seconds to wait, or None (wait for a change)."""
+		if self._waiting[0] != entry or self._in_flight >= int(self.limit):
+			return None
+		return self._admission_delay(tokens, time.monotonic())
+
+	def _admit(self, entry: Tuple[int, int], priority: str, tokens: float, t0: float) -> None:
+		heapq.heappop(self._waiting)
+		if self._requests is not None:
+			self._requests.take(1)
+		if self._tokens is not None:
+			self._tokens.take(tokens)
+		self._in_flight += 1
+		self.stats["admitted"][priority] += 1
+		self.stats["queue_wait_seconds"][priority] += time.monotonic() - t0
+		self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+		# The next waiter may be admissible too
+		self._notify()
+
+	def _leave(self, entry: Tuple[int, int]) -> None:
+		self._wakers.pop(entry, None)
+		self._waiting.remove(entry)
+		heapq.heapify(self._waiting)
+		self._notify()
+
+	def _acquire(self, priority: str, tokens: float) -> None:
+		entry = (PRIORITIES[priority], next(self._seq))
+		t0 = time.monotonic()
+		with self._cond:
+			heapq.heappush(self._waiting, entry)
+			try:
+				while True:
+					delay = self._wait_delay(entry, tokens)
+					if delay is not None and delay <= 0:
+						break
+					self._cond.wait(delay)
+			except BaseException:
+				self._leave(entry)
+				raise
+			self._admit(entry, priority, tokens, t0)
+
+	async def _aacquire(self, priority: str, tokens: float) -> None:
+		"""
+		Async counterpart of _acquire: the task waits in the same priority heap
+		on a future woken by state changes, so no thread is parked per waiter
+		and cancelling the task simply leaves the queue.
+		"""
+		loop = asyncio.get_running_loop()
+		entry = (PRIORITIES[priority], next(self._seq))
+		t0 = time.monotonic()
+		with self._cond:
+			heapq.heappush(self._waiting, entry)
+		try:
+			while True:
+				with self._cond:
+					self._wakers.pop(entry, None)
+					delay = self._wait_delay(entry, tokens)
+					if delay is not None and delay <= 0:
+						self._admit(entry, priority, tokens, t0)
+						return
+					wake: "asyncio.Future[None]" = loop.create_future()
+					self._wakers[entry] = (loop, wake)
+				try:
+					await asyncio.wait_for(wake, delay)
+				except asyncio.TimeoutError:
+					pass
+		except BaseException:
+			with self._cond:
+				self._leave(entry)
+			raise
+
+	def _release(self, *, latency: Optional[float], rate_limited: bool, retry_after: Optional[float]) -> None:
+		with self._cond:
+			self._in_flight -= 1
+			now = time.monotonic()
+			if rate_limited:
+				self.stats["rate_limited"] += 1
+				self._paused_until = max(self._paused_until, now + (retry_after or self.base_backoff))
+				self._multiplicative_decrease(now)
+			elif latency is not None:
+				self.stats["completed"] += 1
+				if self.target_latency is not None and latency > self.target_latency:
+					self._multiplicative_decrease(now)
+				else:
+					# Additive increase: about +1 after `limit` successful requests
+					self.limit = min(self.limit + 1.0 / max(self.limit, 1.0), float(self.max_concurrency))
+			self._notify()
+
+	def _multiplicative_decrease(self, now: float) -> None:
+		# Many in-flight requests fail together; cut once per in-flight generation
+		if now - self._last_decrease < 0.05:
+			return
+		self._last_decrease = now
+		self.limit = max(self.limit * self.decrease, float(self.min_concurrency))
+
+	def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+		delay = self.base_backoff * (2 ** attempt)
+		if retry_after is not None:
+			delay = max(delay, retry_after)
+		return delay * (0.5 + random.random() * 0.5)
+
+	# ---- public API ----
+
+	def call(self, fn: Callable[[], T], *, priority: Optional[str] = None, tokens: float = 0.0) -> T:
+		"""
+		Run fn() once admitted; retry it on rate-limit errors.
+		"""
+		priority = priority or current_priority()
+		for attempt in range(self.max_retries + 1):
+			self._acquire(priority, tokens)
+			t0 = time.monotonic()
+			try:
+				result = fn()
+			except BaseException as exc:
+				if not is_rate_limit_error(exc):
+					self._release(latency=None, rate_limited=False, retry_after=None)
+					raise
+				retry_after = retry_after_seconds(exc)
+				self._release(latency=None, rate_limited=True, retry_after=retry_after)
+				if attempt >= self.max_retries:
+					with self._cond:
+						self.stats["failed"] += 1
+					raise RateLimitExceeded(f"Still rate limited after {self.max_retries} retries") from exc
+				with self._cond:
+					self.stats["retries"] += 1
+				time.sleep(self._backoff(attempt, retry_after))
+				continue
+			self._release(latency=time.monotonic() - t0, rate_limited=False, retry_after=None)
+			return result
+		raise AssertionError("unreachable")
+
+	async def acall(self, fn: Callable[[], Awaitable[T]], *, priority: Optional[str] = None, tokens: float = 0.0) -> T:
+		"""
+		Async variant of call(); waits for admission on the event loop (no
+		thread per waiter), and cancelling the task while it waits leaves no
+		slot behind.
+		"""
+		priority = priority or current_priority()
+		for attempt in range(self.max_retries + 1):
+			await self._aacquire(priority, tokens)
+			t0 = time.monotonic()
+			try:
+				result = await fn()
+			except BaseException as exc:
+				if not is_rate_limit_error(exc):
+					self._release(latency=None, rate_limited=False, retry_after=None)
+					raise
+				retry_after = retry_after_seconds(exc)
+				self._release(latency=None, rate_limited=True, retry_after=retry_after)
+				if attempt >= self.max_retries:
+					with self._cond:
+						self.stats["failed"] += 1
+					raise RateLimitExceeded(f"Still rate limited after {self.max_retries} retries") from exc
+				with self._cond:
+					self.stats["retries"] += 1
+				await asyncio.sleep(self._backoff(attempt, retry_after))
+				continue
+			self._release(latency=time.monotonic() - t0, rate_limited=False, retry_after=None)
+			return result
+		raise AssertionError("unreachable")
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._cond:
+			return {
+				**{k: (dict(v) if isinstance(v, dict) else v) for k, v in self.stats.items()},
+				"concurrency_limit": round(self.limit, 2),
+				"in_flight": self._in_flight,
+				"queued": len(self._waiting),
+			}
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+	"""
+	Rough request size for tpm accounting: ~4 characters per prompt token plus the completion budget.
+	"""
+	return len(prompt) // 4 + int(max_tokens)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import bootstrap_ci, confusion_matrix, metrics_from_confusion, paired_difference
+
+
+STOP_METRICS = ("accuracy", "mse")
+
+
+def wilson_interval(successes: int, n: int, *, alpha: float = 0.05) -> Tuple[float, float]:
+	"""
+	Wilson score interval for a proportion; unlike a percentile bootstrap it
+	keeps a positive width when every outcome so far is the same.
+	"""
+	if n <= 0:
+		return 0.0, 1.0
+	z = NormalDist().inv_cdf(1 - alpha / 2)
+	p = successes / n
+	center = (p + z * z / (2 * n)) / (1 + z * z / n)
+	half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+	return float(max(center - half, 0.0)), float(min(center + half, 1.0))
+
+
+def paired_accuracy_interval(wins: int, losses: int, n: int, *, alpha: float = 0.05) -> Tuple[float, float]:
+	"""
+	Agresti-Min interval for the difference of two paired proportions from
+	the discordant counts (wins: only pred correct, losses: only baseline
+	correct); adding 0.5 to every cell keeps it from collapsing to [0, 0].
+	"""
+	z = NormalDist().inv_cdf(1 - alpha / 2)
+	b, c, m = wins + 0.5, losses + 0.5, n + 2.0
+	diff = (b - c) / m
+	se = np.sqrt(max((b + c) - (b - c) ** 2 / m, 0.0)) / m
+	return float(max(diff - z * se, -1.0)), float(min(diff + z * se, 1.0))
+
+
+def stratified_order(strata: Sequence[object], *, seed: Optional[int] = 0) -> List[int]:
+	"""
+	Row indices in a random order whose every prefix keeps the strata close
+	to their overall proportions: within a stratum of size n, the j-th row of
+	a random permutation gets the key (j + u) / n (u uniform per stratum) and
+	rows are visited by increasing key.
+	"""
+	rng = np.random.default_rng(seed)
+	labels = np.asarray([str(s) for s in strata])
+	keys = np.zeros(len(labels), dtype=np.float64)
+	for label in np.unique(labels):
+		idx = np.flatnonzero(labels == label)
+		keys[rng.permutation(idx)] = (np.arange(len(idx)) + rng.random()) / len(idx)
+	# Ties between strata at the same key are broken randomly, not by label
+	return [int(i) for i in np.lexsort((rng.random(len(keys)), keys))]
+
+
+@dataclass
+class SequentialConfig:
+	# Metric whose interval decides when to stop ("accuracy" = exact match, or "mse")
+	metric: str = "accuracy"
+	# Stop once the interval (of the metric, or of the paired difference) is at most this wide
+	max_width: float = 0.1
+	min_rows: int = 30  # never stop before this many labeled rows
+	check_every: int = 10  # rows between interval updates
+	n_boot: int = 500
+	alpha: float = 0.05
+	seed: int = 0
+
+
+class SequentialMonitor:
+	"""
+	Tracks predictions while rows are evaluated in stratified order and
+	decides when the estimate is precise enough to stop.
+
+	Without a baseline it stops when the interval of config.metric is at
+	most max_width wide. With baseline predictions (by row index, e.g. from
+	an earlier results file) it tracks the paired difference to the baseline
+	and stops when that interval excludes 0 ("decided") or is at most
+	max_width wide ("precision"). update() returns True to stop.
+
+	Accuracy uses Wilson (paired: Agresti-Min) intervals, MSE a percentile
+	bootstrap. A "precision" stop is refused while the per-row outcomes (or
+	differences) all have one value: an agreeing prefix says nothing yet
+	about the spread of the rest.
+	"""
+
+	def __init__(self, config: Optional[SequentialConfig] = None, *, baseline: Optional[np.ndarray] = None) -> None:
+		self.config = config or SequentialConfig()
+		if self.config.metric not in STOP_METRICS:
+			raise ValueError(f"Unknown metric {self.config.metric!r}; expected one of {', '.join(STOP_METRICS)}")
+		self.baseline = baseline
+		self._pred = array("b")
+		self._gold = array("b")
+		self._base = array("b")
+		self.checks: List[Dict[str, object]] = []
+		self.reason: Optional[str] = None
+
+	def update(self, row_index: int, pred: int, gold: int) -> bool:
+		self._pred.append(pred)
+		self._gold.append(gold)
+		if self.baseline is not None:
+			self._base.append(int(self.baseline[row_index]) if 0 <= row_index < len(self.baseline) else -1)
+		n = len(self._pred)
+		cfg = self.config
+		if n < cfg.min_rows or (n - cfg.min_rows) % max(cfg.check_every, 1):
+			return False
+		check = self.check()
+		self.checks.append(check)
+		width = check["width"]
+		if isinstance(width, float) and width <= cfg.max_width and not check["degenerate"]:
+			self.reason = "precision"
+		elif check.get("decided"):
+			self.reason = "decided"
+		return self.reason is not None
+
+	def check(self) -> Dict[str, object]:
+		"""Point estimates and intervals over the rows seen so far."""
+		cfg = self.config
+		pred, gold = np.asarray(self._pred, dtype=np.int64), np.asarray(self._gold, dtype=np.int64)
+		cm = confusion_matrix(pred, gold)
+		point = metrics_from_confusion(cm)
+		ci = bootstrap_ci(cm, n_boot=cfg.n_boot, alpha=cfg.alpha, seed=cfg.seed)
+		ok = (pred >= 0) & (gold >= 0)
+		correct = pred[ok] == gold[ok]
+		out: Dict[str, object] = {
+			"rows": len(self._pred),
+			"accuracy": point["accuracy"],
+			"accuracy_ci": list(wilson_interval(int(correct.sum()), int(correct.size), alpha=cfg.alpha)) if correct.size else None,
+			"mse": point["mse"],
+			"mse_ci": ci.get("mse"),
+		}
+		lo, hi = (out[f"{cfg.metric}_ci"] or [None, None])  # type: ignore[misc]
+		values = correct.astype(np.int64) if cfg.metric == "accuracy" else (pred[ok] - gold[ok]) ** 2
+		if self.baseline is not None:
+			base = np.asarray(self._base, dtype=np.int64)
+			paired = paired_difference(pred, base, gold, metric=cfg.metric, n_boot=cfg.n_boot, alpha=cfg.alpha, seed=cfg.seed)
+			both = (pred >= 0) & (base >= 0) & (gold >= 0)
+			p, b, g = pred[both], base[both], gold[both]
+			if cfg.metric == "accuracy":
+				values = (p == g).astype(np.int64) - (b == g)
+				if values.size:
+					paired["ci"] = list(paired_accuracy_interval(int((values > 0).sum()), int((values < 0).sum()), int(values.size), alpha=cfg.alpha))
+					paired["ci_method"] = "agresti-min"
+			else:
+				values = (p - g) ** 2 - (b - g) ** 2
+			out["paired"] = paired
+			lo, hi = paired["ci"]  # type: ignore[misc]
+			out["decided"] = lo is not None and (lo > 0 or hi < 0)
+		out["degenerate"] = bool(values.size == 0 or np.ptp(values) == 0)
+		out["width"] = round(hi - lo, 6) if lo is not None and hi is not None else None
+		return out
+
+	def summary(self, total: int) -> Dict[str, object]:
+		return {
+			"metric": self.config.metric,
+			"max_width": self.config.max_width,
+			"rows": len(self._pred),
+			"total": total,
+			"fraction": round(len(self._pred) / total, 4) if total else None,
+			"stopped": self.reason or "exhausted",
+			"final": self.check() if len(self._pred) else None,
+			"checks": self.checks,
+		}
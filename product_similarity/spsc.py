@@ -1,13 +1,18 @@
 import json
 import os
-import re
 from typing import Dict, List, Optional, Tuple
 
+from .artifacts import content_hash, file_signature
+from .cache import DataCache
+from .term_index import TermIndex
+
 
 # Resolve project-relative paths
 PACKAGE_DIR = os.path.dirname(__file__)
 PROJECT_ROOT = os.path.dirname(PACKAGE_DIR)
 SPSC_PATH = os.path.join(PROJECT_ROOT, "spsc_data", "spsc_data", "spsc_tree.json")
+# Optional flattened node table written by `cli.py build-tree --flat-output`
+SPSC_FLAT_PATH = os.path.join(PROJECT_ROOT, "spsc_data", "spsc_data", "spsc_flat.jsonl")
 
 
 def _load_spsc_tree() -> Dict:
@@ -20,12 +25,32 @@ def _load_spsc_tree() -> Dict:
 		return json.load(f)
 
 
-_SPSC_FLAT_CACHE: Optional[List[Dict[str, str]]] = None
+def _load_spsc_flat_table() -> List[Dict[str, str]]:
+	"""
+	Load the prebuilt flattened node table (JSON Lines), skipping tree flattening.
+	"""
+	flat: List[Dict[str, str]] = []
+	with open(SPSC_FLAT_PATH, "r", encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				flat.append(json.loads(line))
+	return flat
+
+
+def _use_flat_table() -> bool:
+	# Prefer the flat table when it is at least as new as the tree it was built with
+	flat_sig = file_signature(SPSC_FLAT_PATH)
+	if flat_sig is None:
+		return False
+	tree_sig = file_signature(SPSC_PATH)
+	return tree_sig is None or flat_sig[0] >= tree_sig[0]
+
 
 
 def _flatten_nodes(node: Dict, path_titles: List[str], path_codes: List[str], out: List[Dict[str, str]]) -> None:
-	title = str(node.get("title", "")).strip()
-	code = str(node.get("code", "")).strip()
+	# Placeholder nodes (referenced parents missing from the sheet) carry null title/code
+	title = str(node.get("title") or "").strip()
+	code = str(node.get("code") or "").strip()
 
 	cur_titles = path_titles + ([title] if title else [])
 	cur_codes = path_codes + ([code] if code else [])
@@ -45,40 +70,96 @@ def _flatten_nodes(node: Dict, path_titles: List[str], path_codes: List[str], ou
 		_flatten_nodes(child, cur_titles, cur_codes, out)
 
 
-def _get_spsc_flat_cached() -> List[Dict[str, str]]:
-	global _SPSC_FLAT_CACHE
-	if _SPSC_FLAT_CACHE is not None:
-		return _SPSC_FLAT_CACHE
-	data = _load_spsc_tree()
+# Flattened nodes per top-level subtree, keyed by the subtree's content hash.
+# On reload only subtrees whose hash changed are flattened again.
+_SPSC_SUBTREES: Dict[str, List[Dict[str, str]]] = {}
+SPSC_LAST_BUILD: Dict[str, int] = {}
+
+
+def _flatten_tree_incremental(data: Dict) -> List[Dict[str, str]]:
+	global _SPSC_SUBTREES
+	fresh: Dict[str, List[Dict[str, str]]] = {}
+	reused = 0
 	flat: List[Dict[str, str]] = []
 	for root in data.get("roots", []) or []:
-		_flatten_nodes(root, [], [], flat)
-	_SPSC_FLAT_CACHE = flat
+		# The root node itself, then each child subtree under the root's path
+		_flatten_nodes({k: v for k, v in root.items() if k != "children"}, [], [], flat)
+		root_title = str(root.get("title") or "").strip()
+		root_code = str(root.get("code") or "").strip()
+		prefix_titles = [root_title] if root_title else []
+		prefix_codes = [root_code] if root_code else []
+		for child in root.get("children", []) or []:
+			key = content_hash([prefix_titles, prefix_codes, child])
+			nodes = _SPSC_SUBTREES.get(key)
+			if nodes is None:
+				nodes = []
+				_flatten_nodes(child, prefix_titles, prefix_codes, nodes)
+			else:
+				reused += 1
+			fresh[key] = nodes
+			flat.extend(nodes)
+	_SPSC_SUBTREES = fresh
+	SPSC_LAST_BUILD.update({"subtrees": len(fresh), "reused": reused, "nodes": len(flat)})
 	return flat
 
 
+def _spsc_source() -> str:
+	return SPSC_FLAT_PATH if _use_flat_table() else SPSC_PATH
+
+
+def _spsc_signature() -> Optional[Tuple[str, Tuple[int, int]]]:
+	# Switching between tree and flat table counts as a change too
+	source = _spsc_source()
+	sig = file_signature(source)
+	return None if sig is None else (source, sig)
+
+
+def _load_spsc_flat() -> List[Dict[str, str]]:
+	if _spsc_source() == SPSC_FLAT_PATH:
+		return _load_spsc_flat_table()
+	# Only called under SPSC_CACHE's lock, so the subtree memo is never rebuilt concurrently
+	return _flatten_tree_incremental(_load_spsc_tree())
+
+
+SPSC_CACHE: DataCache[List[Dict[str, str]]] = DataCache("spsc_flat", _load_spsc_flat, signature=_spsc_signature)
+
+
+def _get_spsc_flat_cached() -> List[Dict[str, str]]:
+	return SPSC_CACHE.get()
+
+
+def reload_spsc_if_changed() -> bool:
+	"""
+	Hot-reload SPSC nodes if the tree JSON (or flat table) changed on disk since
+	it was loaded. When rebuilt from the tree, unchanged subtrees keep their
+	flattened nodes; the new flat list is swapped in atomically.
+	Returns True if a reload happened.
+	"""
+	return SPSC_CACHE.reload_if_changed()
+
+
+def _spsc_term_index(flat: List[Dict[str, str]]) -> TermIndex:
+	return TermIndex([(n.get("title", "") + " " + n.get("path_title", "")).lower() for n in flat])
+
+
+SPSC_INDEX = SPSC_CACHE.derive("spsc_index", _spsc_term_index)
+
+
+def _get_spsc_index() -> Tuple[List[Dict[str, str]], TermIndex]:
+	"""
+	Term index over the currently loaded SPSC nodes; rebuilt when they are reloaded.
+	"""
+	return SPSC_INDEX.get_with_source()
+
+
 def retrieve_spsc_contexts(product_1: str, product_2: str, *, top_k: int = 2) -> List[str]:
 	"""
 	Lightweight keyword-based matching from product descriptions to SPSC nodes.
 	Returns short context strings to be appended to the LLM prompt.
 	"""
-	text = f"{product_1} {product_2}".lower()
-	terms = set([t for t in re.findall(r"[a-z]+", text) if len(t) > 3])
-	if not terms:
-		return []
-
-	scored: List[Tuple[int, Dict[str, str]]] = []
-	for n in _get_spsc_flat_cached():
-		blob = (n.get("title", "") + " " + n.get("path_title", "")).lower()
-		score = sum(blob.count(term) for term in terms)
-		if score > 0:
-			scored.append((score, n))
-
-	if not scored:
-		return []
-
-	scored.sort(key=lambda x: x[0], reverse=True)
-	top = [n for _, n in scored[:max(int(top_k), 0)]]
+	flat, index = _get_spsc_index()
+	_, ranked = index.top(product_1, product_2, top_k)
+	top = [flat[i] for _, i in ranked]
 
 	contexts: List[str] = []
 	for n in top:
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .spsc import SPSC_CACHE, _get_spsc_index
+
+
+class SpscHierarchy:
+	"""
+	SPSC tree rebuilt from the flattened node table's path codes, with an
+	Euler tour + sparse table for O(1) lowest-common-ancestor queries.
+
+	Node 0 is a virtual root above the segments, so depth(node) is the number
+	of codes on its path and depth(lca(u, v)) is the length of the shared
+	path prefix. Path prefixes without their own row become virtual nodes.
+	"""
+
+	def __init__(self, flat: Sequence[Dict[str, str]]) -> None:
+		ids: Dict[Tuple[str, ...], int] = {(): 0}
+		parent: List[int] = [-1]
+		depth: List[int] = [0]
+		codes: List[str] = [""]
+		node_of_flat = np.zeros(len(flat), dtype=np.int32)
+		for i, n in enumerate(flat):
+			path = tuple(p for p in (n.get("path_code") or "").split(" > ") if p)
+			node = ids.get(path)
+			if node is None:
+				# Create any missing ancestors, shallowest first
+				for d in range(1, len(path) + 1):
+					prefix = path[:d]
+					if prefix not in ids:
+						ids[prefix] = len(parent)
+						parent.append(ids[prefix[:-1]])
+						depth.append(d)
+						codes.append(prefix[-1])
+				node = ids[path]
+			node_of_flat[i] = node
+
+		self.parent = np.asarray(parent, dtype=np.int32)
+		self.depth = np.asarray(depth, dtype=np.int32)
+		self.codes = codes
+		self.node_of_flat = node_of_flat
+		self._build_lca()
+
+	def __len__(self) -> int:
+		return len(self.parent)
+
+	def _build_lca(self) -> None:
+		n = len(self.parent)
+		children: List[List[int]] = [[] for _ in range(n)]
+		for v in range(1, n):
+			children[int(self.parent[v])].append(v)
+
+		# Iterative DFS: record a node on entry and again after each child returns
+		euler: List[int] = []
+		first = np.zeros(n, dtype=np.int64)
+		stack: List[Tuple[int, int]] = [(0, 0)]
+		while stack:
+			v, ci = stack.pop()
+			if ci == 0:
+				first[v] = len(euler)
+			euler.append(v)
+			if ci < len(children[v]):
+				stack.append((v, ci + 1))
+				stack.append((children[v][ci], 0))
+
+		tour = np.asarray(euler, dtype=np.int32)
+		tour_depth = self.depth[tour]
+		# table[k][i] = position in the tour of the shallowest node in [i, i + 2^k)
+		table = [np.arange(len(tour), dtype=np.int32)]
+		k = 1
+		while (1 << k) <= len(tour):
+			prev = table[-1]
+			half = 1 << (k - 1)
+			a, b = prev[:-half], prev[half:]
+			table.append(np.where(tour_depth[a] <= tour_depth[b], a, b).astype(np.int32))
+			k += 1
+		self._tour = tour
+		self._tour_depth = tour_depth
+		self._first = first
+		self._table = table
+
+	def lca_many(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+		"""Vectorized LCA for arrays of node ids."""
+		fu = self._first[np.asarray(u)]
+		fv = self._first[np.asarray(v)]
+		lo = np.minimum(fu, fv)
+		hi = np.maximum(fu, fv)
+		length = hi - lo + 1
+		k = np.floor(np.log2(length)).astype(np.int64)
+		out = np.empty(len(lo), dtype=np.int32)
+		# Group by level so each lookup is one fancy index into a single table row
+		for level in np.unique(k):
+			mask = k == level
+			row = self._table[int(level)]
+			a = row[lo[mask]]
+			b = row[hi[mask] - (1 << int(level)) + 1]
+			out[mask] = self._tour[np.where(self._tour_depth[a] <= self._tour_depth[b], a, b)]
+		return out
+
+	def lca(self, u: int, v: int) -> int:
+		return int(self.lca_many(np.asarray([u]), np.asarray([v]))[0])
+
+	def distance_many(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+		"""Number of edges between nodes."""
+		w = self.lca_many(u, v)
+		return self.depth[u] + self.depth[v] - 2 * self.depth[w]
+
+	def ancestor_at(self, nodes: np.ndarray, depth: int) -> np.ndarray:
+		"""Ancestor of each node at the given depth (nodes shallower than that are returned as is)."""
+		out = np.asarray(nodes, dtype=np.int32).copy()
+		while True:
+			deep = self.depth[out] > depth
+			if not deep.any():
+				return out
+			out[deep] = self.parent[out[deep]]
+
+	def proximity_many(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+		"""
+		Shared-path fraction depth(lca) / max(depth(u), depth(v)) in [0, 1]:
+		1 for the same node, 0 for different segments.
+		"""
+		u = np.asarray(u)
+		v = np.asarray(v)
+		w = self.lca_many(u, v)
+		deepest = np.maximum(self.depth[u], self.depth[v])
+		return np.where(deepest > 0, self.depth[w] / np.maximum(deepest, 1), 0.0)
+
+
+SPSC_HIERARCHY = SPSC_CACHE.derive("spsc_hierarchy", SpscHierarchy)
+
+
+def get_spsc_hierarchy() -> SpscHierarchy:
+	"""
+	Hierarchy over the currently loaded SPSC nodes; rebuilt when they are reloaded.
+	"""
+	return SPSC_HIERARCHY.get()
+
+
+def product_nodes(product: str, top: int = 3) -> np.ndarray:
+	"""
+	Hierarchy node ids of a product's top keyword-matched SPSC entries.
+	"""
+	hierarchy = get_spsc_hierarchy()
+	_, index = _get_spsc_index()
+	ranked = index.product_top(product, top)
+	return hierarchy.node_of_flat[ranked] if ranked else np.zeros(0, dtype=np.int32)
+
+
+def spsc_proximity(product_1: str, product_2: str, *, top: int = 3) -> float:
+	"""
+	Best hierarchy proximity between the two products' top SPSC matches (0 if either has none).
+	"""
+	a = product_nodes(product_1, top)
+	b = product_nodes(product_2, top)
+	if not len(a) or not len(b):
+		return 0.0
+	u = np.repeat(a, len(b))
+	v = np.tile(b, len(a))
+	return float(get_spsc_hierarchy().proximity_many(u, v).max())
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Union
+
+
+DEFAULT_RESPONSE = "Reasoning: Both items are stub products of the same kind.\nScore: 2"
+
+# A canned response source: fixed text, a list cycled in order, or a callable prompt -> text
+Responses = Union[str, Sequence[str], Callable[[str], str]]
+
+
+class StubChatServer:
+	"""
+	Local OpenAI-compatible /v1/chat/completions server for offline testing.
+
+	Serves canned responses after a configurable latency so throughput and
+	concurrency of the chat path can be load-tested without a provider.
+
+	Example:
+		with StubChatServer(latency=0.05) as srv:
+			chat = ChatAPIWrapper(base_url=srv.base_url, api_key="stub", model="stub")
+			chat.run("hello")
+	"""
+
+	def __init__(
+		self,
+		*,
+		host: str = "127.0.0.1",
+		port: int = 0,
+		latency: float = 0.0,
+		jitter: float = 0.0,
+		responses: Optional[Responses] = None,
+		reasoning: Optional[str] = None,
+		token_latency: float = 0.0,
+		rate_limit: Optional[int] = None,
+		rate_window: float = 60.0,
+		max_concurrent: Optional[int] = None,
+		token_logprob: Union[float, Callable[[str], float]] = -0.05,
+	) -> None:
+		self.latency = max(float(latency), 0.0)
+		self.jitter = max(float(jitter), 0.0)
+		self.reasoning = reasoning
+		# Delay between streamed chunks ("stream": true requests)
+		self.token_latency = max(float(token_latency), 0.0)
+		# Provider-style throttling: at most rate_limit requests per rate_window
+		# seconds (sliding window) and max_concurrent in flight; excess gets 429
+		self.rate_limit = rate_limit
+		self.rate_window = float(rate_window)
+		self.max_concurrent = max_concurrent
+		# Logprob reported per content token when a request asks for "logprobs"
+		self.token_logprob = token_logprob
+		self._admitted: Deque[float] = deque()
+		self._responder = self._make_responder(responses)
+		self._lock = threading.Lock()
+		self._in_flight = 0
+		self.stats: Dict[str, int] = {
+			"requests": 0,
+			"max_in_flight": 0,
+			"completion_tokens": 0,
+			"streams": 0,
+			"streams_closed_by_client": 0,
+			"throttled": 0,
+		}
+		self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+		self._httpd.daemon_threads = True
+		self._thread: Optional[threading.Thread] = None
+
+	@staticmethod
+	def _make_responder(responses: Optional[Responses]) -> Callable[[str], str]:
+		if responses is None:
+			return lambda _prompt: DEFAULT_RESPONSE
+		if callable(responses):
+			return responses
+		if isinstance(responses, str):
+			text = responses
+			return lambda _prompt: text
+		cycle = itertools.cycle(list(responses) or [DEFAULT_RESPONSE])
+		cycle_lock = threading.Lock()
+
+		def _next(_prompt: str) -> str:
+			with cycle_lock:
+				return next(cycle)
+		return _next
+
+	@property
+	def base_url(self) -> str:
+		host, port = self._httpd.server_address[:2]
+		return f"http://{host}:{port}/v1"
+
+	def _completion(self, body: Dict[str, object]) -> Dict[str, object]:
+		messages = body.get("messages") or []
+		prompt = ""
+		if isinstance(messages, list) and messages:
+			prompt = str((messages[-1] or {}).get("content", ""))
+		n = max(int(body.get("n") or 1), 1)  # type: ignore[arg-type]
+		choices: List[Dict[str, object]] = []
+		for i in range(n):
+			message: Dict[str, object] = {"role": "assistant", "content": self._responder(prompt)}
+			if self.reasoning:
+				message["reasoning_content"] = self.reasoning
+			choice: Dict[str, object] = {"index": i, "message": message, "finish_reason": "stop"}
+			if body.get("logprobs"):
+				choice["logprobs"] = {"content": [
+					{"token": tok, "logprob": self._logprob(tok), "bytes": list(tok.encode("utf-8")), "top_logprobs": []}
+					for tok in self._tokens(str(message["content"]))
+				]}
+			choices.append(choice)
+		completion_tokens = sum(len(str(c["message"]["content"]).split()) for c in choices)  # type: ignore[index]
+		with self._lock:
+			self.stats["completion_tokens"] += completion_tokens
+		return {
+			"id": f"stub-{self.stats['requests']}",
+			"object": "chat.completion",
+			"created": int(time.time()),
+			"model": str(body.get("model", "stub")),
+			"choices": choices,
+			"usage": {
+				"prompt_tokens": len(prompt.split()),
+				"completion_tokens": completion_tokens,
+				"total_tokens": len(prompt.split()) + completion_tokens,
+			},
+		}
+
+	def _logprob(self, token: str) -> float:
+		return float(self.token_logprob(token) if callable(self.token_logprob) else self.token_logprob)
+
+	def _throttle(self) -> Optional[float]:
+		"""
+		Admit a request (returns None) or return the Retry-After seconds. Call under _lock.
+		"""
+		now = time.monotonic()
+		if self.max_concurrent is not None and self._in_flight >= self.max_concurrent:
+			return max(self.latency, 0.1)
+		if self.rate_limit is not None:
+			while self._admitted and now - self._admitted[0] >= self.rate_window:
+				self._admitted.popleft()
+			if len(self._admitted) >= self.rate_limit:
+				return max(self.rate_window - (now - self._admitted[0]), 0.01)
+			self._admitted.append(now)
+		return None
+
+	@staticmethod
+	def _tokens(text: str) -> List[str]:
+		# Word-sized deltas that concatenate back to the original text
+		return re.findall(r"\S+\s*|\s+", text)
+
+	def _stream_chunks(self, completion: Dict[str, object]) -> Iterator[Dict[str, object]]:
+		"""
+		Re-emit a completion as chat.completion.chunk objects (reasoning first, then content).
+		"""
+		base = {k: completion[k] for k in ("id", "created", "model")}
+		choice = completion["choices"][0]  # type: ignore[index]
+		message = choice["message"]  # type: ignore[index]
+
+		def chunk(delta: Dict[str, object], finish: Optional[str] = None) -> Dict[str, object]:
+			return {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+		yield chunk({"role": "assistant", "content": ""})
+		for tok in self._tokens(str(message.get("reasoning_content") or "")):
+			yield chunk({"reasoning_content": tok})
+		for tok in self._tokens(str(message.get("content") or "")):
+			yield chunk({"content": tok})
+		yield chunk({}, "stop")
+
+	def _make_handler(self) -> type:
+		server = self
+
+		class _Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - silence default logging
+				return
+
+			def _send_json(self, status: int, payload: Dict[str, object], headers: Optional[Dict[str, str]] = None) -> None:
+				data = json.dumps(payload).encode("utf-8")
+				self.send_response(status)
+				for name, value in (headers or {}).items():
+					self.send_header(name, value)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(data)))
+				self.end_headers()
+				self.wfile.write(data)
+
+			def _send_stream(self, completion: Dict[str, object]) -> None:
+				# Server-sent events; the connection is closed at the end instead of chunked encoding
+				self.send_response(200)
+				self.send_header("Content-Type", "text/event-stream")
+				self.send_header("Cache-Control", "no-cache")
+				self.send_header("Connection", "close")
+				self.end_headers()
+				self.close_connection = True
+				with server._lock:
+					server.stats["streams"] += 1
+				try:
+					for i, chunk in enumerate(server._stream_chunks(completion)):
+						if i and server.token_latency:
+							time.sleep(server.token_latency)
+						self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+						self.wfile.flush()
+					self.wfile.write(b"data: [DONE]\n\n")
+					self.wfile.flush()
+				except (BrokenPipeError, ConnectionResetError):
+					with server._lock:
+						server.stats["streams_closed_by_client"] += 1
+
+			def do_POST(self) -> None:  # noqa: N802 - http.server naming
+				length = int(self.headers.get("Content-Length") or 0)
+				raw = self.rfile.read(length) if length else b"{}"
+				if not self.path.rstrip("/").endswith("/chat/completions"):
+					self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+					return
+				try:
+					body = json.loads(raw or b"{}")
+				except ValueError:
+					self._send_json(400, {"error": {"message": "invalid JSON body"}})
+					return
+
+				with server._lock:
+					server.stats["requests"] += 1
+					retry_after = server._throttle()
+					if retry_after is not None:
+						server.stats["throttled"] += 1
+				if retry_after is not None:
+					self._send_json(
+						429,
+						{"error": {"message": "Rate limit exceeded", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+						headers={"Retry-After": f"{retry_after:.2f}"},
+					)
+					return
+				with server._lock:
+					server._in_flight += 1
+					server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server._in_flight)
+				try:
+					delay = server.latency + (random.uniform(0.0, server.jitter) if server.jitter else 0.0)
+					if delay > 0:
+						time.sleep(delay)
+					completion = server._completion(body)
+					if body.get("stream"):
+						self._send_stream(completion)
+					else:
+						# Same total generation time as the streamed variant
+						if server.token_latency:
+							time.sleep(server.token_latency * (sum(1 for _ in server._stream_chunks(completion)) - 1))
+						self._send_json(200, completion)
+				finally:
+					with server._lock:
+						server._in_flight -= 1
+
+		return _Handler
+
+	def start(self) -> "StubChatServer":
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+			self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		if self._thread is not None:
+			self._httpd.shutdown()
+			self._thread.join()
+			self._thread = None
+		self._httpd.server_close()
+
+	def __enter__(self) -> "StubChatServer":
+		return self.start()
+
+	def __exit__(self, *exc: object) -> None:
+		self.stop()
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub chat server")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8000)
+	parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+	parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency in [0, jitter] seconds")
+	parser.add_argument("--response", action="append", default=None, help="Canned response (repeat to cycle)")
+	parser.add_argument("--reasoning", default=None, help="reasoning_content returned with every response")
+	parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed chunks")
+	parser.add_argument("--rate-limit", type=int, default=None, help="Max requests per --rate-window seconds before 429")
+	parser.add_argument("--rate-window", type=float, default=60.0)
+	parser.add_argument("--max-concurrent", type=int, default=None, help="Max in-flight requests before 429")
+	args = parser.parse_args()
+
+	srv = StubChatServer(
+		host=args.host,
+		port=args.port,
+		latency=args.latency,
+		jitter=args.jitter,
+		responses=args.response,
+		reasoning=args.reasoning,
+		token_latency=args.token_latency,
+		rate_limit=args.rate_limit,
+		rate_window=args.rate_window,
+		max_concurrent=args.max_concurrent,
+	)
+	print(f"Stub chat server listening on {srv.base_url}")
+	try:
+		srv._httpd.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		srv._httpd.server_close()
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cascade import _jaccard, class_overlap, spsc_overlap
+from .columnar import column_names, is_columnar, read_columns
+from .judge import JudgeConfig, LLMJudge
+from .metrics import NUM_LEVELS
+from .results_io import iter_jsonl
+from .term_index import extract_terms, normalize_product
+
+
+# Cheap pair features the surrogate is trained on (all in [0, 1])
+SURROGATE_FEATURES = (
+	"class_overlap",  # Jaccard of the top NICE classes
+	"top_class_match",  # same best NICE class
+	"nice_signal",  # both products matched something in NICE
+	"spsc_overlap",  # SPSC path proximity of the top nodes
+	"term_jaccard",
+	"term_containment",  # shared terms / terms of the shorter product
+	"trigram_jaccard",  # character 3-grams of the normalized texts
+	"length_ratio",  # shorter / longer term count
+	"identical",  # same normalized description
+)
+
+
+def _trigrams(text: str) -> set:
+	t = f" {text} "
+	return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def pair_hashes(pairs: Iterable[Tuple[str, str]]) -> np.ndarray:
+	"""
+	64-bit keys of product pairs (normalized text, order-insensitive), used to
+	recognize the pairs a surrogate was trained on.
+	"""
+	keys = []
+	for a, b in pairs:
+		text = "\x1f".join(sorted((normalize_product(a), normalize_product(b))))
+		keys.append(int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little"))
+	return np.asarray(keys, dtype=np.uint64)
+
+
+def pair_features(product_1: str, product_2: str, *, include_spsc: bool = True, nice_top: int = 3, spsc_top: int = 3) -> np.ndarray:
+	"""
+	SURROGATE_FEATURES of one pair (retrieval only, no model call).
+	"""
+	cls, c1, c2 = class_overlap(product_1, product_2, top=nice_top)
+	spsc = 0.0
+	if include_spsc:
+		try:
+			spsc = spsc_overlap(product_1, product_2, top=spsc_top)
+		except FileNotFoundError:
+			spsc = 0.0
+	t1, t2 = extract_terms(product_1), extract_terms(product_2)
+	n1, n2 = normalize_product(product_1), normalize_product(product_2)
+	shorter = min(len(t1), len(t2))
+	return np.asarray([
+		cls,
+		float(bool(c1 and c2 and c1[0] == c2[0])),
+		float(bool(c1 and c2)),
+		spsc,
+		_jaccard(t1, t2),
+		len(t1 & t2) / shorter if shorter else 0.0,
+		_jaccard(_trigrams(n1), _trigrams(n2)),
+		shorter / max(len(t1), len(t2)) if shorter else 0.0,
+		float(bool(n1) and n1 == n2),
+	], dtype=np.float64)
+
+
+def features_matrix(pairs: Iterable[Tuple[str, str]], *, include_spsc: bool = True) -> np.ndarray:
+	"""(N, len(SURROGATE_FEATURES)) features of many pairs."""
+	rows = [pair_features(p1, p2, include_spsc=include_spsc) for p1, p2 in pairs]
+	return np.vstack(rows) if rows else np.zeros((0, len(SURROGATE_FEATURES)))
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+	z = z - z.max(axis=-1, keepdims=True)
+	e = np.exp(z)
+	return e / e.sum(axis=-1, keepdims=True)
+
+
+class SurrogateModel:
+	"""
+	Per-factor multinomial logistic regression (scores 0..4) over
+	SURROGATE_FEATURES, distilled from stored LLM factor scores.
+
+	Plain numpy: features are standardized, weights fit by full-batch
+	gradient descent with L2. confidence is the probability of the predicted
+	score, so it can drive the LLM fallback like any other agent confidence.
+	"""
+
+	def __init__(
+		self,
+		factors: Sequence[str],
+		coef: np.ndarray,
+		mean: np.ndarray,
+		std: np.ndarray,
+		*,
+		include_spsc: bool = True,
+		meta: Optional[Dict[str, object]] = None,
+		trained_pairs: Optional[np.ndarray] = None,
+	) -> None:
+		self.factors = tuple(factors)
+		self.coef = np.asarray(coef, dtype=np.float64)  # (factors, features + 1, levels)
+		self.mean = np.asarray(mean, dtype=np.float64)
+		self.std = np.asarray(std, dtype=np.float64)
+		self.include_spsc = bool(include_spsc)
+		self.meta = dict(meta or {})
+		# pair_hashes() of the training pairs; None for models saved without them
+		self.trained_pairs = None if trained_pairs is None else np.unique(np.asarray(trained_pairs, dtype=np.uint64))
+
+	@classmethod
+	def fit(
+		cls,
+		X: np.ndarray,
+		targets: Mapping[str, np.ndarray],
+		*,
+		l2: float = 1e-3,
+		iterations: int = 500,
+		learning_rate: float = 0.5,
+		include_spsc: bool = True,
+	) -> "SurrogateModel":
+		"""
+		Fit one softmax regression per factor. targets[f] holds the LLM score
+		of each row of X (-1 where the factor has no score).
+		"""
+		X = np.asarray(X, dtype=np.float64)
+		mean = X.mean(axis=0) if len(X) else np.zeros(X.shape[1])
+		std = X.std(axis=0) if len(X) else np.ones(X.shape[1])
+		std = np.where(std > 1e-9, std, 1.0)
+		Z = np.hstack([(X - mean) / std, np.ones((len(X), 1))])
+		factors = list(targets)
+		coef = np.zeros((len(factors), Z.shape[1], NUM_LEVELS))
+		for i, f in enumerate(factors):
+			y = np.asarray(targets[f], dtype=np.int64)
+			keep = (y >= 0) & (y < NUM_LEVELS)
+			if not keep.any():
+				continue
+			Zf, Y = Z[keep], np.eye(NUM_LEVELS)[y[keep]]
+			W = coef[i]
+			for _ in range(int(iterations)):
+				grad = Zf.T @ (_softmax(Zf @ W) - Y) / len(Zf)
+				grad[:-1] += l2 * W[:-1]  # bias row is not regularized
+				W -= learning_rate * grad
+		return cls(factors, coef, mean, std, include_spsc=include_spsc)
+
+	def judge(self) -> LLMJudge:
+		"""The judge of the runs the model was distilled from (meta "judge_weights", else the default)."""
+		weights = self.meta.get("judge_weights")
+		return LLMJudge(JudgeConfig(weights=dict(weights) if isinstance(weights, dict) else None))
+
+	def seen(self, pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+		"""(N,) True for pairs the model was trained on (all False if not recorded)."""
+		if self.trained_pairs is None or not len(pairs):
+			return np.zeros(len(pairs), dtype=bool)
+		return np.isin(pair_hashes(pairs), self.trained_pairs)
+
+	def predict_proba(self, X: np.ndarray) -> np.ndarray:
+		"""(N, factors, levels) score probabilities."""
+		X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+		Z = np.hstack([(X - self.mean) / self.std, np.ones((len(X), 1))])
+		return _softmax(np.einsum("nd,fdk->nfk", Z, self.coef))
+
+	def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+		"""(scores, confidence), both (N, factors)."""
+		proba = self.predict_proba(X)
+		return proba.argmax(axis=-1), proba.max(axis=-1)
+
+	def save(self, path: str) -> None:
+		"""Write the model as .npz (temp file + os.replace)."""
+		directory = os.path.dirname(os.path.abspath(path))
+		os.makedirs(directory, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".npz", dir=directory)
+		meta = {"factors": list(self.factors), "features": list(SURROGATE_FEATURES), "include_spsc": self.include_spsc, **self.meta}
+		try:
+			with os.fdopen(fd, "wb") as f:
+				arrays = {"coef": self.coef, "mean": self.mean, "std": self.std, "meta": np.asarray(json.dumps(meta, ensure_ascii=False))}
+				if self.trained_pairs is not None:
+					arrays["trained_pairs"] = self.trained_pairs
+				np.savez(f, **arrays)
+			os.replace(tmp_path, path)
+		except BaseException:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			raise
+
+	@classmethod
+	def load(cls, path: str) -> "SurrogateModel":
+		with np.load(path, allow_pickle=False) as data:
+			meta = json.loads(str(data["meta"]))
+			coef, mean, std = data["coef"], data["mean"], data["std"]
+			trained_pairs = data["trained_pairs"] if "trained_pairs" in data.files else None
+		if meta.get("features") != list(SURROGATE_FEATURES):
+			raise ValueError(f"{path} was trained on different features: {meta.get('features')}")
+		factors = meta.pop("factors")
+		include_spsc = meta.pop("include_spsc", True)
+		meta.pop("features", None)
+		return cls(factors, coef, mean, std, include_spsc=include_spsc, meta=meta, trained_pairs=trained_pairs)
+
+
+def training_data(results_path: str, factors: Sequence[str]) -> Tuple[List[Tuple[str, str]], Dict[str, np.ndarray], np.ndarray]:
+	"""
+	Pairs, per-factor LLM scores (-1 = missing) and gold labels (-1 = none)
+	from a results JSONL or columnar file (with product text columns).
+	Cascade-resolved rows carry no factor scores and are skipped; scores
+	answered by a routing small tier (possibly a surrogate) count as
+	missing, so only large-model judgments are distilled.
+	"""
+	if is_columnar(results_path):
+		return _columnar_training_data(results_path, factors)
+	pairs: List[Tuple[str, str]] = []
+	scores: Dict[str, List[int]] = {f: [] for f in factors}
+	gold: List[int] = []
+	for row in iter_jsonl(results_path):
+		outputs = row.get("factors") or {}
+		if not isinstance(outputs, dict) or not outputs:
+			continue
+		pairs.append((str(row.get("product_1", "")), str(row.get("product_2", ""))))
+		for f in factors:
+			entry = outputs.get(f) or {}
+			s = entry.get("score")
+			scores[f].append(int(s) if isinstance(s, int) and entry.get("tier") != "small" else -1)
+		g = row.get("gold_overall")
+		gold.append(int(g) if isinstance(g, int) else -1)
+	return pairs, {f: np.asarray(v, dtype=np.int8) for f, v in scores.items()}, np.asarray(gold, dtype=np.int8)
+
+
+def _columnar_training_data(path: str, factors: Sequence[str]) -> Tuple[List[Tuple[str, str]], Dict[str, np.ndarray], np.ndarray]:
+	present = set(column_names(path))
+	wanted = ["product_1", "product_2", "gold"] + [c for f in factors for c in (f"factor:{f}", f"tier:{f}")]
+	cols = read_columns(path, [c for c in wanted if c in present])
+	if "product_1" not in cols or "product_2" not in cols:
+		raise ValueError(f"{path} has no product text columns (written with text=False?)")
+	n = len(cols["gold"])
+	raw = {f: np.asarray(cols.get(f"factor:{f}", np.full(n, np.nan)), dtype=np.float64) for f in factors}
+	# Cascade-resolved rows have no factor score at all
+	keep = np.zeros(n, dtype=bool)
+	scores: Dict[str, np.ndarray] = {}
+	for f, s in raw.items():
+		scored = ~np.isnan(s)
+		keep |= scored
+		if f"tier:{f}" in cols:
+			scored &= cols[f"tier:{f}"] != "small"
+		scores[f] = np.where(scored, np.nan_to_num(s), -1).astype(np.int8)
+	pairs = [(str(a or ""), str(b or "")) for a, b, k in zip(cols["product_1"], cols["product_2"], keep) if k]
+	return pairs, {f: v[keep] for f, v in scores.items()}, np.asarray(cols["gold"], dtype=np.int8)[keep]
+
+
+def train_surrogate(
+	results_paths: Sequence[str],
+	factors: Sequence[str],
+	*,
+	include_spsc: bool = True,
+	holdout: float = 0.2,
+	seed: int = 0,
+	judge_weights: Optional[Mapping[str, float]] = None,
+	**fit_opts: Any,
+) -> Tuple[SurrogateModel, Dict[str, object]]:
+	"""
+	Distil the factor scores stored in results JSONL files into a SurrogateModel.
+	A random `holdout` share of pairs is kept out of fitting to report how
+	often the surrogate reproduces the LLM score on unseen pairs; the returned
+	model is then refit on all pairs, whose pair_hashes() it keeps so reports
+	can leave them out. judge_weights are stored with the model for bulk scoring.
+	"""
+	pairs: List[Tuple[str, str]] = []
+	targets: Dict[str, List[np.ndarray]] = {f: [] for f in factors}
+	for path in results_paths:
+		p, t, _ = training_data(path, factors)
+		pairs += p
+		for f in factors:
+			targets[f].append(t[f])
+	y = {f: np.concatenate(v) if v else np.zeros(0, dtype=np.int8) for f, v in targets.items()}
+	if not pairs:
+		raise ValueError("No rows with factor scores in " + ", ".join(results_paths))
+	X = features_matrix(pairs, include_spsc=include_spsc)
+
+	report: Dict[str, object] = {"rows": len(pairs), "features": list(SURROGATE_FEATURES)}
+	test = np.random.default_rng(seed).random(len(pairs)) < holdout
+	if 0 < test.sum() < len(pairs):
+		model = SurrogateModel.fit(X[~test], {f: v[~test] for f, v in y.items()}, include_spsc=include_spsc, **fit_opts)
+		pred, conf = model.predict(X[test])
+		per_factor: Dict[str, object] = {}
+		for i, f in enumerate(model.factors):
+			labeled = y[f][test] >= 0
+			per_factor[f] = {
+				"rows": int(labeled.sum()),
+				"agreement": round(float((pred[labeled, i] == y[f][test][labeled]).mean()), 4) if labeled.any() else None,
+				"mean_confidence": round(float(conf[labeled, i].mean()), 4) if labeled.any() else None,
+			}
+		report["holdout"] = {"rows": int(test.sum()), "factors": per_factor}
+
+	model = SurrogateModel.fit(X, y, include_spsc=include_spsc, **fit_opts)
+	model.meta.update({"rows": len(pairs), "trained_on": [os.path.basename(p) for p in results_paths]})
+	model.trained_pairs = np.unique(pair_hashes(pairs))
+	if judge_weights is not None:
+		model.meta["judge_weights"] = {f: float(w) for f, w in judge_weights.items()}
+	return model, report
+
+
+class SurrogateAgent:
+	"""
+	FactorAgent stand-in backed by a SurrogateModel. All factors of a pair
+	are predicted together and kept in a small LRU, so scoring the factors
+	one by one computes the pair's features once. Results carry the score's
+	probability as "confidence" (use as the small tier of a RoutedFactorAgent
+	to fall back to the LLM below a threshold).
+	"""
+
+	def __init__(self, model: SurrogateModel, *, cache_size: int = 4096) -> None:
+		self.model = model
+		self._cache: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+		self._cache_size = int(cache_size)
+		self._lock = threading.Lock()
+
+	@classmethod
+	def load(cls, path: str, **kwargs: Any) -> "SurrogateAgent":
+		return cls(SurrogateModel.load(path), **kwargs)
+
+	def _predict_pair(self, product_1: str, product_2: str) -> Tuple[np.ndarray, np.ndarray]:
+		key = (product_1, product_2)
+		with self._lock:
+			hit = self._cache.get(key)
+			if hit is not None:
+				self._cache.move_to_end(key)
+				return hit
+		scores, conf = self.model.predict(pair_features(product_1, product_2, include_spsc=self.model.include_spsc))
+		out = (scores[0], conf[0])
+		with self._lock:
+			self._cache[key] = out
+			if len(self._cache) > self._cache_size:
+				self._cache.popitem(last=False)
+		return out
+
+	def evaluate(
+		self,
+		factor_name: str,
+		product_1: str,
+		product_2: str,
+		context: Optional[str] = None,
+		on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+	) -> Dict[str, Optional[object]]:
+		if factor_name not in self.model.factors:
+			return {"factor": factor_name, "reasoning_text": "", "raw_output": "", "score": None, "confidence": 0.0}
+		scores, conf = self._predict_pair(product_1, product_2)
+		i = self.model.factors.index(factor_name)
+		return {
+			"factor": factor_name,
+			"reasoning_text": "",
+			"raw_output": "",
+			"score": int(scores[i]),
+			"confidence": round(float(conf[i]), 4),
+		}
+
+
+def score_pairs(
+	model: SurrogateModel,
+	pairs: Sequence[Tuple[str, str]],
+	judge: Optional[LLMJudge] = None,
+	*,
+	batch_size: int = 4096,
+) -> Dict[str, np.ndarray]:
+	"""
+	Bulk surrogate scoring: factor scores and confidences (N, factors) and
+	the judge's overall score (N,) via LLMJudge.combine_batch, in batches.
+	judge defaults to model.judge().
+	"""
+	judge = judge or model.judge()
+	n, k = len(pairs), len(model.factors)
+	scores = np.zeros((n, k), dtype=np.int8)
+	conf = np.zeros((n, k), dtype=np.float32)
+	for start in range(0, n, batch_size):
+		X = features_matrix(pairs[start:start + batch_size], include_spsc=model.include_spsc)
+		s, c = model.predict(X)
+		scores[start:start + len(X)] = s
+		conf[start:start + len(X)] = c
+	overall = judge.combine_batch(scores, model.factors, confidence=conf) if n else np.zeros(0, dtype=np.int64)
+	return {"scores": scores, "confidence": conf, "overall": overall.astype(np.int8)}
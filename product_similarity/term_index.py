@@ -0,0 +1,190 @@
+import heapq
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Generic, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_TERM_RE = re.compile(r"[a-z]+")
+
+
+class LRUCache(Generic[K, V]):
+	"""
+	Small thread-safe LRU map. get_or_compute() runs `compute` outside the lock,
+	so two threads may occasionally compute the same value; the result is identical.
+	"""
+
+	def __init__(self, maxsize: int) -> None:
+		self.maxsize = max(int(maxsize), 0)
+		self._data: "OrderedDict[K, V]" = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+	def get_or_compute(self, key: K, compute: Callable[[K], V]) -> V:
+		with self._lock:
+			if key in self._data:
+				self._data.move_to_end(key)
+				self.hits += 1
+				return self._data[key]
+			self.misses += 1
+		value = compute(key)
+		if self.maxsize:
+			with self._lock:
+				self._data[key] = value
+				self._data.move_to_end(key)
+				while len(self._data) > self.maxsize:
+					self._data.popitem(last=False)
+		return value
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+			self.hits = self.misses = 0
+
+
+def normalize_product(text: str) -> str:
+	"""Cache key for a product description: lower-cased, whitespace collapsed."""
+	return " ".join(str(text or "").lower().split())
+
+
+def extract_terms(text: str, min_len: int = 4) -> FrozenSet[str]:
+	"""Alphabetic terms of at least min_len characters from lower-cased text."""
+	return frozenset(t for t in _TERM_RE.findall(str(text or "").lower()) if len(t) >= min_len)
+
+
+class TermIndex:
+	"""
+	Keyword match scores over a fixed list of lower-cased text blobs.
+
+	The score of blob i for a term set T is sum(blob_i.count(t) for t in T).
+	Per-term count vectors and per-product vectors are sparse dicts
+	{blob index: count} memoized in bounded LRUs, so a product that appears in
+	many pairs is matched against the blobs once; a pair's vector is the merge
+	of both product vectors minus the terms they share.
+	"""
+
+	def __init__(self, blobs: Sequence[str], *, max_terms: int = 8192, max_products: int = 2048) -> None:
+		self.blobs = list(blobs)
+		self._terms: LRUCache[str, Dict[int, int]] = LRUCache(max_terms)
+		self._products: LRUCache[str, Tuple[FrozenSet[str], Dict[int, int]]] = LRUCache(max_products)
+		self._words: Optional[Tuple[str, np.ndarray, List[Tuple[np.ndarray, np.ndarray]]]] = None
+		self._words_lock = threading.Lock()
+
+	def term_vector(self, term: str) -> Dict[int, int]:
+		return self._terms.get_or_compute(term, self._scan_term)
+
+	def _word_index(self) -> Tuple[str, np.ndarray, List[Tuple[np.ndarray, np.ndarray]]]:
+		"""
+		Distinct letter runs of all blobs, joined by NUL, with their start
+		offsets and (blob indices, occurrence counts) per run. Built on first use.
+		"""
+		words = self._words
+		if words is not None:
+			return words
+		with self._words_lock:
+			if self._words is not None:
+				return self._words
+			postings: Dict[str, Dict[int, int]] = {}
+			for i, blob in enumerate(self.blobs):
+				for w in _TERM_RE.findall(blob):
+					per_blob = postings.setdefault(w, {})
+					per_blob[i] = per_blob.get(i, 0) + 1
+			vocab = list(postings)
+			starts = np.cumsum([0] + [len(w) + 1 for w in vocab[:-1]], dtype=np.int64)
+			arrays = [
+				(np.fromiter(p.keys(), dtype=np.int64, count=len(p)), np.fromiter(p.values(), dtype=np.int64, count=len(p)))
+				for p in (postings[w] for w in vocab)
+			]
+			words = self._words = ("\0".join(vocab), starts, arrays)
+			return words
+
+	def _scan_term(self, term: str) -> Dict[int, int]:
+		if not term or _TERM_RE.fullmatch(term) is None:
+			out: Dict[int, int] = {}
+			for i, blob in enumerate(self.blobs):
+				if term in blob:
+					out[i] = blob.count(term)
+			return out
+		# A letters-only term can only occur inside a run of letters, so
+		# blob.count(term) == sum of run.count(term) over the blob's runs and
+		# only the (much smaller) distinct-run vocabulary has to be searched.
+		text, starts, arrays = self._word_index()
+		hits: List[int] = []
+		pos = text.find(term)
+		while pos != -1:
+			w = int(np.searchsorted(starts, pos, side="right")) - 1
+			hits.append(w)
+			# Continue after this word: its remaining matches are counted below
+			pos = text.find(term, int(starts[w + 1]) if w + 1 < len(starts) else len(text))
+		if not hits:
+			return {}
+		vocab_end = [int(starts[w + 1]) - 1 if w + 1 < len(starts) else len(text) for w in hits]
+		ids = np.concatenate([arrays[w][0] for w in hits])
+		counts = np.concatenate([arrays[w][1] * text.count(term, int(starts[w]), end) for w, end in zip(hits, vocab_end)])
+		blob_ids, inverse = np.unique(ids, return_inverse=True)
+		totals = np.bincount(inverse, weights=counts).astype(np.int64)
+		return dict(zip(blob_ids.tolist(), totals.tolist()))
+
+	def product_vector(self, product: str) -> Tuple[FrozenSet[str], Dict[int, int]]:
+		return self._products.get_or_compute(normalize_product(product), self._build_product)
+
+	def _build_product(self, key: str) -> Tuple[FrozenSet[str], Dict[int, int]]:
+		terms = extract_terms(key)
+		vec: Dict[int, int] = {}
+		for t in terms:
+			for i, c in self.term_vector(t).items():
+				vec[i] = vec.get(i, 0) + c
+		return terms, vec
+
+	def product_top(self, product: str, k: int) -> List[int]:
+		"""
+		Indices of the k best-matching blobs for a single product (descending score, ties in blob order).
+		"""
+		_, vec = self.product_vector(product)
+		return [i for i, _ in heapq.nsmallest(max(int(k), 0), vec.items(), key=lambda x: (-x[1], x[0]))]
+
+	def pair_vector(self, product_1: str, product_2: str) -> Tuple[FrozenSet[str], Dict[int, int]]:
+		"""
+		Terms of both products and the blob scores for their union.
+		"""
+		t1, v1 = self.product_vector(product_1)
+		t2, v2 = self.product_vector(product_2)
+		if len(v2) > len(v1):
+			t1, v1, t2, v2 = t2, v2, t1, v1
+		vec = dict(v1)
+		for i, c in v2.items():
+			vec[i] = vec.get(i, 0) + c
+		# Shared terms were counted by both products; the union counts them once
+		for t in t1 & t2:
+			for i, c in self.term_vector(t).items():
+				vec[i] -= c
+		return t1 | t2, {i: c for i, c in vec.items() if c > 0}
+
+	def top(self, product_1: str, product_2: str, k: Optional[int] = None) -> Tuple[FrozenSet[str], List[Tuple[int, int]]]:
+		"""
+		(score, blob index) pairs by descending score, ties in blob order,
+		i.e. the same ranking as a stable sort over a full scan.
+		"""
+		terms, vec = self.pair_vector(product_1, product_2)
+		items = ((c, i) for i, c in vec.items())
+		if k is None:
+			return terms, sorted(items, key=lambda x: (-x[0], x[1]))
+		return terms, heapq.nsmallest(max(int(k), 0), items, key=lambda x: (-x[0], x[1]))
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"blobs": len(self.blobs),
+			"terms_cached": len(self._terms),
+			"products_cached": len(self._products),
+			"product_hits": self._products.hits,
+			"product_misses": self._products.misses,
+		}
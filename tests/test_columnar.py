@@ -0,0 +1,112 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from product_similarity.columnar import ColumnarWriter, convert_results, read_columns
+from product_similarity.metrics import load_columns, results_to_columns
+from product_similarity.results_io import JsonlWriter
+
+
+FACTORS = ["Nature", "Intended Purpose"]
+
+
+def _model_row(i: int) -> Dict[str, object]:
+	return {
+		"row_index": i,
+		"product_1": f"paint {i}",
+		"product_2": f"chemical {i}",
+		"contexts": [f"ctx {i}"],
+		"analyzer": f"analysis {i}",
+		"factors": {f: {"score": i % 5, "reasoning_text": f"{f} reasoning {i}"} for f in FACTORS},
+		"judge": {"overall_similarity": i % 5},
+		"gold_overall": i % 5,
+		"pred_overall": i % 5,
+	}
+
+
+def _cascade_row(i: int) -> Dict[str, object]:
+	# What a pre-screened row looks like: no factor outputs, so no reasoning
+	return {
+		"row_index": i,
+		"product_1": f"paint {i}",
+		"product_2": f"paint {i}",
+		"contexts": [f"ctx {i}"],
+		"factors": {},
+		"judge": {"overall_similarity": 4},
+		"gold_overall": 4,
+		"pred_overall": 4,
+		"cascade": {"resolved": True},
+	}
+
+
+def _rows() -> List[Dict[str, object]]:
+	return [_cascade_row(0), _cascade_row(1)] + [_model_row(i) for i in range(2, 6)]
+
+
+def test_leading_cascade_rows_keep_later_text_with_verbosity(tmp_path: object) -> None:
+	path = os.path.join(str(tmp_path), "out.cols")
+	with ColumnarWriter(path, factors=FACTORS, chunk_rows=2, verbosity="full") as writer:
+		for row in _rows():
+			writer.write(row)
+	cols = read_columns(path, text=True)
+	assert list(cols["cascade"]) == [1, 1, 0, 0, 0, 0]
+	assert list(cols["reasoning:Nature"]) == [None, None] + [f"Nature reasoning {i}" for i in range(2, 6)]
+	assert list(cols["analyzer"]) == [None, None] + [f"analysis {i}" for i in range(2, 6)]
+
+
+def test_leading_cascade_rows_without_verbosity_raise(tmp_path: object) -> None:
+	path = os.path.join(str(tmp_path), "out.cols")
+	writer = ColumnarWriter(path, factors=FACTORS, chunk_rows=2)
+	with pytest.raises(ValueError, match="verbosity"):
+		for row in _rows():
+			writer.write(row)
+
+
+def test_convert_results_scans_text_fields(tmp_path: object) -> None:
+	src = os.path.join(str(tmp_path), "results.jsonl")
+	with JsonlWriter(src) as writer:
+		for row in _rows():
+			writer.write(row)
+	dst = os.path.join(str(tmp_path), "out.cols")
+	assert convert_results(src, dst, factors=FACTORS, chunk_rows=2) == 6
+	cols = read_columns(dst, text=True)
+	assert list(cols["reasoning:Intended Purpose"])[2:] == [f"Intended Purpose reasoning {i}" for i in range(2, 6)]
+	assert list(cols["analyzer"])[:3] == [None, None, "analysis 2"]
+
+
+def test_round_trip_matches_results_to_columns(tmp_path: object) -> None:
+	rng = np.random.default_rng(0)
+	rows = []
+	for i in range(57):
+		factors = {}
+		for f in FACTORS:
+			entry: Dict[str, object] = {"score": None if rng.random() < 0.1 else int(rng.integers(0, 5))}
+			if rng.random() < 0.7:
+				entry["confidence"] = round(float(rng.random()), 3)
+			factors[f] = entry
+		rows.append({
+			"row_index": i,
+			"product_1": f"p{i}",
+			"product_2": f"q{i}",
+			"factors": factors,
+			"judge": {"confidence": 0.5 + i / 200},
+			"gold_overall": None if i % 7 == 0 else i % 5,
+			"pred_overall": (i * 3) % 5,
+			"spsc_proximity": float("nan") if i % 4 == 0 else i / 57,
+			"channels_of_trade": "" if i % 5 == 0 else f"channel {i % 3}",
+		})
+	path = os.path.join(str(tmp_path), "out.cols")
+	with ColumnarWriter(path, group_keys=["channels_of_trade"], chunk_rows=10, verbosity="scores") as writer:
+		for row in rows:
+			writer.write(row)
+	expected = results_to_columns(rows, group_keys=["channels_of_trade"])
+	got = load_columns(path)
+	for name, values in expected.items():
+		if values.dtype.kind == "f":
+			np.testing.assert_allclose(got[name], values, rtol=1e-6, equal_nan=True)
+		else:
+			assert np.array_equal(got[name], values), name
+	assert list(read_columns(path, ["row_index"])["row_index"]) == list(range(57))
+	assert list(read_columns(path, ["product_2"], text=True)["product_2"]) == [f"q{i}" for i in range(57)]
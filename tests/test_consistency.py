@@ -0,0 +1,49 @@
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+import pytest
+
+from product_similarity.consistency import aggregate_scores
+
+
+def _naive_majority(valid: List[int]) -> int:
+	counts = Counter(valid)
+	top = max(counts.values())
+	mean = sum(valid) / len(valid)
+	tied = sorted(s for s, c in counts.items() if c == top)
+	best = tied[0]
+	for s in tied[1:]:
+		if abs(s - mean) < abs(best - mean):
+			best = s
+	return best
+
+
+@pytest.mark.parametrize("method", ["majority", "mean"])
+def test_aggregate_scores_matches_naive_reference(method: str) -> None:
+	rng = np.random.default_rng(0)
+	for _ in range(2000):
+		n = int(rng.integers(1, 8))
+		scores: List[Optional[int]] = [None if rng.random() < 0.2 else int(rng.integers(0, 5)) for _ in range(n)]
+		result = aggregate_scores(scores, method)
+		valid = [s for s in scores if s is not None]
+		assert result.scores == tuple(scores)
+		if not valid:
+			assert (result.score, result.spread, result.confidence) == (None, None, 0.0)
+			continue
+		expected = _naive_majority(valid) if method == "majority" else int(np.rint(sum(valid) / len(valid)))
+		assert result.score == expected, scores
+		assert result.confidence == round(valid.count(expected) / n, 4)
+		assert result.spread == round(float(np.std(valid)), 4)
+
+
+def test_majority_ties_prefer_the_score_closest_to_the_mean_then_the_lower() -> None:
+	assert aggregate_scores([1, 1, 3, 3, 4]).score == 3
+	assert aggregate_scores([1, 1, 3, 3]).score == 1
+	# Unparsed samples count against confidence
+	assert aggregate_scores([2, 2, None, None]).confidence == 0.5
+
+
+def test_unknown_aggregate_raises() -> None:
+	with pytest.raises(ValueError, match="median"):
+		aggregate_scores([1, 2], "median")
@@ -0,0 +1,59 @@
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+from product_similarity.judge import JudgeConfig, LLMJudge
+
+
+FACTORS = ["Nature", "Intended Purpose", "Channel of trade"]
+
+
+def _row_outputs(scores: np.ndarray, conf: np.ndarray) -> Dict[str, Dict[str, object]]:
+	outputs: Dict[str, Dict[str, object]] = {}
+	for k, f in enumerate(FACTORS):
+		entry: Dict[str, object] = {"score": None if np.isnan(scores[k]) else int(scores[k])}
+		if not np.isnan(conf[k]):
+			entry["confidence"] = float(conf[k])
+		outputs[f] = entry
+	return outputs
+
+
+@pytest.mark.parametrize("use_confidence", [False, True])
+def test_combine_batch_matches_per_row_judge(use_confidence: bool) -> None:
+	rng = np.random.default_rng(0)
+	# Thirds, halves and tenths produce exact .5 ties in the weighted mean
+	levels = np.array([0.0, 0.1, 0.2, 0.25, 1 / 3, 0.5, 2 / 3, 0.7, 1.0])
+	n = 3000
+	mismatches: List[str] = []
+	for trial in range(10):
+		weights = dict(zip(FACTORS, (float(w) for w in rng.choice(levels, size=3))))
+		judge = LLMJudge(JudgeConfig(weights=weights, use_confidence=use_confidence))
+		scores = rng.integers(0, 5, (n, 3)).astype(np.float64)
+		scores[rng.random((n, 3)) < 0.25] = np.nan
+		conf = rng.choice(np.array([0.5, 1 / 3, 2 / 3, 1.0, 0.25]), size=(n, 3))
+		conf[rng.random((n, 3)) < 0.3] = np.nan
+		batch = judge.combine_batch(scores, FACTORS, confidence=conf)
+		for i in range(n):
+			single = judge.combine_factor_scores(_row_outputs(scores[i], conf[i]))["overall_similarity"]
+			if single != batch[i]:
+				mismatches.append(f"weights={weights} scores={scores[i]} conf={conf[i]}: {single} vs {batch[i]}")
+	assert not mismatches, mismatches[:5]
+
+
+def test_combine_batch_needs_confidence_with_use_confidence() -> None:
+	judge = LLMJudge(JudgeConfig(use_confidence=True))
+	with pytest.raises(ValueError):
+		judge.combine_batch(np.zeros((2, 3)), FACTORS)
+
+
+def test_search_weights_validates_steps_and_finds_exact_weights() -> None:
+	rng = np.random.default_rng(1)
+	scores = rng.integers(0, 5, (500, 2)).astype(np.float64)
+	gold = scores[:, 0]
+	judge = LLMJudge()
+	with pytest.raises(ValueError):
+		judge.search_weights(scores, gold, ["Nature", "Intended Purpose"], steps=0)
+	best = judge.search_weights(scores, gold, ["Nature", "Intended Purpose"], steps=4)
+	assert best["accuracy"] == 1.0
+	assert best["weights"] == {"Nature": 1.0, "Intended Purpose": 0.0}
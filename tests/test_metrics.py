@@ -0,0 +1,46 @@
+from typing import List, Optional
+
+import numpy as np
+import pytest
+
+from product_similarity.metrics import paired_difference
+
+
+def _levels(rng: np.random.Generator, n: int, missing: float = 0.1) -> List[Optional[int]]:
+	return [None if rng.random() < missing else int(rng.integers(0, 5)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("metric", ["accuracy", "mse"])
+def test_paired_difference_matches_per_row_mean(metric: str) -> None:
+	rng = np.random.default_rng(0)
+	gold = _levels(rng, 500)
+	pred = [g if g is not None and rng.random() < 0.6 else v for g, v in zip(gold, _levels(rng, 500))]
+	base = _levels(rng, 500)
+	diffs = []
+	for p, b, g in zip(pred, base, gold):
+		if p is None or b is None or g is None:
+			continue
+		if metric == "accuracy":
+			diffs.append(int(p == g) - int(b == g))
+		else:
+			diffs.append((p - g) ** 2 - (b - g) ** 2)
+	out = paired_difference(pred, base, gold, metric=metric, n_boot=4000)
+	assert out["n"] == len(diffs)
+	assert out["difference"] == pytest.approx(float(np.mean(diffs)))
+
+	# The multinomial shortcut is the row bootstrap: compare with resampling rows directly
+	d = np.asarray(diffs, dtype=float)
+	boot = np.random.default_rng(1).choice(d, size=(4000, d.size)).mean(axis=1)
+	lo, hi = np.percentile(boot, [2.5, 97.5])
+	spread = hi - lo
+	assert out["ci"][0] == pytest.approx(lo, abs=0.1 * spread)
+	assert out["ci"][1] == pytest.approx(hi, abs=0.1 * spread)
+
+
+def test_paired_difference_without_overlap() -> None:
+	out = paired_difference([1, None], [None, 2], [1, 2])
+	assert out["n"] == 0
+	assert out["difference"] is None
+	assert out["ci"] == [None, None]
+	with pytest.raises(ValueError):
+		paired_difference([1], [1], [1], metric="qwk")
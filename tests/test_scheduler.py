@@ -0,0 +1,49 @@
+import asyncio
+from typing import List
+
+from product_similarity.scheduler import RequestScheduler
+
+
+def test_cancelled_async_waiters_leave_no_slot_behind() -> None:
+	async def main() -> None:
+		scheduler = RequestScheduler(max_concurrency=1)
+		gate = asyncio.Event()
+
+		async def slow() -> int:
+			await gate.wait()
+			return 1
+
+		first = asyncio.create_task(scheduler.acall(slow))
+		await asyncio.sleep(0.01)
+		queued = [asyncio.create_task(scheduler.acall(slow)) for _ in range(3)]
+		await asyncio.sleep(0.01)
+		for task in queued:
+			task.cancel()
+		await asyncio.gather(*queued, return_exceptions=True)
+		gate.set()
+		await first
+		snapshot = scheduler.snapshot()
+		assert snapshot["in_flight"] == 0 and snapshot["queued"] == 0
+		assert await asyncio.wait_for(scheduler.acall(slow), 2) == 1
+
+	asyncio.run(main())
+
+
+def test_interactive_overtakes_queued_bulk_requests() -> None:
+	async def main() -> List[str]:
+		scheduler = RequestScheduler(max_concurrency=2)
+		order: List[str] = []
+
+		async def work(tag: str) -> None:
+			await asyncio.sleep(0.005)
+			order.append(tag)
+
+		# More waiters than the default executor has threads
+		bulk = [asyncio.create_task(scheduler.acall(lambda i=i: work(f"b{i}"), priority="bulk")) for i in range(100)]
+		await asyncio.sleep(0.02)
+		interactive = [asyncio.create_task(scheduler.acall(lambda i=i: work(f"i{i}"), priority="interactive")) for i in range(3)]
+		await asyncio.gather(*bulk, *interactive)
+		return order
+
+	order = asyncio.run(main())
+	assert max(order.index(f"i{i}") for i in range(3)) < 20
@@ -0,0 +1,72 @@
+import numpy as np
+
+from product_similarity.sequential import (
+	SequentialConfig,
+	SequentialMonitor,
+	paired_accuracy_interval,
+	stratified_order,
+	wilson_interval,
+)
+
+
+def _run(monitor: SequentialMonitor, pred: np.ndarray, gold: np.ndarray) -> None:
+	for i in range(len(pred)):
+		if monitor.update(i, int(pred[i]), int(gold[i])):
+			break
+
+
+def test_wilson_interval_never_collapses() -> None:
+	lo, hi = wilson_interval(30, 30)
+	assert hi == 1.0 and lo < 0.9
+	lo, hi = wilson_interval(0, 30)
+	assert lo == 0.0 and hi > 0.1
+
+
+def test_paired_interval_with_no_discordant_rows_is_wide() -> None:
+	lo, hi = paired_accuracy_interval(0, 0, 30)
+	assert lo < 0 < hi and hi - lo > 0.1
+
+
+def test_agreeing_prefix_does_not_stop_as_precision() -> None:
+	rng = np.random.default_rng(1)
+	n = 400
+	gold = rng.integers(0, 5, n)
+	base = np.where(rng.random(n) < 0.6, gold, (gold + 1) % 5)
+	pred = base.copy()
+	# Identical to the baseline on the first 30 rows, better afterwards
+	later = np.arange(30, n)
+	fixed = later[rng.random(len(later)) < 0.15]
+	pred[fixed] = gold[fixed]
+
+	monitor = SequentialMonitor(SequentialConfig(), baseline=base)
+	_run(monitor, pred, gold)
+	summary = monitor.summary(n)
+	assert summary["rows"] > 30
+	assert monitor.checks[0]["degenerate"]
+	if summary["stopped"] != "exhausted":
+		assert summary["final"]["paired"]["difference"] > 0
+
+
+def test_all_correct_run_is_not_stopped_for_precision() -> None:
+	gold = np.arange(200) % 5
+	monitor = SequentialMonitor(SequentialConfig())
+	_run(monitor, gold, gold)
+	assert monitor.reason is None
+	assert monitor.checks[0]["width"] > 0
+
+
+def test_noisy_run_stops_for_precision() -> None:
+	rng = np.random.default_rng(0)
+	gold = rng.integers(0, 5, 2000)
+	pred = np.where(rng.random(2000) < 0.7, gold, (gold + 2) % 5)
+	monitor = SequentialMonitor(SequentialConfig(max_width=0.15))
+	_run(monitor, pred, gold)
+	assert monitor.reason == "precision"
+
+
+def test_stratified_order_is_a_permutation() -> None:
+	strata = [i % 3 for i in range(30)]
+	order = stratified_order(strata, seed=0)
+	assert sorted(order) == list(range(30))
+	first = [strata[i] for i in order[:9]]
+	assert sorted(first) == [0, 0, 0, 1, 1, 1, 2, 2, 2]
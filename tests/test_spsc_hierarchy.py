@@ -0,0 +1,47 @@
+from typing import Dict, List
+
+import numpy as np
+
+from product_similarity.spsc_hierarchy import SpscHierarchy
+
+
+def _random_flat(rng: np.random.Generator, n: int) -> List[Dict[str, str]]:
+	flat = []
+	for _ in range(n):
+		depth = int(rng.integers(0, 6))
+		# Few codes per level, so paths share prefixes and some prefixes have no row of their own
+		flat.append({"path_code": " > ".join(f"L{d}{int(rng.integers(0, 3))}" for d in range(depth))})
+	return flat
+
+
+def _naive_lca(tree: SpscHierarchy, u: int, v: int) -> int:
+	ancestors = set()
+	while u >= 0:
+		ancestors.add(u)
+		u = int(tree.parent[u])
+	while v not in ancestors:
+		v = int(tree.parent[v])
+	return v
+
+
+def test_lca_many_matches_parent_walk() -> None:
+	rng = np.random.default_rng(0)
+	for _ in range(5):
+		tree = SpscHierarchy(_random_flat(rng, 300))
+		u = rng.integers(0, len(tree), size=2000)
+		v = rng.integers(0, len(tree), size=2000)
+		got = tree.lca_many(u, v)
+		assert [int(w) for w in got] == [_naive_lca(tree, int(a), int(b)) for a, b in zip(u, v)]
+		same = tree.lca_many(u, u)
+		assert np.array_equal(same, u)
+
+
+def test_depth_of_lca_is_shared_path_prefix() -> None:
+	flat = [{"path_code": "A > B > C"}, {"path_code": "A > B > D"}, {"path_code": "A > E"}, {"path_code": "F"}]
+	tree = SpscHierarchy(flat)
+	nodes = tree.node_of_flat
+	u = np.asarray([nodes[0], nodes[0], nodes[0]])
+	v = np.asarray([nodes[1], nodes[2], nodes[3]])
+	assert list(tree.depth[tree.lca_many(u, v)]) == [2, 1, 0]
+	assert list(tree.distance_many(u, v)) == [2, 3, 4]
+	assert list(np.round(tree.proximity_many(u, v), 4)) == [round(2 / 3, 4), round(1 / 3, 4), 0.0]
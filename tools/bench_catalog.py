@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from product_similarity.catalog import CatalogConfig, CatalogIndex, recall_at_n, sample_queries  # noqa: E402
+from product_similarity.spsc import _get_spsc_flat_cached  # noqa: E402
+
+
+MODIFIERS = ["premium", "organic", "industrial", "portable", "compact", "heavy duty", "disposable", "reusable", "electric", "manual"]
+
+
+def synthetic_catalog(size: int, seed: int = 0) -> list:
+	"""
+	Catalog of SPSC commodity titles with a random modifier, e.g. "portable food grinders".
+	"""
+	rng = random.Random(seed)
+	titles = [n["title"] for n in _get_spsc_flat_cached() if n.get("title")]
+	return [f"{rng.choice(MODIFIERS)} {rng.choice(titles)}".lower() for _ in range(size)]
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Time catalog indexing / blocked search and report recall@N against a full pre-score scan")
+	parser.add_argument("--items", type=int, default=100_000)
+	parser.add_argument("--queries", type=int, default=50)
+	parser.add_argument("--top-n", type=int, default=10)
+	parser.add_argument("--candidates", type=int, default=50)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	products = synthetic_catalog(args.items, args.seed)
+	index = CatalogIndex(products, config=CatalogConfig(candidates=args.candidates))
+	queries = sample_queries(index, args.queries, seed=args.seed)
+
+	t0 = time.perf_counter()
+	for product, exclude in queries:
+		index.search(product, args.top_n, exclude=exclude)
+	per_query = (time.perf_counter() - t0) / max(len(queries), 1)
+
+	print(json.dumps({
+		"index": index.stats(),
+		"search_ms_per_query": round(per_query * 1e3, 2),
+		"recall": recall_at_n(index, queries, top_n=args.top_n),
+	}, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
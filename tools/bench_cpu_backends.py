@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_PROMPTS = [
+	"Assess the similarity in nature between 'Make-up preparations' and 'Tissues of paper for removing make-up'. Score 0-4.",
+	"Assess the similarity in nature between 'Paints' and 'construction materials'. Score 0-4.",
+	"Assess the similarity in nature between 'chemical additives for detergents' and 'chemical products used in industry'. Score 0-4.",
+]
+
+
+def _peak_rss_mb() -> float:
+	# ru_maxrss is KiB on Linux, bytes on macOS
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == "darwin":
+		return peak / (1024 * 1024)
+	return peak / 1024
+
+
+def run_child(args: argparse.Namespace) -> dict:
+	"""
+	Load one backend in this process, run the prompts and report throughput.
+	"""
+	from transformers import pipeline  # type: ignore
+	from product_similarity.model import load_local_model
+
+	t0 = time.perf_counter()
+	model, tokenizer = load_local_model(
+		args.model,
+		task=args.task,
+		backend=args.backend,
+		num_threads=args.num_threads,
+	)
+	gen = pipeline(args.task, model=model, tokenizer=tokenizer, device=-1)
+	load_s = time.perf_counter() - t0
+	rss_after_load = _peak_rss_mb()
+
+	kwargs = {"max_new_tokens": args.max_new_tokens, "do_sample": False}
+	if args.task == "text-generation":
+		kwargs["return_full_text"] = False
+	gen(DEFAULT_PROMPTS[0], **kwargs)  # warm-up
+
+	new_tokens = 0
+	t1 = time.perf_counter()
+	for _ in range(args.repeats):
+		for prompt in DEFAULT_PROMPTS:
+			text = gen(prompt, **kwargs)[0]["generated_text"]
+			new_tokens += len(tokenizer(str(text), add_special_tokens=False)["input_ids"])
+	elapsed = time.perf_counter() - t1
+
+	return {
+		"backend": args.backend,
+		"model": args.model,
+		"num_threads": args.num_threads,
+		"load_seconds": round(load_s, 2),
+		"generated_tokens": new_tokens,
+		"tokens_per_sec": round(new_tokens / elapsed, 2) if elapsed > 0 else None,
+		"rss_after_load_mb": round(rss_after_load, 1),
+		"peak_rss_mb": round(_peak_rss_mb(), 1),
+	}
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Compare tokens/sec and resident memory of local CPU backends")
+	parser.add_argument("--model", default="google/flan-t5-base")
+	parser.add_argument("--task", choices=["text2text-generation", "text-generation"], default="text2text-generation")
+	parser.add_argument("--backends", default="torch,int8,onnx", help="Comma-separated backends to compare")
+	parser.add_argument("--num-threads", type=int, default=None)
+	parser.add_argument("--max-new-tokens", type=int, default=64)
+	parser.add_argument("--repeats", type=int, default=2)
+	parser.add_argument("--backend", help=argparse.SUPPRESS)  # internal: child mode
+	args = parser.parse_args()
+
+	if args.backend:
+		print(json.dumps(run_child(args)))
+		return 0
+
+	# Each backend runs in a fresh interpreter so peak RSS is not shared between them
+	rows = []
+	for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+		cmd = [
+			sys.executable, os.path.abspath(__file__),
+			"--backend", backend,
+			"--model", args.model,
+			"--task", args.task,
+			"--max-new-tokens", str(args.max_new_tokens),
+			"--repeats", str(args.repeats),
+		]
+		if args.num_threads:
+			cmd += ["--num-threads", str(args.num_threads)]
+		proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+		if proc.returncode != 0:
+			rows.append({"backend": backend, "error": (proc.stderr.strip().splitlines() or ["failed"])[-1]})
+			continue
+		rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+	print(json.dumps(rows, ensure_ascii=False, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
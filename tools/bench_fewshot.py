@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import sys
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from eval import _parse_gold, load_rows  # noqa: E402
+from product_similarity.pipeline import run_similarity  # noqa: E402
+
+
+def _setting(spec: str) -> tuple:
+	# "first:5" -> ("first", 5)
+	selection, _, k = spec.partition(":")
+	return selection, int(k or 0)
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Compare prompt size (and accuracy with a chat API) of few-shot selection settings on a labeled CSV")
+	parser.add_argument("--csv", default="data/100_samples.csv")
+	parser.add_argument("--settings", nargs="+", default=["first:5", "first:2", "nearest:2"], help="selection:k pairs")
+	parser.add_argument("--limit", type=int, default=None, help="Only the first N rows")
+	parser.add_argument("--chat-api-base-url", default=None)
+	parser.add_argument("--chat-api-key", default=None)
+	parser.add_argument("--chat-api-model", default=None)
+	args = parser.parse_args()
+
+	rows = load_rows(args.csv)[: args.limit]
+	use_api = bool(args.chat_api_base_url and args.chat_api_key and args.chat_api_model)
+	report = {}
+	for spec in args.settings:
+		selection, k = _setting(spec)
+		chars = 0
+		correct = scored = 0
+		for r in rows:
+			res = run_similarity(
+				r.get("Item 1", "").strip(),
+				r.get("Item 2", "").strip(),
+				max_fewshot=k,
+				fewshot_selection=selection,
+				chat_api_base_url=args.chat_api_base_url if use_api else None,
+				chat_api_key=args.chat_api_key,
+				chat_api_model=args.chat_api_model,
+				as_record=True,
+			)
+			chars += len(res.prompt or "")
+			gold = _parse_gold(r.get("Level of similarity"))
+			pred = res.score_dict().get("overall")
+			if gold is not None and pred is not None:
+				scored += 1
+				correct += int(pred == gold)
+		report[spec] = {
+			"rows": len(rows),
+			"mean_prompt_tokens": round(chars / 4 / max(len(rows), 1), 1),  # ~4 chars per token, as scheduler.estimate_tokens
+			"accuracy": round(correct / scored, 4) if scored else None,
+			"scored": scored,
+		}
+	print(json.dumps(report, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np  # noqa: E402
+
+from product_similarity.metrics import compute_metrics, load_columns, save_columns  # noqa: E402
+
+
+CHANNELS = ["retail", "wholesale", "online", "pharmacy", "industrial", "professional"]
+
+
+def synthetic_columns(rows: int, seed: int = 0) -> dict:
+	"""
+	Random saved-results columns: gold uniform on 0..4, pred = gold + small noise.
+	"""
+	rng = np.random.default_rng(seed)
+	gold = rng.integers(0, 5, size=rows, dtype=np.int8)
+	noise = rng.choice([-1, 0, 0, 0, 1], size=rows).astype(np.int8)
+	pred = np.clip(gold + noise, 0, 4).astype(np.int8)
+	gold[rng.random(rows) < 0.01] = -1  # a few unlabeled rows
+	return {
+		"pred": pred,
+		"gold": gold,
+		"factor:Nature": rng.integers(0, 5, size=rows).astype(np.float32),
+		"factor:Intended Purpose": rng.integers(0, 5, size=rows).astype(np.float32),
+		"channels_of_trade": np.asarray(CHANNELS)[rng.integers(0, len(CHANNELS), size=rows)],
+	}
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Time re-scoring a large saved results file with product_similarity.metrics")
+	parser.add_argument("--rows", type=int, default=1_000_000)
+	parser.add_argument("--path", default=None, help="Keep the synthetic .npz here (default: a temporary file, deleted afterwards)")
+	parser.add_argument("--bootstrap", type=int, default=1000)
+	args = parser.parse_args()
+
+	path = args.path
+	if path is None:
+		fd, path = tempfile.mkstemp(prefix="bench_results-", suffix=".npz")
+		os.close(fd)
+	else:
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	try:
+		save_columns(path, synthetic_columns(args.rows))
+		t0 = time.perf_counter()
+		cols = load_columns(path)
+		t1 = time.perf_counter()
+	finally:
+		if args.path is None:
+			os.remove(path)
+	metrics = compute_metrics(
+		cols["pred"],
+		cols["gold"],
+		groups={"channels_of_trade": cols["channels_of_trade"]},
+		n_boot=args.bootstrap,
+	)
+	t2 = time.perf_counter()
+
+	print(json.dumps({
+		"rows": args.rows,
+		"load_seconds": round(t1 - t0, 4),
+		"score_seconds": round(t2 - t1, 4),
+		"total_seconds": round(t2 - t0, 4),
+		"accuracy": metrics["accuracy"],
+		"mse": metrics["mse"],
+		"qwk": metrics["qwk"],
+		"groups": len(metrics["by_group"]["channels_of_trade"]),  # type: ignore[index]
+	}, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
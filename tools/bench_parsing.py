@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from product_similarity.parsing import ALL_FIELDS, IncrementalScoreParser, SCORE_RE, _scan, parse_factor_score, parse_fields, parse_scores  # noqa: E402
+
+
+DEFAULT_CORPUS = os.path.join(PROJECT_ROOT, "tools", "fixtures", "parse_corpus.jsonl")
+
+
+def legacy_parse_scores(output: str) -> Dict[str, Optional[int]]:
+	# Previous pipeline.parse_scores: three uncompiled searches, first match wins
+	scores: Dict[str, Optional[int]] = {"nature": None, "purpose": None, "overall": None}
+	patterns = {
+		"nature": r"Nature\s*Score:\s*(\d)",
+		"purpose": r"Purpose\s*Score:\s*(\d)",
+		"overall": r"Overall(?:\s+Similarity)?(?:\s+Score)?\s*[:\-]\s*(\d)",
+	}
+	for key, pat in patterns.items():
+		m = re.search(pat, output, re.IGNORECASE)
+		if m:
+			scores[key] = int(m.group(1))
+	return scores
+
+
+def legacy_parse_factor_score(output_text: str) -> Optional[int]:
+	# Previous FactorAgent._parse_score
+	import re as _re
+	m = _re.search(r"Score\s*[:\-]\s*(\d)", output_text, flags=_re.IGNORECASE)
+	return int(m.group(1)) if m else None
+
+
+def load_corpus(path: str) -> List[Dict[str, object]]:
+	with open(path, "r", encoding="utf-8") as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+
+def check_corpus(corpus: List[Dict[str, object]]) -> List[str]:
+	failures = []
+	for case in corpus:
+		got = parse_fields(str(case["text"]))
+		if got != case["expected"]:
+			failures.append(f"{case['name']}: got {got}, expected {case['expected']}")
+	return failures
+
+
+# Streamed outputs whose multi-digit numbers may be split across chunks
+STREAM_CASES = [
+	"Reasoning: x\nScore: 10 apples",
+	"Reasoning: x\nScore: 3 apples",
+	"Score: 7\nScore: 12",
+	"Score: 5\nScore: 123 units, so Score: 2",
+	"**Score**: 4",
+]
+
+
+def _chunks(text: str, rng: random.Random) -> List[str]:
+	cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 6)))) if len(text) > 1 else []
+	return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def check_streaming(corpus: List[Dict[str, object]], seed: int) -> List[str]:
+	"""
+	IncrementalScoreParser must end where parse_fields does for any chunking,
+	and on STREAM_CASES never report a value that is not a valid score mention.
+	"""
+	rng = random.Random(seed)
+	failures = []
+	for text in STREAM_CASES:
+		valid = {None} | {int(m.group("value")) for m in SCORE_RE.finditer(text)}
+		final = parse_fields(text, ("score",))["score"]
+		for chunks in [[text[:i], text[i:]] for i in range(1, len(text))] + [list(text)]:
+			parser = IncrementalScoreParser(("score",))
+			bad = {parser.feed(c)["score"] for c in chunks} - valid
+			got = parser.finish()["score"]
+			if bad or got != final:
+				failures.append(f"stream {chunks!r}: reported {sorted(bad)}, finished {got}, expected {final}")
+	for case in corpus:
+		text = str(case["text"])
+		for _ in range(3):
+			parser = IncrementalScoreParser()
+			for c in _chunks(text, rng):
+				parser.feed(c)
+			got = parser.finish()
+			if got != parse_fields(text):
+				failures.append(f"stream {case['name']}: got {got}, expected {parse_fields(text)}")
+	return failures
+
+
+_NOISE = [
+	"\n", " ", "Score", "score: ", "Nature Score: 4", "Overall", ":", "-", "**", "7", "\n\n",
+	"Reasoning: similar goods. ", "Purpose Score: 0\n", "Score: 9\n", "Overall Similarity Score - 1\n",
+]
+
+
+def mutate(text: str, rng: random.Random) -> str:
+	for _ in range(rng.randint(1, 4)):
+		op = rng.random()
+		pos = rng.randint(0, len(text))
+		if op < 0.4:
+			text = text[:pos] + rng.choice(_NOISE) + text[pos:]
+		elif op < 0.6 and text:
+			end = min(len(text), pos + rng.randint(1, 8))
+			text = text[:pos] + text[end:]
+		elif op < 0.8:
+			text = ("filler reasoning " * rng.randint(10, 800)) + "\n" + text
+		else:
+			text = text.swapcase() if rng.random() < 0.5 else text.upper()
+	return text
+
+
+def fuzz(corpus: List[Dict[str, object]], iterations: int, seed: int) -> List[str]:
+	"""
+	The tail-first parser must agree with a plain full-text scan on mutated outputs.
+	"""
+	rng = random.Random(seed)
+	failures = []
+	for i in range(iterations):
+		text = mutate(str(rng.choice(corpus)["text"]), rng)
+		expected = {k: None for k in ALL_FIELDS}
+		expected.update(_scan(text, 0, ALL_FIELDS))
+		got = parse_fields(text)
+		if got != expected:
+			failures.append(f"iteration {i}: got {got}, expected {expected}, text={text[-200:]!r}")
+	return failures
+
+
+def bench(texts: List[str], repeat: int) -> Dict[str, float]:
+	def timed(fn) -> float:  # type: ignore[no-untyped-def]
+		t0 = time.perf_counter()
+		for _ in range(repeat):
+			for t in texts:
+				fn(t)
+		return (time.perf_counter() - t0) / (repeat * len(texts)) * 1e6
+
+	return {
+		"legacy_parse_scores_us": timed(legacy_parse_scores),
+		"parse_scores_us": timed(parse_scores),
+		"legacy_factor_score_us": timed(legacy_parse_factor_score),
+		"parse_factor_score_us": timed(parse_factor_score),
+	}
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Check, fuzz and benchmark product_similarity.parsing")
+	parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL corpus of model outputs with expected fields")
+	parser.add_argument("--fuzz", type=int, default=2000, help="Number of fuzzed outputs to compare against a full scan")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--repeat", type=int, default=50, help="Benchmark passes over the corpus")
+	parser.add_argument("--trace-chars", type=int, default=20000, help="Reasoning-trace prefix length added for the benchmark")
+	args = parser.parse_args()
+
+	corpus = load_corpus(args.corpus)
+	failures = check_corpus(corpus) + check_streaming(corpus, args.seed) + fuzz(corpus, args.fuzz, args.seed)
+	for line in failures[:20]:
+		print("FAIL", line)
+
+	trace = ("Let me think step by step about the goods and their channels of trade. " * (args.trace_chars // 72 + 1))[:args.trace_chars]
+	texts = [str(c["text"]) for c in corpus] + [trace + "\n" + str(c["text"]) for c in corpus]
+	print(json.dumps({
+		"corpus": len(corpus),
+		"fuzzed": args.fuzz,
+		"failures": len(failures),
+		"timings_per_output": {k: round(v, 2) for k, v in bench(texts, args.repeat).items()},
+	}, indent=2))
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_INPUT = os.path.join(PROJECT_ROOT, "spsc_data", "SPSC.xlsx")
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "spsc_data", "spsc_data", "spsc_tree.json")
+
+# Placeholder roots (parents that are referenced but never defined) sort after real roots
+_UNDEFINED = 2 ** 62
+
+
+def normalize_key(value: object) -> Optional[str]:
+	"""Normalize a key cell: drop a trailing '.0' on integral numbers; None/blank -> None."""
+	if value is None:
+		return None
+	if isinstance(value, bool):
+		return str(value)
+	if isinstance(value, int):
+		return str(value)
+	if isinstance(value, float):
+		if value != value:  # NaN
+			return None
+		return str(int(value)) if value.is_integer() else str(value)
+	s = str(value).strip()
+	if s.endswith(".0"):
+		s = s[:-2]
+	return s or None
+
+
+def normalize_text(value: object) -> Optional[str]:
+	if value is None:
+		return None
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	s = str(value).strip()
+	return s or None
+
+
+def resolve_columns(header: Tuple[object, ...], desired: Dict[str, Optional[str]]) -> Dict[str, Optional[int]]:
+	"""
+	Map logical column names to header positions (case and whitespace insensitive).
+	desired: logical name -> provided column name (None means use the logical name).
+	"""
+	positions: Dict[str, int] = {}
+	for i, col in enumerate(header):
+		if col is None:
+			continue
+		positions.setdefault(" ".join(str(col).strip().lower().split()), i)
+	resolved: Dict[str, Optional[int]] = {}
+	for logical, provided in desired.items():
+		name = provided if provided is not None else logical
+		resolved[logical] = positions.get(" ".join(name.strip().lower().split()))
+	return resolved
+
+
+class CompactTree:
+	"""
+	Parent/child structure held in flat arrays indexed by node id.
+
+	Keys map to dense ids through one dict; children are kept as linked lists
+	(first_child / last_child / next_sibling) so no per-node containers exist.
+	"""
+
+	def __init__(self) -> None:
+		self.index: Dict[str, int] = {}
+		self.keys: List[str] = []
+		self.codes: List[Optional[str]] = []
+		self.titles: List[Optional[str]] = []
+		self.parent = array("q")
+		self.first_child = array("q")
+		self.last_child = array("q")
+		self.next_sibling = array("q")
+		self.defined_at = array("q")
+
+	def __len__(self) -> int:
+		return len(self.keys)
+
+	def _node(self, key: str) -> int:
+		idx = self.index.get(key)
+		if idx is None:
+			idx = len(self.keys)
+			self.index[key] = idx
+			self.keys.append(key)
+			self.codes.append(None)
+			self.titles.append(None)
+			for arr in (self.parent, self.first_child, self.last_child, self.next_sibling):
+				arr.append(-1)
+			self.defined_at.append(_UNDEFINED)
+		return idx
+
+	def add_row(self, row_no: int, key: str, parent_key: Optional[str], code: Optional[str], title: Optional[str]) -> None:
+		idx = self._node(key)
+		if self.defined_at[idx] == _UNDEFINED:
+			self.defined_at[idx] = row_no
+		if self.codes[idx] is None and code is not None:
+			self.codes[idx] = code
+		if self.titles[idx] is None and title is not None:
+			self.titles[idx] = title
+		if parent_key and self.parent[idx] == -1 and parent_key != key:
+			p = self._node(parent_key)
+			self.parent[idx] = p
+			if self.last_child[p] == -1:
+				self.first_child[p] = idx
+			else:
+				self.next_sibling[self.last_child[p]] = idx
+			self.last_child[p] = idx
+
+	def roots(self) -> List[int]:
+		ids = [i for i in range(len(self.keys)) if self.parent[i] == -1]
+		ids.sort(key=lambda i: self.defined_at[i])
+		return ids
+
+	def children(self, idx: int) -> Iterator[int]:
+		c = self.first_child[idx]
+		while c != -1:
+			yield c
+			c = self.next_sibling[c]
+
+
+def read_tree(
+	input_path: str,
+	*,
+	sheet_name: Optional[str] = None,
+	key_col: Optional[str] = None,
+	parent_col: Optional[str] = None,
+	code_col: Optional[str] = None,
+	title_col: Optional[str] = None,
+) -> Tuple[CompactTree, Dict[str, Optional[str]]]:
+	"""
+	Stream rows from the Excel sheet (openpyxl read-only mode) into a CompactTree.
+	"""
+	try:
+		from openpyxl import load_workbook  # type: ignore
+	except Exception as exc:  # pragma: no cover - import error path
+		raise RuntimeError("openpyxl is required to read Excel. Install with: pip install openpyxl") from exc
+
+	wb = load_workbook(input_path, read_only=True, data_only=True)
+	try:
+		ws = wb[sheet_name] if sheet_name else wb[wb.sheetnames[0]]
+		rows = ws.iter_rows(values_only=True)
+		header = next(rows, None)
+		if header is None:
+			raise ValueError(f"Empty sheet in {input_path}")
+		cols = resolve_columns(header, {
+			"Key": key_col,
+			"Parent key": parent_col,
+			"Code": code_col,
+			"Title": title_col,
+		})
+		missing = [name for name in ("Key", "Parent key") if cols.get(name) is None]
+		if missing:
+			raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+		k_i, p_i, c_i, t_i = cols["Key"], cols["Parent key"], cols.get("Code"), cols.get("Title")
+
+		def cell(row: Tuple[object, ...], i: Optional[int]) -> object:
+			return row[i] if i is not None and i < len(row) else None
+
+		tree = CompactTree()
+		for row_no, row in enumerate(rows):
+			key = normalize_key(cell(row, k_i))
+			if not key:
+				continue
+			tree.add_row(
+				row_no,
+				key,
+				normalize_key(cell(row, p_i)),
+				normalize_text(cell(row, c_i)),
+				normalize_text(cell(row, t_i)),
+			)
+	finally:
+		wb.close()
+
+	names = {logical: (str(header[i]) if i is not None else None) for logical, i in cols.items()}
+	return tree, names
+
+
+def write_outputs(
+	tree: CompactTree,
+	*,
+	output: Optional[TextIO],
+	flat_output: Optional[TextIO],
+	meta: Dict[str, object],
+	indent: Optional[int] = None,
+) -> int:
+	"""
+	Depth-first walk that writes the nested tree JSON and/or the flattened node
+	table (JSON Lines: title, code, path_title, path_code) incrementally.
+	Returns the number of nodes visited.
+	"""
+	dumps = json.dumps
+	roots = tree.roots()
+
+	def pad(depth: int) -> str:
+		return ("\n" + " " * (indent * depth)) if indent else ""
+
+	if output is not None:
+		output.write('{"roots": [')
+
+	stack: List[Iterator[int]] = [iter(roots)]
+	first: List[bool] = [True]
+	path_titles: List[str] = []
+	path_codes: List[str] = []
+	# Whether each open node pushed onto path_titles / path_codes
+	pushed: List[Tuple[bool, bool]] = []
+	visited = 0
+
+	while stack:
+		idx = next(stack[-1], None)
+		if idx is None:
+			stack.pop()
+			was_empty = first.pop()
+			if pushed:
+				had_title, had_code = pushed.pop()
+				if had_title:
+					path_titles.pop()
+				if had_code:
+					path_codes.pop()
+			if output is not None:
+				closing = "" if was_empty else pad(len(stack))
+				# Close the node's children array and the node, or the roots array
+				output.write(closing + ("]}" if stack else "]"))
+			continue
+
+		visited += 1
+		depth = len(stack)
+		code = tree.codes[idx]
+		title = tree.titles[idx]
+		if output is not None:
+			if not first[-1]:
+				output.write(",")
+			output.write(pad(depth))
+			output.write(
+				'{"key": ' + dumps(tree.keys[idx], ensure_ascii=False)
+				+ ', "code": ' + dumps(code, ensure_ascii=False)
+				+ ', "title": ' + dumps(title, ensure_ascii=False)
+				+ ', "children": ['
+			)
+		first[-1] = False
+
+		t = title or ""
+		c = code or ""
+		if t:
+			path_titles.append(t)
+		if c:
+			path_codes.append(c)
+		pushed.append((bool(t), bool(c)))
+		if flat_output is not None and (t or c):
+			flat_output.write(dumps({
+				"title": t,
+				"code": c,
+				"path_title": " > ".join(path_titles),
+				"path_code": " > ".join(path_codes),
+			}, ensure_ascii=False))
+			flat_output.write("\n")
+
+		stack.append(tree.children(idx))
+		first.append(True)
+
+	if output is not None:
+		output.write(', "meta": ' + dumps({**meta, "num_roots": len(roots)}, ensure_ascii=False) + "}\n")
+	return visited
+
+
+def _open_atomic(path: str) -> Tuple[TextIO, str]:
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	tmp = path + ".tmp"
+	return open(tmp, "w", encoding="utf-8"), tmp
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Stream an SPSC/UNSPSC Excel sheet into a hierarchy JSON")
+	parser.add_argument("--input", default=DEFAULT_INPUT, help="Path to Excel file")
+	parser.add_argument("--sheet-name", default=None, help="Excel sheet name (default: first sheet)")
+	parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Output tree JSON path ('-' to skip)")
+	parser.add_argument("--flat-output", default=None, help="Also write the flattened node table (JSON Lines)")
+	parser.add_argument("--indent", type=int, default=None, help="Indent nested JSON (default: compact)")
+	parser.add_argument("--key-col", default=None, help="Column name for Key (default: 'Key')")
+	parser.add_argument("--parent-col", default=None, help="Column name for Parent key (default: 'Parent key')")
+	parser.add_argument("--code-col", default=None, help="Column name for Code (default: 'Code')")
+	parser.add_argument("--title-col", default=None, help="Column name for Title (default: 'Title')")
+	args = parser.parse_args()
+
+	tree, columns = read_tree(
+		args.input,
+		sheet_name=args.sheet_name,
+		key_col=args.key_col,
+		parent_col=args.parent_col,
+		code_col=args.code_col,
+		title_col=args.title_col,
+	)
+	meta = {
+		"input": os.path.abspath(args.input),
+		"columns": {
+			"key": columns.get("Key"),
+			"parent": columns.get("Parent key"),
+			"code": columns.get("Code"),
+			"title": columns.get("Title"),
+		},
+	}
+
+	targets: List[Tuple[TextIO, str, str]] = []
+	out_f = flat_f = None
+	try:
+		if args.output and args.output != "-":
+			out_f, tmp = _open_atomic(args.output)
+			targets.append((out_f, tmp, args.output))
+		if args.flat_output:
+			flat_f, tmp = _open_atomic(args.flat_output)
+			targets.append((flat_f, tmp, args.flat_output))
+		visited = write_outputs(tree, output=out_f, flat_output=flat_f, meta=meta, indent=args.indent)
+	except BaseException:
+		for f, tmp, _ in targets:
+			f.close()
+			if os.path.exists(tmp):
+				os.remove(tmp)
+		raise
+	for f, tmp, final in targets:
+		f.close()
+		os.replace(tmp, final)
+
+	print(f"Built {len(tree)} nodes ({visited} reachable, {len(tree.roots())} roots) -> {', '.join(t[2] for t in targets) or 'nothing'}")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
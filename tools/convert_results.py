@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from product_similarity.columnar import convert_results, read_columns  # noqa: E402
+
+
+def _size(path: str) -> int:
+	if os.path.isdir(path):
+		return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+	return os.path.getsize(path)
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Convert an eval results JSONL file to the columnar format (.parquet or .cols)")
+	parser.add_argument("src", help="Results JSONL (e.g. eval_shards/results.jsonl)")
+	parser.add_argument("dst", help="Output path ending in .parquet (pyarrow) or .cols (numpy)")
+	parser.add_argument("--chunk-rows", type=int, default=10000)
+	parser.add_argument("--no-text", action="store_true", help="Drop product/analyzer/context/reasoning text columns")
+	parser.add_argument("--group-key", action="append", default=None, help="Group column to keep (default: channels_of_trade)")
+	args = parser.parse_args()
+
+	t0 = time.perf_counter()
+	rows = convert_results(
+		args.src,
+		args.dst,
+		chunk_rows=args.chunk_rows,
+		text=not args.no_text,
+		group_keys=args.group_key or ["channels_of_trade"],
+	)
+	write_s = time.perf_counter() - t0
+	t0 = time.perf_counter()
+	cols = read_columns(args.dst, ["pred", "gold"])
+	read_s = time.perf_counter() - t0
+	print(json.dumps({
+		"rows": rows,
+		"src_bytes": _size(args.src),
+		"dst_bytes": _size(args.dst),
+		"write_seconds": round(write_s, 3),
+		"read_pred_gold_seconds": round(read_s, 4),
+		"labeled": int((cols["gold"] >= 0).sum()),
+	}, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from product_similarity.model import ChatAPIWrapper  # noqa: E402
+from product_similarity.stub_server import StubChatServer  # noqa: E402
+
+
+def _prompts(n: int) -> list:
+	return [f"Assess pair #{i}: 'Paints' vs 'construction materials'. Score 0-4." for i in range(n)]
+
+
+def bench_batch(base_url: str, n: int, concurrency: int) -> dict:
+	chat = ChatAPIWrapper(base_url=base_url, api_key="stub", model="stub", max_concurrency=concurrency)
+	t0 = time.perf_counter()
+	outs = chat.run_batch(_prompts(n), temperature=0.0, top_p=1.0)
+	elapsed = time.perf_counter() - t0
+	return {"mode": "batch", "concurrency": concurrency, "requests": len(outs), "seconds": round(elapsed, 3), "req_per_sec": round(len(outs) / elapsed, 1)}
+
+
+def bench_async(base_url: str, n: int, concurrency: int) -> dict:
+	chat = ChatAPIWrapper(base_url=base_url, api_key="stub", model="stub")
+
+	async def _go() -> list:
+		sem = asyncio.Semaphore(concurrency)
+
+		async def _one(p: str) -> str:
+			async with sem:
+				return await chat.arun(p, temperature=0.0, top_p=1.0)
+		return await asyncio.gather(*[_one(p) for p in _prompts(n)])
+
+	t0 = time.perf_counter()
+	outs = asyncio.run(_go())
+	elapsed = time.perf_counter() - t0
+	return {"mode": "async", "concurrency": concurrency, "requests": len(outs), "seconds": round(elapsed, 3), "req_per_sec": round(len(outs) / elapsed, 1)}
+
+
+STREAM_RESPONSE = (
+	"Reasoning: Paints and construction materials are both used in building work.\nScore: 2\n"
+	+ "Notes: " + "the goods share some channels of trade. " * 30
+)
+
+
+def bench_stream(base_url: str, n: int) -> dict:
+	"""
+	Sequential time-to-score: full completion vs streaming with early close.
+	"""
+	chat = ChatAPIWrapper(base_url=base_url, api_key="stub", model="stub")
+	out = {"mode": "stream", "requests": n}
+	for label, fn in (
+		("full", lambda p: chat.run(p, temperature=0.0, top_p=1.0)),
+		("streamed", lambda p: chat.run_streaming(p, temperature=0.0, top_p=1.0)),
+	):
+		t0 = time.perf_counter()
+		for p in _prompts(n):
+			fn(p)
+		out[f"{label}_seconds_per_request"] = round((time.perf_counter() - t0) / n, 4)
+	return out
+
+
+def _run_many(chat: ChatAPIWrapper, n: int, concurrency: int, priority: str) -> dict:
+	from concurrent.futures import ThreadPoolExecutor
+
+	def _one(p: str) -> float:
+		t0 = time.perf_counter()
+		chat.run(p, temperature=0.0, top_p=1.0, priority=priority)
+		return time.perf_counter() - t0
+
+	ok, failed, latencies = 0, 0, []
+	with ThreadPoolExecutor(max_workers=concurrency) as pool:
+		futures = [pool.submit(_one, p) for p in _prompts(n)]
+		for fut in futures:
+			try:
+				latencies.append(fut.result())
+				ok += 1
+			except Exception:
+				failed += 1
+	latencies.sort()
+	return {"ok": ok, "failed": failed, "p50_latency": round(latencies[len(latencies) // 2], 3) if latencies else None}
+
+
+def bench_throttled(n: int, concurrency: int, latency: float, limit_per_sec: int, max_concurrent: int) -> list:
+	"""
+	Bulk load against a throttling stub, without and with RequestScheduler;
+	the scheduled run also sends a few interactive requests mid-way.
+	"""
+	import threading
+
+	from product_similarity.scheduler import RequestScheduler
+
+	rows = []
+	for scheduled in (False, True):
+		with StubChatServer(latency=latency, rate_limit=limit_per_sec, rate_window=1.0, max_concurrent=max_concurrent) as srv:
+			# The stub window is 1s, so keep bursts well inside it
+			scheduler = RequestScheduler(rpm=limit_per_sec * 60, max_concurrency=concurrency, burst_seconds=0.1) if scheduled else None
+			chat = ChatAPIWrapper(base_url=srv.base_url, api_key="stub", model="stub", scheduler=scheduler)
+			interactive: dict = {}
+
+			def _interactive() -> None:
+				time.sleep(1.0)
+				interactive.update(_run_many(chat, 5, 5, "interactive"))
+
+			probe = threading.Thread(target=_interactive) if scheduled else None
+			if probe:
+				probe.start()
+			t0 = time.perf_counter()
+			bulk = _run_many(chat, n, concurrency, "bulk")
+			elapsed = time.perf_counter() - t0
+			if probe:
+				probe.join()
+			row = {
+				"mode": "throttled+scheduler" if scheduled else "throttled",
+				"bulk": bulk,
+				"seconds": round(elapsed, 2),
+				"ok_per_sec": round(bulk["ok"] / elapsed, 1),
+				"provider_cap_per_sec": limit_per_sec,
+				"server_stats": dict(srv.stats),
+			}
+			if scheduled:
+				row["interactive"] = interactive
+				row["scheduler"] = scheduler.snapshot()  # type: ignore[union-attr]
+			rows.append(row)
+	return rows
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Load-test the chat backend against a local stub server")
+	parser.add_argument("--requests", type=int, default=64)
+	parser.add_argument("--latency", type=float, default=0.05, help="Stub server latency per request (s)")
+	parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+	parser.add_argument("--base-url", default=None, help="Use an already running server instead of the in-process stub")
+	parser.add_argument("--stream", action="store_true", help="Measure time-to-score of streamed vs full completions instead")
+	parser.add_argument("--token-latency", type=float, default=0.005, help="Stub delay between streamed chunks (s), with --stream")
+	parser.add_argument("--throttle", action="store_true", help="Bulk load against a rate-limiting stub, with and without RequestScheduler")
+	parser.add_argument("--limit-per-sec", type=int, default=20, help="Stub requests/second before 429, with --throttle")
+	parser.add_argument("--max-concurrent", type=int, default=6, help="Stub in-flight limit before 429, with --throttle")
+	args = parser.parse_args()
+
+	if args.throttle:
+		levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+		rows = bench_throttled(args.requests, max(levels), args.latency, args.limit_per_sec, args.max_concurrent)
+		print(json.dumps(rows, indent=2))
+		return 0
+
+	if args.stream:
+		if args.base_url:
+			rows = [bench_stream(args.base_url, args.requests)]
+		else:
+			with StubChatServer(latency=args.latency, responses=STREAM_RESPONSE, token_latency=args.token_latency) as srv:
+				rows = [bench_stream(srv.base_url, args.requests), {"server_stats": dict(srv.stats)}]
+		print(json.dumps(rows, indent=2))
+		return 0
+
+	levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+	rows = []
+	if args.base_url:
+		for c in levels:
+			rows.append(bench_batch(args.base_url, args.requests, c))
+			rows.append(bench_async(args.base_url, args.requests, c))
+	else:
+		with StubChatServer(latency=args.latency) as srv:
+			for c in levels:
+				rows.append(bench_batch(srv.base_url, args.requests, c))
+				rows.append(bench_async(srv.base_url, args.requests, c))
+			rows.append({"server_stats": dict(srv.stats)})
+
+	print(json.dumps(rows, indent=2))
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
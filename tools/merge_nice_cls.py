@@ -1,9 +1,17 @@
+import argparse
 import json
 import os
 import re
+import sys
 from glob import glob
 
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from product_similarity.artifacts import atomic_write_json, file_sha256, load_manifest  # noqa: E402
+
+
 def split_heading_and_note(meta_goods_and_services: str) -> tuple[str, str]:
 	match = re.search(r"\bExplanatory Note\b", meta_goods_and_services)
 	if match:
@@ -47,9 +55,15 @@ def load_group(file_path: str) -> dict:
 
 
 def main() -> None:
-	project_root = os.path.dirname(os.path.dirname(__file__))
+	parser = argparse.ArgumentParser(description="Merge data_nice_cls/group_*.json into data/nice_chunks.json")
+	parser.add_argument("--force", action="store_true", help="Re-parse every group file, ignoring the manifest")
+	args = parser.parse_args()
+
+	project_root = PROJECT_ROOT
 	input_dir = os.path.join(project_root, "data_nice_cls")
 	output_file = os.path.join(project_root, "data", "nice_chunks.json")
+	# Per-group content hashes + parsed entries from the previous build
+	manifest_file = os.path.join(project_root, "data", "nice_chunks.manifest.json")
 
 	paths = glob(os.path.join(input_dir, "group_*.json"))
 
@@ -59,17 +73,34 @@ def main() -> None:
 
 	paths.sort(key=extract_num)
 
+	previous = {} if args.force else (load_manifest(manifest_file).get("groups") or {})
+	groups = {}
 	merged = []
+	changed = []
 	for p in paths:
-		merged.append(load_group(p))
-
-	os.makedirs(os.path.dirname(output_file), exist_ok=True)
-	with open(output_file, "w", encoding="utf-8") as f:
-		json.dump(merged, f, ensure_ascii=False, indent=2)
-	print(f"Written {len(merged)} classes to {output_file}")
+		name = os.path.basename(p)
+		digest = file_sha256(p)
+		prev = previous.get(name)
+		if prev and prev.get("sha256") == digest and "entry" in prev:
+			entry = prev["entry"]
+		else:
+			entry = load_group(p)
+			changed.append(name)
+		groups[name] = {"sha256": digest, "entry": entry}
+		merged.append(entry)
+	removed = sorted(set(previous) - set(groups))
+
+	if not changed and not removed and os.path.exists(output_file):
+		print(f"Up to date: {len(merged)} classes in {output_file}")
+		return
+
+	atomic_write_json(output_file, merged, indent=2)
+	atomic_write_json(manifest_file, {"version": 1, "groups": groups})
+	print(
+		f"Written {len(merged)} classes to {output_file} "
+		f"(re-parsed {len(changed)}, reused {len(merged) - len(changed)}, removed {len(removed)})"
+	)
 
 
 if __name__ == "__main__":
 	main()
-
-